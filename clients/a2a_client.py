@@ -0,0 +1,235 @@
+"""
+A2A 客戶端
+在 python_a2a.A2AClient 之上提供串流回答，以及以 keep-alive 連接池併發發送問題
+"""
+import asyncio
+import json
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import httpx
+import requests
+from python_a2a import A2AClient, Message, TextContent, MessageRole
+from python_a2a.exceptions import A2AConnectionError, A2AResponseError
+from config import Config
+
+def parse_sse_event(event: Optional[str], data: str) -> Tuple[str, bool]:
+    """解析一個 SSE 事件，返回 (文本塊, 是否結束)"""
+    try:
+        payload = json.loads(data)
+    except ValueError:
+        return data, False
+
+    if event == "error" or (isinstance(payload, dict) and "error" in payload):
+        message = payload.get("error") if isinstance(payload, dict) else payload
+        raise A2AResponseError(f"串流回應錯誤: {message}")
+    if not isinstance(payload, dict):
+        return str(payload), False
+
+    content = payload.get("content", "")
+    # python_a2a 的 LangChain 包裝會把文本再包一層 {"content": ...}
+    if isinstance(content, dict):
+        content = content.get("content", content.get("text", ""))
+    return str(content or ""), bool(payload.get("lastChunk"))
+
+class StreamingA2AClient:
+    """支援串流回答的 A2A 客戶端"""
+
+    def __init__(self, server_url: str, timeout: float = Config.REQUEST_TIMEOUT):
+        self.server_url = server_url.rstrip("/")
+        self.timeout = timeout
+        self.supports_streaming: Optional[bool] = None
+        self._client = A2AClient(self.server_url)
+        self._session = requests.Session()
+
+    def ask(self, question: str) -> str:
+        """發送問題並等待完整回答"""
+        return self._client.ask(question)
+
+    def stream(self, question: str) -> Iterator[str]:
+        """以 SSE 串流回答，逐塊產生文本；服務器不支援串流時一次返回完整回答"""
+        if self.supports_streaming is not False:
+            message = Message(content=TextContent(text=question), role=MessageRole.USER)
+            try:
+                response = self._session.post(
+                    f"{self.server_url}/stream",
+                    json=message.to_dict(),
+                    headers={"Accept": "text/event-stream"},
+                    stream=True,
+                    timeout=self.timeout
+                )
+            except requests.RequestException as e:
+                raise A2AConnectionError(f"串流請求失敗: {e}")
+
+            if response.status_code in (404, 405, 501):
+                response.close()
+                self.supports_streaming = False
+            else:
+                with response:
+                    if response.status_code >= 400:
+                        raise A2AConnectionError(f"HTTP 錯誤 {response.status_code}: {response.text[:200]}")
+                    received = False
+                    for chunk, done in self._iter_events(response):
+                        if chunk:
+                            received = True
+                            self.supports_streaming = True
+                            yield chunk
+                        if done:
+                            self.supports_streaming = True
+                            return
+                    if received:
+                        raise A2AResponseError("串流在結束標記前中斷")
+                # 服務器有 /stream 端點但沒有產生任何內容（代理未實現串流），改用一般請求
+                self.supports_streaming = False
+
+        yield self.ask(question)
+
+    @staticmethod
+    def _iter_events(response: requests.Response) -> Iterator[Tuple[str, bool]]:
+        """逐行讀取 SSE 事件；chunk_size=None 讓數據一到達就被處理"""
+        event = None
+        data_lines = []
+        for raw_line in response.iter_lines(chunk_size=None):
+            line = raw_line.decode("utf-8")
+            if line == "":
+                if data_lines:
+                    yield parse_sse_event(event, "\n".join(data_lines))
+                event = None
+                data_lines = []
+            elif line.startswith(":"):
+                continue
+            elif line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:"):
+                data_lines.append(line[5:].lstrip())
+
+def create_streaming_client(server_url: str) -> StreamingA2AClient:
+    """創建串流 A2A 客戶端"""
+    return StreamingA2AClient(server_url)
+
+
+class AgentAnswer:
+    """併發請求中一個問題的結果；失敗時 answer 為 None，error 為錯誤訊息"""
+
+    def __init__(self, agent_url: str, question: str, answer: Optional[str] = None,
+                 error: Optional[str] = None, latency: float = 0.0):
+        self.agent_url = agent_url
+        self.question = question
+        self.answer = answer
+        self.error = error
+        self.latency = latency
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+def _origin(url: str) -> str:
+    parsed = httpx.URL(url)
+    return f"{parsed.scheme}://{parsed.netloc.decode('ascii')}"
+
+class PooledA2AClient:
+    """以連接池併發發送問題的異步 A2A 客戶端
+
+    每個代理主機使用一個 httpx.AsyncClient，連接在請求之間保持 keep-alive；
+    ask_many 和 gather 以信號量限制同時進行的請求數，結果按輸入順序返回。
+    需在同一個事件循環中使用，用完以 aclose() 或 async with 關閉連接池。
+    """
+
+    def __init__(self, timeout: float = Config.REQUEST_TIMEOUT,
+                 max_connections: int = Config.CLIENT_MAX_CONNECTIONS,
+                 max_keepalive: int = Config.CLIENT_MAX_KEEPALIVE,
+                 keepalive_expiry: float = Config.CLIENT_KEEPALIVE_EXPIRY,
+                 retries: int = Config.CLIENT_RETRIES):
+        # 等待連接不計入超時，排隊由調用方的併發限制控制
+        self.timeout = httpx.Timeout(timeout, pool=None)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.retries = retries
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    async def __aenter__(self) -> "PooledA2AClient":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    def _client_for(self, agent_url: str) -> httpx.AsyncClient:
+        origin = _origin(agent_url)
+        client = self._clients.get(origin)
+        if client is None:
+            client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+            self._clients[origin] = client
+        return client
+
+    async def ask(self, agent_url: str, question: str) -> str:
+        """發送問題並返回回答文本；服務器繁忙 (503) 時按 Retry-After 重試"""
+        client = self._client_for(agent_url)
+        message = Message(content=TextContent(text=question), role=MessageRole.USER)
+        for attempt in range(self.retries + 1):
+            try:
+                response = await client.post(agent_url.rstrip("/"), json=message.to_dict())
+            except httpx.HTTPError as e:
+                raise A2AConnectionError(f"請求失敗: {e or type(e).__name__}")
+            if response.status_code == 503 and attempt < self.retries:
+                await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+                continue
+            break
+
+        try:
+            data = response.json()
+        except ValueError:
+            raise A2AResponseError(f"HTTP {response.status_code}: 回應不是有效的 JSON")
+        content = data.get("content") if isinstance(data, dict) else None
+        if response.status_code >= 400 or not isinstance(content, dict) or content.get("type") == "error":
+            detail = content.get("message") if isinstance(content, dict) else response.text[:200]
+            raise A2AResponseError(f"HTTP {response.status_code}: {detail}")
+        return Message.from_dict(data).content.text
+
+    async def _ask_one(self, semaphore: asyncio.Semaphore, agent_url: str, question: str) -> AgentAnswer:
+        async with semaphore:
+            start = time.monotonic()
+            try:
+                answer = await self.ask(agent_url, question)
+                return AgentAnswer(agent_url, question, answer, latency=time.monotonic() - start)
+            except Exception as e:
+                return AgentAnswer(agent_url, question, error=str(e), latency=time.monotonic() - start)
+
+    async def gather(self, pairs: Iterable[Tuple[str, str]],
+                     concurrency: int = Config.CLIENT_CONCURRENCY) -> List[AgentAnswer]:
+        """併發發送 (代理 URL, 問題) 列表，最多 concurrency 個請求同時進行
+
+        單個請求失敗不影響其他請求，錯誤記錄在對應的 AgentAnswer 中。
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(*(self._ask_one(semaphore, agent_url, question)
+                                      for agent_url, question in pairs))
+
+    async def ask_many(self, agent_url: str, questions: Sequence[str],
+                       concurrency: int = Config.CLIENT_CONCURRENCY) -> List[AgentAnswer]:
+        """向同一個代理併發發送多個問題"""
+        return await self.gather(((agent_url, question) for question in questions), concurrency)
+
+    async def aclose(self):
+        """關閉所有連接池"""
+        clients = list(self._clients.values())
+        self._clients.clear()
+        await asyncio.gather(*(client.aclose() for client in clients))
+
+def create_pooled_client() -> PooledA2AClient:
+    """創建連接池 A2A 客戶端"""
+    return PooledA2AClient()
+
+def gather_answers(pairs: Iterable[Tuple[str, str]],
+                   concurrency: int = Config.CLIENT_CONCURRENCY) -> List[AgentAnswer]:
+    """在同步代碼中併發發送 (代理 URL, 問題) 列表，返回時連接池已關閉"""
+    async def run():
+        async with PooledA2AClient() as client:
+            return await client.gather(pairs, concurrency)
+    return asyncio.run(run())
+
+def ask_many(agent_url: str, questions: Sequence[str],
+             concurrency: int = Config.CLIENT_CONCURRENCY) -> List[AgentAnswer]:
+    """在同步代碼中向同一個代理併發發送多個問題"""
+    return gather_answers([(agent_url, question) for question in questions], concurrency)
\ No newline at end of file
@@ -0,0 +1,190 @@
+"""
+代理註冊表
+保存已知代理的卡片（遠端卡片以 ETag / TTL 重新驗證），並按技能名稱和示例建立索引，
+讓路由器和客戶端不必重新獲取卡片或逐個探測服務器就能找到端點
+"""
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+import httpx
+from python_a2a import AgentCard
+from config import Config
+from clients.router import FallbackFunction, RouteDecision, SkillIndex, SkillRouter
+
+CARD_PATHS = ("/.well-known/agent.json", "/agent.json", "/a2a/agent.json")
+
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+class AgentRegistryError(LookupError):
+    """找不到代理或無法獲取代理卡片"""
+
+class _Entry:
+    def __init__(self, url: str, card: AgentCard, etag: Optional[str], expires_at: Optional[float]):
+        self.url = url
+        self.card = card
+        self.etag = etag
+        self.expires_at = expires_at  # None 表示代理在本進程註冊，卡片不會過期
+
+class AgentRegistry:
+    """代理註冊表
+
+    代理啟動時以 register() 登記自己的卡片；其他代理以 discover() 從 URL 獲取一次卡片，
+    過期（TTL，或服務器 Cache-Control 的 max-age）後以 If-None-Match 重新驗證，未改變時服務器只回 304。
+    技能名稱以字典直接查找，問題文本以共用的 SkillIndex 打分。
+    """
+
+    def __init__(self, ttl: float = Config.REGISTRY_CARD_TTL,
+                 timeout: float = Config.REGISTRY_FETCH_TIMEOUT):
+        self.ttl = ttl
+        self.index = SkillIndex()
+        self._entries: Dict[str, _Entry] = {}  # URL -> 條目
+        self._urls: Dict[str, str] = {}  # 代理名稱 -> URL
+        self._skills: Dict[str, List[str]] = {}  # 技能名稱 -> URL 列表
+        self._lock = threading.RLock()
+        self._http = httpx.Client(timeout=timeout)
+        self.fetches = 0
+        self.revalidations = 0
+
+    @staticmethod
+    def _key(url: str) -> str:
+        return url.rstrip("/")
+
+    def register(self, card: AgentCard, url: Optional[str] = None):
+        """登記本進程中的代理；卡片直接使用，不經網絡獲取"""
+        self._store(self._key(url or card.url), card, etag=None, expires_at=None)
+
+    def unregister(self, url: str):
+        """移除代理，例如服務器停止時"""
+        with self._lock:
+            entry = self._entries.pop(self._key(url), None)
+            if entry is not None:
+                self._reindex()
+
+    def _store(self, url: str, card: AgentCard, etag: Optional[str], expires_at: Optional[float]):
+        with self._lock:
+            previous = self._entries.get(url)
+            self._entries[url] = _Entry(url, card, etag, expires_at)
+            if previous is None or previous.card.to_dict() != card.to_dict():
+                self._reindex()
+
+    def _reindex(self):
+        # 卡片只在登記、移除或內容改變時重建索引，查詢不需要任何網絡請求
+        urls = {}
+        skills: Dict[str, List[str]] = {}
+        for url, entry in self._entries.items():
+            urls[entry.card.name] = url
+            for skill in entry.card.skills or []:
+                skills.setdefault(skill.name, []).append(url)
+        self._urls = urls
+        self._skills = skills
+        self.index.set_cards(entry.card for entry in self._entries.values())
+
+    def _fetch(self, url: str, entry: Optional[_Entry]) -> _Entry:
+        headers = {"If-None-Match": entry.etag} if entry is not None and entry.etag else {}
+        last_error: Optional[Exception] = None
+        for path in CARD_PATHS:
+            try:
+                response = self._http.get(url + path, headers=headers)
+            except httpx.HTTPError as e:
+                raise AgentRegistryError(f"無法連接代理 {url}: {e or type(e).__name__}")
+            if response.status_code == 404:
+                last_error = AgentRegistryError(f"{url}{path} 不存在")
+                continue
+            match = _MAX_AGE.search(response.headers.get("Cache-Control", ""))
+            expires_at = time.monotonic() + (int(match.group(1)) if match else self.ttl)
+            if response.status_code == 304 and entry is not None:
+                self.revalidations += 1
+                entry.expires_at = expires_at
+                return entry
+            if response.status_code >= 400:
+                raise AgentRegistryError(f"獲取代理卡片失敗 {url}{path}: HTTP {response.status_code}")
+            self.fetches += 1
+            card = AgentCard.from_dict(response.json())
+            self._store(url, card, response.headers.get("ETag"), expires_at)
+            return self._entries[url]
+        raise last_error or AgentRegistryError(f"找不到代理卡片: {url}")
+
+    def discover(self, url: str) -> AgentCard:
+        """獲取遠端代理的卡片並加入註冊表；已緩存且未過期時不發出請求"""
+        url = self._key(url)
+        with self._lock:
+            entry = self._entries.get(url)
+        if entry is not None and (entry.expires_at is None or entry.expires_at > time.monotonic()):
+            return entry.card
+        try:
+            return self._fetch(url, entry).card
+        except AgentRegistryError:
+            # 重新驗證失敗時繼續使用舊卡片，由調用方的請求決定代理是否仍可用
+            if entry is not None:
+                return entry.card
+            raise
+
+    def card(self, name: str) -> AgentCard:
+        """按名稱取得代理卡片"""
+        return self._entries[self.url_for(name)].card
+
+    def url_for(self, name: str) -> str:
+        """按代理名稱取得端點"""
+        url = self._urls.get(name)
+        if url is None:
+            raise AgentRegistryError(f"未註冊的代理: {name}。已註冊: {', '.join(self._urls)}")
+        return url
+
+    def find_skill(self, skill: str) -> List[str]:
+        """提供指定技能的所有代理端點"""
+        return list(self._skills.get(skill, []))
+
+    def resolve(self, query: str) -> Tuple[Optional[str], RouteDecision]:
+        """把技能名稱或問題解析為端點
+
+        技能名稱完全相同時直接返回；否則以技能索引打分，沒有任何匹配時端點為 None。
+        """
+        urls = self._skills.get(query)
+        if urls:
+            agent = self._entries[urls[0]].card.name
+            return urls[0], RouteDecision(agent, query, score=1.0, margin=1.0)
+        decision = self.index.route(query)
+        return (self._urls.get(decision.agent) if decision.agent else None), decision
+
+    def create_router(self, fallback: Optional[FallbackFunction] = None) -> SkillRouter:
+        """創建與註冊表共用技能索引的路由器，之後登記的代理也會被路由"""
+        return SkillRouter(self.index, fallback)
+
+    @property
+    def agents(self) -> Dict[str, str]:
+        """代理名稱 -> 端點"""
+        return dict(self._urls)
+
+    def stats(self) -> Dict[str, int]:
+        """註冊表統計"""
+        return {
+            "agents": len(self._entries),
+            "skills": len(self._skills),
+            "fetches": self.fetches,
+            "revalidations": self.revalidations
+        }
+
+    def close(self):
+        self._http.close()
+
+DEFAULT_REGISTRY = AgentRegistry()
+
+def register_agent(card: AgentCard, url: Optional[str] = None):
+    """在默認註冊表中登記代理"""
+    DEFAULT_REGISTRY.register(card, url)
+
+def unregister_agent(url: str):
+    """從默認註冊表中移除代理"""
+    DEFAULT_REGISTRY.unregister(url)
+
+@contextmanager
+def registered_agent(card: AgentCard, registry: Optional[AgentRegistry] = None):
+    """在服務器運行期間把代理登記在註冊表中，服務器停止後移除"""
+    registry = registry or DEFAULT_REGISTRY
+    registry.register(card)
+    try:
+        yield
+    finally:
+        registry.unregister(card.url)
\ No newline at end of file
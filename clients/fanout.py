@@ -0,0 +1,202 @@
+"""
+多專家扇出
+同時向多個專家代理提問：取第一個通過驗證的回答（對沖請求）或合併所有回答，落後的調用會被取消
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+from config import Config
+from clients.a2a_client import PooledA2AClient
+
+# 專家：輸入問題，返回回答文本
+Expert = Callable[[str], Awaitable[str]]
+AnswerValidator = Callable[[str], bool]
+AnswerCombiner = Callable[[Dict[str, str]], str]
+
+# LangChain 包裝的同步調用在專用線程池中執行；不使用事件循環的默認執行器，
+# 被放棄的調用不會拖慢 asyncio.run 的結束
+_EXPERT_EXECUTOR = ThreadPoolExecutor(max_workers=Config.FANOUT_MAX_THREADS, thread_name_prefix="fanout-expert")
+
+def langchain_expert(agent) -> Expert:
+    """把 to_langchain_agent 返回的代理包裝為專家
+
+    同步的 invoke 無法中途停止：取消只會放棄結果，線程仍會執行到上游返回為止。
+    """
+    async def ask(question: str) -> str:
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(_EXPERT_EXECUTOR, agent.invoke, question)
+        return result.get("output", str(result)) if isinstance(result, dict) else str(result)
+    return ask
+
+def a2a_expert(agent_url: str, client: PooledA2AClient) -> Expert:
+    """以連接池客戶端直接調用 A2A 代理；取消時請求連接會被關閉，上游不再等待
+
+    client 需在與扇出相同的事件循環中創建和關閉。
+    """
+    async def ask(question: str) -> str:
+        return await client.ask(agent_url, question)
+    return ask
+
+def non_empty(answer: str) -> bool:
+    return bool(answer and answer.strip())
+
+def labelled_answers(answers: Dict[str, str]) -> str:
+    """默認的合併方式：按專家順序列出各自的回答"""
+    return "\n\n".join(f"【{name}】\n{answer.strip()}" for name, answer in answers.items())
+
+class ExpertOutcome:
+    """一個專家調用的結果；status 為 ok / invalid / error / timeout / cancelled"""
+
+    def __init__(self, name: str, status: str, answer: Optional[str] = None,
+                 error: Optional[str] = None, latency: float = 0.0):
+        self.name = name
+        self.status = status
+        self.answer = answer
+        self.error = error
+        self.latency = latency
+
+    def __repr__(self) -> str:
+        return f"ExpertOutcome({self.name!r}, {self.status!r}, {self.latency:.2f}s)"
+
+class FanOutResult:
+    """扇出結果；answer 為 None 表示沒有任何專家給出有效回答"""
+
+    def __init__(self, question: str, mode: str):
+        self.question = question
+        self.mode = mode
+        self.answer: Optional[str] = None
+        self.experts: List[str] = []
+        self.outcomes: Dict[str, ExpertOutcome] = {}
+        self.elapsed = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.answer is not None
+
+    def summary(self) -> str:
+        """各專家的狀態和耗時"""
+        return ", ".join(f"{name}: {outcome.status} {outcome.latency:.2f}s"
+                         for name, outcome in self.outcomes.items())
+
+class FanOutOrchestrator:
+    """多專家扇出協調器
+
+    每個專家有自己的截止時間（deadlines 中未指定的使用 default_deadline），超時視為失敗；
+    回答需通過 validate 才算有效。first() 在得到第一個有效回答後取消其餘調用，
+    merge() 等待所有專家（各自不超過截止時間）並以 combine 合併有效回答。
+    """
+
+    def __init__(self, experts: Dict[str, Expert],
+                 deadlines: Optional[Dict[str, float]] = None,
+                 default_deadline: float = Config.FANOUT_DEADLINE,
+                 validate: AnswerValidator = non_empty,
+                 combine: AnswerCombiner = labelled_answers):
+        self.experts = dict(experts)
+        self.deadlines = dict(deadlines or {})
+        self.default_deadline = default_deadline
+        self.validate = validate
+        self.combine = combine
+
+    def _select(self, names: Optional[Iterable[str]]) -> List[str]:
+        selected = list(self.experts) if names is None else list(dict.fromkeys(names))
+        for name in selected:
+            if name not in self.experts:
+                raise KeyError(f"未知的專家: {name}。可用專家: {', '.join(self.experts)}")
+        if not selected:
+            raise ValueError("至少需要一個專家")
+        return selected
+
+    async def _call(self, name: str, question: str) -> ExpertOutcome:
+        """調用一個專家，超時、錯誤和無效回答都記錄在結果中而不拋出"""
+        deadline = self.deadlines.get(name, self.default_deadline)
+        start = time.monotonic()
+        try:
+            answer = await asyncio.wait_for(self.experts[name](question), timeout=deadline)
+        except asyncio.TimeoutError:
+            return ExpertOutcome(name, "timeout", error=f"超過 {deadline} 秒", latency=time.monotonic() - start)
+        except Exception as e:
+            return ExpertOutcome(name, "error", error=str(e), latency=time.monotonic() - start)
+        status = "ok" if self.validate(answer) else "invalid"
+        return ExpertOutcome(name, status, answer=answer, latency=time.monotonic() - start)
+
+    async def first(self, question: str, experts: Optional[Iterable[str]] = None,
+                    hedge_delay: float = Config.FANOUT_HEDGE_DELAY) -> FanOutResult:
+        """對沖請求：返回第一個通過驗證的回答
+
+        hedge_delay 為 0 時同時向所有專家提問；大於 0 時按順序啟動，
+        每隔 hedge_delay 秒仍沒有有效回答才加入下一個專家。
+        """
+        names = self._select(experts)
+        result = FanOutResult(question, "first")
+        start = time.monotonic()
+        tasks: Dict["asyncio.Task[ExpertOutcome]", str] = {}
+        pending: Set["asyncio.Task[ExpertOutcome]"] = set()
+
+        async def wait_valid(timeout: Optional[float]) -> Optional[ExpertOutcome]:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                done, _ = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    return None
+                for task in done:
+                    pending.discard(task)
+                    outcome = task.result()
+                    result.outcomes[outcome.name] = outcome
+                    if outcome.status == "ok":
+                        return outcome
+            return None
+
+        try:
+            winner = None
+            for index, name in enumerate(names):
+                if index and hedge_delay > 0:
+                    winner = await wait_valid(hedge_delay)
+                    if winner is not None:
+                        break
+                task = asyncio.ensure_future(self._call(name, question))
+                tasks[task] = name
+                pending.add(task)
+            if winner is None:
+                winner = await wait_valid(None)
+        finally:
+            # 取消落後的調用，並等待取消完成以釋放連接
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            for task in pending:
+                if task.cancelled():
+                    name = tasks[task]
+                    result.outcomes[name] = ExpertOutcome(name, "cancelled", latency=time.monotonic() - start)
+                else:
+                    # 取消前剛好完成的調用仍記錄其結果
+                    outcome = task.result()
+                    result.outcomes[outcome.name] = outcome
+
+        if winner is not None:
+            result.answer = winner.answer
+            result.experts = [winner.name]
+        result.elapsed = time.monotonic() - start
+        return result
+
+    async def merge(self, question: str, experts: Optional[Iterable[str]] = None) -> FanOutResult:
+        """同時向所有專家提問，合併所有有效回答"""
+        names = self._select(experts)
+        result = FanOutResult(question, "merge")
+        start = time.monotonic()
+        outcomes = await asyncio.gather(*(self._call(name, question) for name in names))
+        result.outcomes = {outcome.name: outcome for outcome in outcomes}
+        answers = {outcome.name: outcome.answer for outcome in outcomes if outcome.status == "ok"}
+        if answers:
+            result.answer = self.combine(answers)
+            result.experts = list(answers)
+        result.elapsed = time.monotonic() - start
+        return result
+
+def create_fanout(experts: Dict[str, Expert], **kwargs) -> FanOutOrchestrator:
+    """創建多專家扇出協調器"""
+    return FanOutOrchestrator(experts, **kwargs)
\ No newline at end of file
@@ -0,0 +1,194 @@
+"""
+技能路由
+以代理卡片中技能的描述和示例建立 TF-IDF 索引，在本地為問題選擇專家代理，信心不足時才交給 LLM
+"""
+import math
+import re
+import time
+from collections import Counter, defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from python_a2a import AgentCard
+from config import Config
+from servers.response_cache import normalize_question
+
+# LLM 後備：輸入問題，返回代理名稱；None 表示不需要專家
+FallbackFunction = Callable[[str], Optional[str]]
+
+# 連續的中日韓字符或連續的英文字母數字
+_SEGMENT = re.compile(r"[㐀-鿿豈-﫿]+|[a-z0-9]+")
+
+def tokenize(text: str) -> List[str]:
+    """中文按字符二元組切分（單字片段保留單字），英文和數字按單詞切分"""
+    tokens = []
+    for segment in _SEGMENT.findall(normalize_question(text)):
+        if segment.isascii() or len(segment) == 1:
+            tokens.append(segment)
+        else:
+            tokens.extend(segment[i:i + 2] for i in range(len(segment) - 1))
+    return tokens
+
+class RouteDecision:
+    """路由結果；agent 為 None 表示沒有合適的專家"""
+
+    def __init__(self, agent: Optional[str], skill: Optional[str] = None, score: float = 0.0,
+                 margin: float = 0.0, source: str = "index", elapsed: float = 0.0):
+        self.agent = agent
+        self.skill = skill
+        self.score = score
+        self.margin = margin
+        self.source = source
+        self.elapsed = elapsed
+
+    def __repr__(self) -> str:
+        return (f"RouteDecision(agent={self.agent!r}, skill={self.skill!r}, score={self.score:.3f}, "
+                f"margin={self.margin:.3f}, source={self.source!r})")
+
+class SkillIndex:
+    """技能 TF-IDF 索引
+
+    每個技能的名稱、描述和示例（加上代理描述）組成一個文檔；建立索引時預先計算文檔的單位向量
+    和倒排表，查詢時只遍歷問題中出現的詞，打分時間與問題長度成正比。
+    """
+
+    def __init__(self, cards: Iterable[AgentCard] = ()):
+        self.cards: Dict[str, AgentCard] = {}
+        self.set_cards(cards)
+
+    def set_cards(self, cards: Iterable[AgentCard]):
+        """以一組代理卡片替換索引內容"""
+        self.cards = {card.name: card for card in cards}
+        self._build()
+
+    def add_card(self, card: AgentCard):
+        """加入或替換代理卡片並重建索引"""
+        self.cards[card.name] = card
+        self._build()
+
+    def remove_card(self, name: str):
+        if self.cards.pop(name, None) is not None:
+            self._build()
+
+    @property
+    def agents(self) -> List[str]:
+        return list(self.cards)
+
+    def _build(self):
+        documents = []
+        texts = []
+        for card in self.cards.values():
+            for skill in card.skills or []:
+                documents.append((card.name, skill.name))
+                texts.append(" ".join([skill.name, skill.description, *(skill.examples or []),
+                                       *(getattr(skill, "tags", None) or []), card.description]))
+            if not card.skills:
+                documents.append((card.name, None))
+                texts.append(f"{card.name} {card.description}")
+
+        term_counts = [Counter(tokenize(text)) for text in texts]
+        document_frequency = Counter(term for counts in term_counts for term in counts)
+        total = len(term_counts)
+        # 平滑 IDF：只出現在部分文檔中的詞權重較高，所有文檔都有的詞權重最低但不為零
+        idf = {term: math.log((1 + total) / (1 + frequency)) + 1
+               for term, frequency in document_frequency.items()}
+
+        postings = defaultdict(list)
+        for doc_id, counts in enumerate(term_counts):
+            weights = {term: (1 + math.log(count)) * idf[term] for term, count in counts.items()}
+            norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+            for term, weight in weights.items():
+                postings[term].append((doc_id, weight / norm))
+
+        # 一次替換整個索引，重建期間的查詢仍使用舊索引
+        self._state = (documents, idf, dict(postings))
+
+    def scores(self, question: str) -> Dict[str, Tuple[float, Optional[str]]]:
+        """每個代理的最高技能餘弦相似度: {代理名稱: (分數, 技能名稱)}"""
+        documents, idf, postings = self._state
+        counts = Counter(tokenize(question))
+        weights = {term: (1 + math.log(count)) * idf[term]
+                   for term, count in counts.items() if term in idf}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+        if not norm:
+            return {}
+
+        document_scores: Dict[int, float] = defaultdict(float)
+        for term, weight in weights.items():
+            for doc_id, doc_weight in postings[term]:
+                document_scores[doc_id] += weight * doc_weight
+
+        best: Dict[str, Tuple[float, Optional[str]]] = {}
+        for doc_id, score in document_scores.items():
+            agent, skill = documents[doc_id]
+            score /= norm
+            if agent not in best or score > best[agent][0]:
+                best[agent] = (score, skill)
+        return best
+
+    def route(self, question: str) -> RouteDecision:
+        """選出分數最高的代理；margin 為與第二名代理的分差"""
+        start = time.perf_counter()
+        ranked = sorted(self.scores(question).items(), key=lambda item: item[1][0], reverse=True)
+        if not ranked:
+            return RouteDecision(None, elapsed=time.perf_counter() - start)
+        agent, (score, skill) = ranked[0]
+        runner_up = ranked[1][1][0] if len(ranked) > 1 else 0.0
+        return RouteDecision(agent, skill, score, score - runner_up, elapsed=time.perf_counter() - start)
+
+class SkillRouter:
+    """技能路由器
+
+    先查本地索引；最高分低於 min_score 或與第二名差距小於 min_margin 時視為信心不足，
+    有 fallback 時改由它（通常是 LLM 協調器）決定，否則返回沒有專家的結果。
+    """
+
+    def __init__(self, index: SkillIndex, fallback: Optional[FallbackFunction] = None,
+                 min_score: float = Config.ROUTER_MIN_SCORE,
+                 min_margin: float = Config.ROUTER_MIN_MARGIN):
+        self.index = index
+        self.fallback = fallback
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self.local_routes = 0
+        self.fallback_routes = 0
+
+    def confident(self, decision: RouteDecision) -> bool:
+        return (decision.agent is not None and decision.score >= self.min_score
+                and decision.margin >= self.min_margin)
+
+    def route(self, question: str) -> RouteDecision:
+        """為問題選擇代理"""
+        decision = self.index.route(question)
+        if self.confident(decision):
+            self.local_routes += 1
+            return decision
+        if self.fallback is None:
+            self.local_routes += 1
+            return RouteDecision(None, score=decision.score, margin=decision.margin, elapsed=decision.elapsed)
+
+        self.fallback_routes += 1
+        start = time.perf_counter()
+        agent = self.fallback(question)
+        if agent is not None and agent not in self.index.cards:
+            agent = None
+        return RouteDecision(agent, score=decision.score, margin=decision.margin, source="llm",
+                             elapsed=decision.elapsed + time.perf_counter() - start)
+
+    def candidates(self, question: str, ratio: float = Config.ROUTER_FANOUT_RATIO) -> List[str]:
+        """可能相關的所有代理，按分數從高到低排列
+
+        最高分達到 min_score 時，分數不低於最高分 ratio 倍的其他代理也列入；跨領域問題會返回多個代理。
+        """
+        scores = self.index.scores(question)
+        ranked = sorted(scores, key=lambda agent: scores[agent][0], reverse=True)
+        if not ranked or scores[ranked[0]][0] < self.min_score:
+            return []
+        floor = scores[ranked[0]][0] * ratio
+        return [agent for agent in ranked if scores[agent][0] >= floor]
+
+    def stats(self) -> Dict[str, int]:
+        """路由統計"""
+        return {"local": self.local_routes, "fallback": self.fallback_routes}
+
+def create_skill_router(cards: Iterable[AgentCard], fallback: Optional[FallbackFunction] = None) -> SkillRouter:
+    """以代理卡片創建技能路由器"""
+    return SkillRouter(SkillIndex(cards), fallback)
\ No newline at end of file
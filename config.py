@@ -10,20 +10,130 @@ class Config:
     
     # API 配置
     OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+    # 未設置時使用 OpenAI 官方端點；測試時可指向本地的模擬服務器
+    OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL") or None
     
     # 服務器配置
     DEFAULT_HOST = "localhost"
     BASE_PORT = 8000
     PORT_RANGE = 100
+    SOCKET_BACKLOG = 2048
+    
+    # 多進程 worker 配置
+    AGENT_WORKERS = os.cpu_count() or 1
+    WORKER_MONITOR_INTERVAL = 0.5
+    WORKER_MIN_UPTIME = 5
+    WORKER_RESTART_BACKOFF = 0.5
+    WORKER_RESTART_MAX_BACKOFF = 30
+    
+    # 異步服務配置
+    ASYNC_MAX_CONCURRENCY = 256
+    ASYNC_MAX_PENDING = 1024
     
     # 模型配置
     DEFAULT_MODEL = "gpt-3.5-turbo"
     DEFAULT_TEMPERATURE = 0.7
+    EMBEDDING_MODEL = "text-embedding-3-small"
+    
+    # 模型客戶端池配置：進程內所有代理和鏈共用連接池與全局上限
+    LLM_MAX_INFLIGHT = int(os.environ.get("LLM_MAX_INFLIGHT", "32"))
+    LLM_TOKENS_PER_MINUTE = int(os.environ.get("LLM_TOKENS_PER_MINUTE", "0"))  # 0 表示不限制
+    LLM_MAX_CONNECTIONS = 100
+    LLM_MAX_KEEPALIVE = 32
+    LLM_BYTES_PER_TOKEN = 3
+    LLM_DEFAULT_COMPLETION_TOKENS = 256
+    
+    # 回應緩存配置（溫度不高於上限的代理默認啟用）
+    RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "1") != "0"
+    RESPONSE_CACHE_BACKEND = os.environ.get("RESPONSE_CACHE_BACKEND", "memory")
+    RESPONSE_CACHE_PATH = os.environ.get("RESPONSE_CACHE_PATH", "response_cache.sqlite3")
+    RESPONSE_CACHE_MAX_ENTRIES = 1024
+    RESPONSE_CACHE_TTL = 3600
+    RESPONSE_CACHE_MAX_TEMPERATURE = 0.2
+    SEMANTIC_CACHE_THRESHOLD = 0.95
+    
+    # 請求合併配置（相同問題同時到達時共用一次上游調用）
+    SINGLE_FLIGHT_ENABLED = os.environ.get("SINGLE_FLIGHT_ENABLED", "1") != "0"
+    SINGLE_FLIGHT_TIMEOUT = 30
+    
+    # 微批次配置（異步模式下收集多個請求以 chain.abatch 一次提交）
+    BATCH_ENABLED = os.environ.get("BATCH_ENABLED", "1") != "0"
+    BATCH_MAX_SIZE = 16
+    BATCH_MAX_WAIT_MS = 10
+    BATCH_MAX_QUEUE = 1024
+    BATCH_MAX_CONCURRENCY = 8
+    
+    # 表達式引擎配置
+    EXPRESSION_CACHE_SIZE = 1024
+    EXPRESSION_MAX_NODES = 256
+    EXPRESSION_MAX_EXPONENT = 100000
+    EXPRESSION_MAX_INT_BITS = 13000  # 約 3900 位十進位數字，低於 Python 整數轉字串的 4300 位限制
+    EXPRESSION_MAX_ROUND_DIGITS = 1000
+    VECTOR_MAX_ROWS = 1000000
+    VECTOR_MAX_LISTED = 20
+    CALCULATOR_MAX_EXPRESSIONS = 100
+    
+    # 精確數值模式配置（decimal / fraction）
+    DECIMAL_DEFAULT_PRECISION = 28
+    DECIMAL_MAX_PRECISION = 1000
+    EXACT_MAX_BITS = 13000
+    EXACT_MAX_STEPS = 1000000
+    EXACT_MAX_SECONDS = 1.0
+    
+    # 文本處理配置
+    TEXT_CHUNK_SIZE = 1 << 20
+    # 文件輸入只能讀取此目錄下的文件；留空時停用文件輸入
+    TEXT_FILE_ROOT = os.environ.get("TEXT_FILE_ROOT", "")
+    TEXT_FILE_ENCODING = os.environ.get("TEXT_FILE_ENCODING", "utf-8")
+    # 頻率統計模式：exact、space_saving 或 count_min；近似模式的估計值最多高估 總數 * EPSILON
+    TEXT_FREQUENCY_MODE = os.environ.get("TEXT_FREQUENCY_MODE", "exact")
+    TEXT_SKETCH_EPSILON = 0.001
+    TEXT_SKETCH_DELTA = 0.01
+    TEXT_SKETCH_TOP_K = 64
+    VALIDATION_MAX_LISTED = 20
+    TEXT_PIPELINE_MAX_STEPS = 32
+    
+    # 工具沙箱配置：MCP 工具在獨立的 worker 進程中執行
+    SANDBOX_ENABLED = os.environ.get("SANDBOX_ENABLED", "1") != "0"
+    SANDBOX_WORKERS = min(4, os.cpu_count() or 1)
+    SANDBOX_WALL_TIMEOUT = 10.0
+    SANDBOX_CPU_SECONDS = 5
+    SANDBOX_MAX_MEMORY_MB = 512
+    SANDBOX_MAX_CALLS = 500
+    SANDBOX_QUEUE_TIMEOUT = 30
+    
+    # 技能路由配置：本地索引信心不足時才交給 LLM 協調器
+    ROUTER_MIN_SCORE = 0.1
+    ROUTER_MIN_MARGIN = 0.05
+    ROUTER_FANOUT_RATIO = 0.4
+    
+    # 代理註冊表配置：遠端代理卡片的緩存時間，過期後以 ETag 重新驗證
+    REGISTRY_CARD_TTL = 300
+    REGISTRY_FETCH_TIMEOUT = 5
+    
+    # 多專家扇出配置
+    FANOUT_DEADLINE = 20
+    FANOUT_HEDGE_DELAY = 0.0
+    FANOUT_MAX_THREADS = 16
+    
+    # 客戶端連接池配置：每個代理主機一個 keep-alive 連接池
+    CLIENT_MAX_CONNECTIONS = 64
+    CLIENT_MAX_KEEPALIVE = 32
+    CLIENT_KEEPALIVE_EXPIRY = 30.0
+    CLIENT_CONCURRENCY = 16
+    CLIENT_RETRIES = 2
     
     # 超時配置
-    SERVER_START_TIMEOUT = 3
+    SERVER_START_TIMEOUT = 15
+    SERVER_SHUTDOWN_TIMEOUT = 10
     REQUEST_TIMEOUT = 30
     
+    # 就緒探測配置
+    READINESS_POLL_INTERVAL = 0.05
+    READINESS_POLL_MAX_INTERVAL = 0.5
+    READINESS_PROBE_TIMEOUT = 1.0
+    READINESS_PROBE_PATHS = ("/agent.json", "/tools")
+    
     @classmethod
     def validate(cls):
         """驗證配置"""
@@ -4,12 +4,13 @@ Demo 1: LangChain → A2A
 """
 import sys
 import os
+import time
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config import Config
 from utils import ServerManager, print_section, print_success, print_error, wait_for_interrupt
-from servers.langchain_server import start_langchain_server
-from python_a2a import A2AClient
+from servers.langchain_server import start_async_langchain_server
+from clients.a2a_client import StreamingA2AClient, ask_many
 
 def main():
     """主函數"""
@@ -30,14 +31,14 @@ def main():
         print_section("啟動 LangChain 服務器")
         port = manager.start_server(
             "LangChain服務器",
-            start_langchain_server
+            start_async_langchain_server
         )
         server_url = manager.get_server_url("LangChain服務器")
         print_success(f"LangChain 服務器已啟動: {server_url}")
         
         # 測試 A2A 客戶端連接
         print_section("測試 A2A 客戶端")
-        client = A2AClient(server_url)
+        client = StreamingA2AClient(server_url)
         
         # 測試問題列表
         test_questions = [
@@ -47,15 +48,18 @@ def main():
             "什麼是深度學習？"
         ]
         
-        # 逐一測試問題
-        for i, question in enumerate(test_questions, 1):
-            print(f"\n🤔 測試問題 {i}: {question}")
-            try:
-                # 構造 JSON 格式的輸入
-                response = client.ask(f'{{"question": "{question}"}}')
-                print_success(f"回應: {response[:200]}...")
-            except Exception as e:
-                print_error(f"請求失敗: {e}")
+        # 以連接池併發發送所有問題，結果按原順序返回
+        start = time.monotonic()
+        answers = ask_many(server_url, test_questions)
+        elapsed = time.monotonic() - start
+        for i, result in enumerate(answers, 1):
+            print(f"\n🤔 測試問題 {i}: {result.question}")
+            if result.ok:
+                print_success(f"回應: {result.answer[:200]}...")
+                print(f"⏱️  耗時: {result.latency:.2f} 秒")
+            else:
+                print_error(f"請求失敗: {result.error}")
+        print(f"\n⚡ {len(answers)} 個問題併發完成，總耗時: {elapsed:.2f} 秒")
         
         # 互動模式
         print_section("互動模式")
@@ -68,8 +72,10 @@ def main():
                     break
                 
                 if user_input:
-                    response = client.ask(f'{{"question": "{user_input}"}}')
-                    print(f"🤖 回應: {response}")
+                    print("🤖 回應: ", end="", flush=True)
+                    for chunk in client.stream(user_input):
+                        print(chunk, end="", flush=True)
+                    print()
                 else:
                     print("⚠️  請輸入有效問題")
                     
@@ -84,6 +90,8 @@ def main():
         print("✅ LangChain 組件已成功暴露為 A2A 服務器")
         print("✅ A2A 客戶端可以正常與服務器通信")
         print("✅ 支援各種類型的問題和回應")
+        print("✅ 支援串流回應，首個 token 到達即顯示")
+        print("✅ 支援以 keep-alive 連接池併發發送多個問題")
         
     except Exception as e:
         print_error(f"Demo 執行錯誤: {e}")
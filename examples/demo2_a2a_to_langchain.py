@@ -2,6 +2,7 @@
 Demo 2: A2A → LangChain
 演示如何將 A2A 代理轉換為 LangChain 組件
 """
+import asyncio
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -9,20 +10,17 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import Config
 from utils import ServerManager, print_section, print_success, print_error
 from servers.a2a_agent import start_math_agent, start_geography_agent
+from clients.a2a_client import ask_many
+from clients.agent_registry import DEFAULT_REGISTRY
+from clients.fanout import create_fanout, langchain_expert
 from python_a2a.langchain import to_langchain_agent
-from langchain_openai import ChatOpenAI
+from servers.llm_pool import get_chat_model
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
-def test_math_agent_integration():
+def test_math_agent_integration(server_url: str):
     """測試數學代理整合"""
-    manager = ServerManager()
-    
     try:
-        # 啟動數學專家代理
-        print_section("啟動數學專家 A2A 代理")
-        port = manager.start_server("數學專家", start_math_agent)
-        server_url = manager.get_server_url("數學專家")
         print_success(f"數學專家代理已啟動: {server_url}")
         
         # 轉換為 LangChain 代理
@@ -39,31 +37,23 @@ def test_math_agent_integration():
             "什麼是質數？請給出前10個質數"
         ]
         
-        for question in math_questions:
-            print(f"\n📐 數學問題: {question}")
-            try:
-                result = langchain_agent.invoke(question)
-                response = result.get('output', str(result))
-                print_success(f"回應: {response[:300]}...")
-            except Exception as e:
-                print_error(f"問題處理失敗: {e}")
+        # 以連接池併發發送，不必等待前一個問題完成
+        for result in ask_many(server_url, math_questions):
+            print(f"\n📐 數學問題: {result.question}")
+            if result.ok:
+                print_success(f"回應: {result.answer[:300]}...")
+            else:
+                print_error(f"問題處理失敗: {result.error}")
         
-        return langchain_agent, manager
+        return langchain_agent
         
     except Exception as e:
         print_error(f"數學代理測試失敗: {e}")
-        manager.stop_all()
         raise
 
-def test_geography_agent_integration():
+def test_geography_agent_integration(server_url: str):
     """測試地理代理整合"""
-    manager = ServerManager()
-    
     try:
-        # 啟動地理專家代理
-        print_section("啟動地理專家 A2A 代理")
-        port = manager.start_server("地理專家", start_geography_agent)
-        server_url = manager.get_server_url("地理專家")
         print_success(f"地理專家代理已啟動: {server_url}")
         
         # 轉換為 LangChain 代理
@@ -78,37 +68,45 @@ def test_geography_agent_integration():
             "推薦義大利的旅遊景點"
         ]
         
-        for question in geography_questions:
-            print(f"\n🌍 地理問題: {question}")
-            try:
-                result = langchain_agent.invoke(question)
-                response = result.get('output', str(result))
-                print_success(f"回應: {response[:300]}...")
-            except Exception as e:
-                print_error(f"問題處理失敗: {e}")
+        # 以連接池併發發送，不必等待前一個問題完成
+        for result in ask_many(server_url, geography_questions):
+            print(f"\n🌍 地理問題: {result.question}")
+            if result.ok:
+                print_success(f"回應: {result.answer[:300]}...")
+            else:
+                print_error(f"問題處理失敗: {result.error}")
         
-        return langchain_agent, manager
+        return langchain_agent
         
     except Exception as e:
         print_error(f"地理代理測試失敗: {e}")
-        manager.stop_all()
         raise
 
 def test_langchain_workflow_integration():
     """測試在 LangChain 工作流中使用 A2A 代理"""
     print_section("LangChain 工作流整合測試")
     
-    # 啟動兩個專家代理
-    math_agent, math_manager = test_math_agent_integration()
-    geo_agent, geo_manager = test_geography_agent_integration()
+    manager = ServerManager()
     
     try:
-        # 創建主 LLM 用於協調
-        llm = ChatOpenAI(
-            api_key=Config.OPENAI_API_KEY,
-            model=Config.DEFAULT_MODEL,
-            temperature=0.3
-        )
+        # 並行啟動兩個專家代理
+        print_section("啟動數學與地理專家 A2A 代理")
+        manager.start_many({
+            "數學專家": start_math_agent,
+            "地理專家": start_geography_agent
+        })
+        
+        # 代理啟動時已在註冊表中登記卡片，按技能找到端點
+        print(f"📇 已註冊代理: {DEFAULT_REGISTRY.agents}")
+        math_agent = test_math_agent_integration(DEFAULT_REGISTRY.find_skill("基礎數學")[0])
+        geo_agent = test_geography_agent_integration(DEFAULT_REGISTRY.find_skill("地理知識")[0])
+    except Exception:
+        manager.stop_all()
+        raise
+    
+    try:
+        # 從進程共用的客戶端池取得主 LLM 用於協調
+        llm = get_chat_model(Config.DEFAULT_MODEL, temperature=0.3)
         
         # 創建協調提示
         coordinator_prompt = ChatPromptTemplate.from_template(
@@ -123,36 +121,62 @@ def test_langchain_workflow_integration():
 問題類型判斷:"""
         )
         
-        # 創建協調鏈
+        # 創建協調鏈，只在本地路由信心不足時使用
         coordinator = coordinator_prompt | llm | StrOutputParser()
+        direct_answers = {}
+        
+        def coordinate(question: str):
+            decision = coordinator.invoke({"question": question})
+            print(f"📋 協調器決策: {decision[:100]}...")
+            if decision.startswith("MATH:"):
+                return "數學專家"
+            if decision.startswith("GEO:"):
+                return "地理專家"
+            direct_answers[question] = decision
+            return None
+        
+        # 使用註冊表以代理卡片的技能描述和示例建立的本地路由索引
+        router = DEFAULT_REGISTRY.create_router(fallback=coordinate)
+        experts = {"數學專家": math_agent, "地理專家": geo_agent}
+        # 跨領域問題同時詢問多個專家並合併回答
+        fanout = create_fanout({name: langchain_expert(agent) for name, agent in experts.items()})
         
         # 測試複合問題
         complex_questions = [
             "請計算地球的周長（假設地球是完美球體，半徑為 6371 公里）",
             "如果我要從台北飛到紐約，大約需要飛行多少公里？請計算距離",
             "法國巴黎的經緯度是多少？",
-            "計算一個邊長為 5 公尺的正方形面積"
+            "計算一個邊長為 5 公尺的正方形面積",
+            "你好，請簡單介紹一下你自己"
         ]
         
         print_section("複合問題處理測試")
         for question in complex_questions:
             print(f"\n🔀 複合問題: {question}")
             try:
-                # 協調器決策
-                decision = coordinator.invoke({"question": question})
-                print(f"📋 協調器決策: {decision[:100]}...")
+                candidates = router.candidates(question)
+                if len(candidates) > 1:
+                    merged = asyncio.run(fanout.merge(question, candidates))
+                    print(f"📋 跨領域問題，同時詢問: {', '.join(candidates)} ({merged.summary()})")
+                    if merged.ok:
+                        print_success(f"{'、'.join(merged.experts)}回應: {merged.answer[:600]}...")
+                    else:
+                        print_error("所有專家都未能回答")
+                    continue
                 
-                # 根據決策路由到專家
-                if decision.startswith("MATH:"):
-                    expert_question = decision[5:].strip()
-                    result = math_agent.invoke(expert_question)
-                    expert_type = "數學專家"
-                elif decision.startswith("GEO:"):
-                    expert_question = decision[4:].strip()
-                    result = geo_agent.invoke(expert_question)
-                    expert_type = "地理專家"
+                route = router.route(question)
+                source = "本地索引" if route.source == "index" else "LLM 協調器"
+                print(f"📋 路由決策 ({source}, {route.elapsed * 1e6:.0f} 微秒): "
+                      f"{route.agent or '協調器'} {route.skill or ''} (分數 {route.score:.2f})")
+                
+                if route.agent is not None:
+                    result = experts[route.agent].invoke(question)
+                    expert_type = route.agent
                 else:
-                    result = {"output": decision}
+                    answer = direct_answers.pop(question, None)
+                    if answer is None:
+                        answer = llm.invoke(question).content
+                    result = {"output": answer}
                     expert_type = "協調器"
                 
                 response = result.get('output', str(result))
@@ -160,18 +184,19 @@ def test_langchain_workflow_integration():
                 
             except Exception as e:
                 print_error(f"複合問題處理失敗: {e}")
+        print(f"\n🧭 路由統計: {router.stats()}")
         
         print_section("Demo 2 完成")
         print_success("成功演示了 A2A → LangChain 的轉換和工作流整合")
         print("✅ A2A 代理已成功轉換為 LangChain 組件")
         print("✅ 可以在 LangChain 工作流中無縫使用")
-        print("✅ 支援專家代理的智能路由")
+        print("✅ 支援專家代理的智能路由（本地技能索引，必要時才調用 LLM）")
+        print("✅ 跨領域問題同時詢問多個專家並合併回答")
         
     except Exception as e:
         print_error(f"工作流整合測試失敗: {e}")
     finally:
-        math_manager.stop_all()
-        geo_manager.stop_all()
+        manager.stop_all()
 
 def main():
     """主函數"""
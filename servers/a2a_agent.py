@@ -2,49 +2,199 @@
 A2A 代理服務器
 創建專門的 A2A 代理
 """
-from python_a2a import OpenAIA2AServer, AgentCard, AgentSkill, run_server
+import asyncio
+from typing import AsyncIterator, Optional
+from python_a2a import OpenAIA2AServer, AgentCard, AgentSkill, Message, TextContent, MessageRole
 from config import Config
+from utils import uses_reserved_socket
+from servers.server_runner import serve_a2a_agent, serve_asgi_app
+from servers.workers import serve_a2a_agent_workers
+from servers.asgi_app import create_a2a_asgi_app
+from servers.response_cache import ResponseCache, make_scope, default_cache_for
+from servers.single_flight import SingleFlight, AsyncSingleFlight, KeyFunction
+from servers.llm_pool import DEFAULT_LLM_POOL, get_openai_client, get_async_openai_client
+from clients.agent_registry import registered_agent
+
+class CachedOpenAIA2AServer(OpenAIA2AServer):
+    """帶回應緩存與請求合併的 OpenAI A2A 服務器
+
+    只處理不屬於任何對話的純文本問題；對話中的問題依賴歷史，每次都交給模型回答。
+    相同問題同時到達時只調用一次 OpenAI，即使緩存關閉也會合併。
+    OpenAI 客戶端來自進程共用的客戶端池，與其他代理共用連接和全局上限。
+    """
+    
+    def __init__(self, *args, cache: Optional[ResponseCache] = None,
+                 single_flight: bool = Config.SINGLE_FLIGHT_ENABLED,
+                 flight_key: Optional[KeyFunction] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # 以進程共用的客戶端池替換每個服務器各自創建的 OpenAI 客戶端
+        if self.api_key:
+            self.client = get_openai_client(self.api_key)
+            self.async_client = get_async_openai_client(self.api_key)
+        self.cache = cache
+        self.cache_scope = make_scope(self.model, self.temperature, self.system_prompt)
+        self.flight = SingleFlight(flight_key) if single_flight else None
+        self.async_flight = AsyncSingleFlight(flight_key) if single_flight else None
+    
+    @staticmethod
+    def _standalone_text(message: Message) -> Optional[str]:
+        if message.conversation_id or getattr(message.content, "type", None) != "text":
+            return None
+        return message.content.text
+    
+    def handle_message(self, message: Message) -> Message:
+        question = self._standalone_text(message)
+        if question is None:
+            return super().handle_message(message)
+        
+        cached = self.cache.get(self.cache_scope, question) if self.cache else None
+        if cached is not None:
+            content = TextContent(text=cached)
+        elif self.flight is not None:
+            content = self.flight.do(question, self._answer, message).content
+        else:
+            content = self._answer(message).content
+        # 合併的請求共用回答內容，但各自回覆自己的消息
+        return Message(
+            content=content,
+            role=MessageRole.AGENT,
+            parent_message_id=message.message_id,
+            conversation_id=message.conversation_id
+        )
+    
+    def _answer(self, message: Message) -> Message:
+        response = super().handle_message(message)
+        if self.cache and getattr(response.content, "type", None) == "text":
+            self.cache.set(self.cache_scope, message.content.text, response.content.text)
+        return response
+    
+    async def stream_response(self, message: Message) -> AsyncIterator[str]:
+        question = self._standalone_text(message)
+        if question is None:
+            chunks = super().stream_response(message)
+        else:
+            cached = self.cache.get(self.cache_scope, question) if self.cache else None
+            if cached is not None:
+                yield cached
+                return
+            if self.async_flight is not None:
+                chunks = self.async_flight.stream(question, lambda: self._stream_answer(message))
+            else:
+                chunks = self._stream_answer(message)
+        
+        async for chunk in chunks:
+            yield chunk
+    
+    async def _stream_answer(self, message: Message) -> AsyncIterator[str]:
+        chunks = []
+        async for chunk in super().stream_response(message):
+            chunks.append(chunk)
+            yield chunk
+        # 只有完整收到的回答才寫入緩存
+        if self.cache and chunks:
+            self.cache.set(self.cache_scope, message.content.text, "".join(chunks))
+
+def create_expert_asgi_app(server: OpenAIA2AServer, agent_card: AgentCard):
+    """為專家代理創建異步 A2A 應用，/stream 端點以 OpenAI 串流逐塊返回回答"""
+    
+    def user_message(text: str) -> Message:
+        return Message(content=TextContent(text=text), role=MessageRole.USER)
+    
+    async def respond_stream(text: str) -> AsyncIterator[str]:
+        async for chunk in server.stream_response(user_message(text)):
+            yield chunk
+    
+    async def respond(text: str) -> str:
+        if getattr(server, "async_client", None) is not None:
+            return "".join([chunk async for chunk in respond_stream(text)])
+        # 沒有異步客戶端時退回線程池中的同步調用
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(None, server.handle_message, user_message(text))
+        return getattr(response.content, "text", str(response.content))
+    
+    return create_a2a_asgi_app(
+        respond,
+        agent_card.to_dict(),
+        respond_stream=respond_stream,
+        monitored={
+            "cache": getattr(server, "cache", None),
+            "single_flight": getattr(server, "async_flight", None),
+            "llm": DEFAULT_LLM_POOL
+        }
+    )
+
+def build_math_agent_card(port: int) -> AgentCard:
+    """數學專家的代理卡片"""
+    return AgentCard(
+        name="數學專家",
+        description="專門解決數學問題的智能代理，能夠解答各種數學相關疑問",
+        url=f"http://{Config.DEFAULT_HOST}:{port}",
+        version="1.0.0",
+        skills=[
+            AgentSkill(
+                name="基礎數學",
+                description="處理基礎數學計算和概念解釋",
+                examples=["2+2等於多少？", "什麼是質數？"],
+                tags=["計算", "算術", "數字", "質數", "分數", "百分比"]
+            ),
+            AgentSkill(
+                name="高等數學",
+                description="解答微積分、線性代數等高等數學問題",
+                examples=["解釋微分的概念", "什麼是線性變換？"],
+                tags=["微分", "積分", "極限", "矩陣", "向量", "方程", "定理", "證明"]
+            ),
+            AgentSkill(
+                name="應用數學",
+                description="解決實際問題中的數學應用",
+                examples=["計算圓的面積", "統計學在生活中的應用"],
+                tags=["面積", "體積", "周長", "距離", "半徑", "幾何", "機率", "統計"]
+            )
+        ]
+    )
+
+def build_geography_agent_card(port: int) -> AgentCard:
+    """地理專家的代理卡片"""
+    return AgentCard(
+        name="地理專家",
+        description="專門提供地理和旅遊資訊的智能代理",
+        url=f"http://{Config.DEFAULT_HOST}:{port}",
+        version="1.0.0",
+        skills=[
+            AgentSkill(
+                name="地理知識",
+                description="回答關於國家、首都、地形等地理問題",
+                examples=["法國的首都是什麼？", "喜馬拉雅山在哪裡？"],
+                tags=["國家", "城市", "首都", "山脈", "河流", "氣候", "經緯度", "地形"]
+            ),
+            AgentSkill(
+                name="旅遊資訊",
+                description="提供旅遊目的地和景點資訊",
+                examples=["巴黎有什麼著名景點？", "日本最佳旅遊季節是什麼時候？"],
+                tags=["旅遊", "景點", "行程", "航班", "飛行", "簽證", "文化", "推薦"]
+            )
+        ]
+    )
 
 class MathExpertAgent:
     """數學專家代理"""
     
-    def __init__(self, api_key: str, port: int):
+    def __init__(self, api_key: str, port: int, cache: Optional[ResponseCache] = None):
         self.api_key = api_key
         self.port = port
+        self.cache = cache
         self._setup_agent()
     
     def _setup_agent(self):
         """設置代理"""
-        # 創建代理卡片
-        self.agent_card = AgentCard(
-            name="數學專家",
-            description="專門解決數學問題的智能代理，能夠解答各種數學相關疑問",
-            url=f"http://{Config.DEFAULT_HOST}:{self.port}",
-            version="1.0.0",
-            skills=[
-                AgentSkill(
-                    name="基礎數學",
-                    description="處理基礎數學計算和概念解釋",
-                    examples=["2+2等於多少？", "什麼是質數？"]
-                ),
-                AgentSkill(
-                    name="高等數學",
-                    description="解答微積分、線性代數等高等數學問題",
-                    examples=["解釋微分的概念", "什麼是線性變換？"]
-                ),
-                AgentSkill(
-                    name="應用數學",
-                    description="解決實際問題中的數學應用",
-                    examples=["計算圓的面積", "統計學在生活中的應用"]
-                )
-            ]
-        )
+        self.agent_card = build_math_agent_card(self.port)
         
         # 創建 OpenAI 驅動的 A2A 服務器
-        self.server = OpenAIA2AServer(
+        temperature = 0.1  # 數學問題需要更精確的答案
+        self.server = CachedOpenAIA2AServer(
             api_key=self.api_key,
             model=Config.DEFAULT_MODEL,
-            temperature=0.1,  # 數學問題需要更精確的答案
+            temperature=temperature,
+            cache=self.cache or default_cache_for(temperature),
             system_prompt=(
                 "你是一位專業的數學專家。你的職責是："
                 "1. 提供準確的數學計算和解答"
@@ -56,42 +206,34 @@ class MathExpertAgent:
         )
     
     def start(self, port: int):
-        """啟動代理服務器"""
-        run_server(self.server, host=Config.DEFAULT_HOST, port=port)
+        """啟動代理服務器，運行期間登記在代理註冊表中"""
+        with registered_agent(self.agent_card):
+            serve_a2a_agent(self.server, port)
+    
+    def start_async(self, port: int):
+        """以異步模式啟動代理服務器，支援 /stream 串流回答"""
+        with registered_agent(self.agent_card):
+            serve_asgi_app(create_expert_asgi_app(self.server, self.agent_card), port)
 
 class GeographyExpertAgent:
     """地理專家代理"""
     
-    def __init__(self, api_key: str, port: int):
+    def __init__(self, api_key: str, port: int, cache: Optional[ResponseCache] = None):
         self.api_key = api_key
         self.port = port
+        self.cache = cache
         self._setup_agent()
     
     def _setup_agent(self):
         """設置地理專家代理"""
-        self.agent_card = AgentCard(
-            name="地理專家",
-            description="專門提供地理和旅遊資訊的智能代理",
-            url=f"http://{Config.DEFAULT_HOST}:{self.port}",
-            version="1.0.0",
-            skills=[
-                AgentSkill(
-                    name="地理知識",
-                    description="回答關於國家、首都、地形等地理問題",
-                    examples=["法國的首都是什麼？", "喜馬拉雅山在哪裡？"]
-                ),
-                AgentSkill(
-                    name="旅遊資訊",
-                    description="提供旅遊目的地和景點資訊",
-                    examples=["巴黎有什麼著名景點？", "日本最佳旅遊季節是什麼時候？"]
-                )
-            ]
-        )
+        self.agent_card = build_geography_agent_card(self.port)
         
-        self.server = OpenAIA2AServer(
+        temperature = 0.3
+        self.server = CachedOpenAIA2AServer(
             api_key=self.api_key,
             model=Config.DEFAULT_MODEL,
-            temperature=0.3,
+            temperature=temperature,
+            cache=self.cache or default_cache_for(temperature),
             system_prompt=(
                 "你是一位地理和旅遊專家。你的專長包括："
                 "1. 提供準確的地理資訊"
@@ -103,25 +245,69 @@ class GeographyExpertAgent:
         )
     
     def start(self, port: int):
-        """啟動代理服務器"""
-        run_server(self.server, host=Config.DEFAULT_HOST, port=port)
+        """啟動代理服務器，運行期間登記在代理註冊表中"""
+        with registered_agent(self.agent_card):
+            serve_a2a_agent(self.server, port)
+    
+    def start_async(self, port: int):
+        """以異步模式啟動代理服務器，支援 /stream 串流回答"""
+        with registered_agent(self.agent_card):
+            serve_asgi_app(create_expert_asgi_app(self.server, self.agent_card), port)
 
-def create_math_agent(api_key: str, port: int) -> MathExpertAgent:
-    """創建數學專家代理"""
-    return MathExpertAgent(api_key, port)
+def create_math_agent(api_key: str, port: int, cache: Optional[ResponseCache] = None) -> MathExpertAgent:
+    """創建數學專家代理（默認啟用回應緩存）"""
+    return MathExpertAgent(api_key, port, cache=cache)
 
-def create_geography_agent(api_key: str, port: int) -> GeographyExpertAgent:
-    """創建地理專家代理"""
-    return GeographyExpertAgent(api_key, port)
+def create_geography_agent(api_key: str, port: int, cache: Optional[ResponseCache] = None) -> GeographyExpertAgent:
+    """創建地理專家代理（傳入 cache 才啟用回應緩存）"""
+    return GeographyExpertAgent(api_key, port, cache=cache)
 
+@uses_reserved_socket
 def start_math_agent(port: int):
     """啟動數學專家代理的便捷函數"""
     Config.validate()
     agent = create_math_agent(Config.OPENAI_API_KEY, port)
     agent.start(port)
 
+@uses_reserved_socket
 def start_geography_agent(port: int):
     """啟動地理專家代理的便捷函數"""
     Config.validate()
     agent = create_geography_agent(Config.OPENAI_API_KEY, port)
-    agent.start(port)
\ No newline at end of file
+    agent.start(port)
+
+@uses_reserved_socket
+def start_async_math_agent(port: int):
+    """以異步串流模式啟動數學專家代理的便捷函數"""
+    Config.validate()
+    agent = create_math_agent(Config.OPENAI_API_KEY, port)
+    agent.start_async(port)
+
+@uses_reserved_socket
+def start_async_geography_agent(port: int):
+    """以異步串流模式啟動地理專家代理的便捷函數"""
+    Config.validate()
+    agent = create_geography_agent(Config.OPENAI_API_KEY, port)
+    agent.start_async(port)
+
+@uses_reserved_socket
+def start_math_agent_workers(port: int, workers: Optional[int] = None):
+    """以多進程 worker 模式啟動數學專家代理的便捷函數"""
+    Config.validate()
+    serve_a2a_agent_workers(
+        lambda: create_math_agent(Config.OPENAI_API_KEY, port).server,
+        port,
+        workers=workers,
+        name="數學專家"
+    )
+
+@uses_reserved_socket
+def start_geography_agent_workers(port: int, workers: Optional[int] = None):
+    """以多進程 worker 模式啟動地理專家代理的便捷函數"""
+    Config.validate()
+    serve_a2a_agent_workers(
+        lambda: create_geography_agent(Config.OPENAI_API_KEY, port).server,
+        port,
+        workers=workers,
+        name="地理專家"
+    )
\ No newline at end of file
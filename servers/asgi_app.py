@@ -0,0 +1,239 @@
+"""
+異步 A2A 應用
+以 ASGI (FastAPI) 實現 A2A 協議端點，所有請求在同一個事件循環上處理
+"""
+import asyncio
+import hashlib
+import json
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Optional
+from python_a2a import Message, TextContent, MessageRole, Task, TaskStatus, TaskState
+from config import Config
+
+class ServerOverloadedError(RuntimeError):
+    """等待中的請求超過上限"""
+
+class ConcurrencyLimiter:
+    """併發限制與背壓
+
+    最多 max_concurrency 個請求同時執行，其餘排隊；
+    執行中加排隊的請求達到 max_pending 時直接拒絕新請求。
+    """
+
+    def __init__(self, max_concurrency: int = Config.ASYNC_MAX_CONCURRENCY,
+                 max_pending: int = Config.ASYNC_MAX_PENDING):
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.active = 0
+        self.pending = 0
+        self.rejected = 0
+        # 延遲到事件循環內創建，避免舊版 Python 綁定到錯誤的循環
+        self._semaphore = None
+
+    @asynccontextmanager
+    async def slot(self):
+        """取得執行名額"""
+        if self.saturated():
+            self.rejected += 1
+            raise ServerOverloadedError(f"等待中的請求已達上限 ({self.max_pending})")
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.pending += 1
+        try:
+            async with self._semaphore:
+                self.active += 1
+                try:
+                    yield
+                finally:
+                    self.active -= 1
+        finally:
+            self.pending -= 1
+
+    def saturated(self) -> bool:
+        """是否已達等待上限"""
+        return self.pending >= self.max_pending
+
+    def stats(self) -> Dict[str, int]:
+        """當前負載統計"""
+        return {
+            "active": self.active,
+            "queued": self.pending - self.active,
+            "rejected": self.rejected,
+            "max_concurrency": self.max_concurrency,
+            "max_pending": self.max_pending
+        }
+
+def extract_text(message: Optional[Dict[str, Any]]) -> str:
+    """從 A2A 消息字典中取出文本（支援 python_a2a 與 Google A2A 格式）"""
+    if not message:
+        return ""
+    content = message.get("content")
+    if isinstance(content, dict) and "text" in content:
+        return content["text"]
+    for part in message.get("parts", []):
+        if part.get("type") == "text":
+            return part.get("text", "")
+    return ""
+
+def sse_event(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    """格式化一個 Server-Sent Event"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def create_a2a_asgi_app(respond: Callable[[str], Awaitable[str]],
+                        agent_card: Dict[str, Any],
+                        limiter: Optional[ConcurrencyLimiter] = None,
+                        request_timeout: float = Config.REQUEST_TIMEOUT,
+                        respond_stream: Optional[Callable[[str], AsyncIterator[str]]] = None,
+                        monitored: Optional[Dict[str, Any]] = None,
+                        background: Iterable[Any] = ()):
+    """創建 A2A ASGI 應用
+
+    Args:
+        respond: 異步回答函數，輸入問題文本，返回回答文本
+        agent_card: 代理卡片字典
+        limiter: 併發限制器
+        request_timeout: 單個請求的超時秒數
+        respond_stream: 異步串流回答函數，逐塊產生回答文本；提供時啟用 /stream 端點
+        monitored: 在 /a2a/health 中報告統計的組件（名稱 -> 提供 stats() 的對象），值為 None 時略過
+        background: 隨應用的事件循環啟動和關閉的組件（提供 async start() 和 async close()），例如微批次器
+    """
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+    limiter = limiter or ConcurrencyLimiter()
+    background = [component for component in background if component is not None]
+
+    @asynccontextmanager
+    async def lifespan(app):
+        for component in background:
+            await component.start()
+        try:
+            yield
+        finally:
+            for component in background:
+                await component.close()
+
+    app = FastAPI(title=agent_card.get("name", "A2A"), lifespan=lifespan)
+    app.state.limiter = limiter
+
+    async def answer(text: str) -> str:
+        async with limiter.slot():
+            return await asyncio.wait_for(respond(text), timeout=request_timeout)
+
+    def error_response(e: Exception):
+        if isinstance(e, ServerOverloadedError):
+            return 503, {"Retry-After": "1"}
+        if isinstance(e, asyncio.TimeoutError):
+            return 504, None
+        return 500, None
+
+    # 卡片內容不變，ETag 只計算一次；客戶端以 If-None-Match 重新驗證時返回 304
+    card_body = json.dumps(agent_card, ensure_ascii=False, sort_keys=True)
+    card_headers = {
+        "ETag": f'"{hashlib.sha256(card_body.encode("utf-8")).hexdigest()[:32]}"',
+        "Cache-Control": f"max-age={Config.REGISTRY_CARD_TTL}"
+    }
+
+    async def agent_card_endpoint(request: Request):
+        if request.headers.get("if-none-match") == card_headers["ETag"]:
+            return Response(status_code=304, headers=card_headers)
+        return JSONResponse(agent_card, headers=card_headers)
+
+    for path in ("/", "/agent.json", "/a2a/agent.json", "/.well-known/agent.json"):
+        app.add_api_route(path, agent_card_endpoint, methods=["GET"])
+
+    @app.get("/a2a/health")
+    async def health():
+        status = {"status": "ok", **limiter.stats()}
+        for component, source in (monitored or {}).items():
+            if source is not None:
+                status[component] = source.stats()
+        return status
+
+    async def tasks_send(request: Request):
+        data = await request.json()
+        is_rpc = "jsonrpc" in data
+        params = data.get("params", {}) if is_rpc else data
+
+        task = Task.from_dict(params)
+        try:
+            result = await answer(extract_text(task.message))
+        except Exception as e:
+            status_code, headers = error_response(e)
+            if is_rpc:
+                error = {"code": -32603, "message": f"Internal error: {e}"}
+                return JSONResponse({"jsonrpc": "2.0", "id": data.get("id", 1), "error": error},
+                                    status_code=status_code, headers=headers)
+            task.status = TaskStatus(state=TaskState.FAILED, message={"error": str(e)})
+            return JSONResponse(task.to_dict(), status_code=status_code, headers=headers)
+
+        task.artifacts = [{"parts": [{"type": "text", "text": result}]}]
+        task.status = TaskStatus(state=TaskState.COMPLETED)
+        if is_rpc:
+            return JSONResponse({"jsonrpc": "2.0", "id": data.get("id", 1), "result": task.to_dict()})
+        return JSONResponse(task.to_dict())
+
+    for path in ("/tasks/send", "/a2a/tasks/send"):
+        app.add_api_route(path, tasks_send, methods=["POST"])
+
+    async def message_send(request: Request):
+        message = Message.from_dict(await request.json())
+        try:
+            text = message.content.text if hasattr(message.content, "text") else str(message.content)
+            result = await answer(text)
+        except Exception as e:
+            status_code, headers = error_response(e)
+            return JSONResponse(
+                {"content": {"type": "error", "message": f"Error: {e}"}, "role": "system"},
+                status_code=status_code,
+                headers=headers
+            )
+        response = Message(
+            content=TextContent(text=result),
+            role=MessageRole.AGENT,
+            parent_message_id=message.message_id,
+            conversation_id=message.conversation_id
+        )
+        return JSONResponse(response.to_dict())
+
+    for path in ("/", "/a2a"):
+        app.add_api_route(path, message_send, methods=["POST"])
+
+    if respond_stream is not None:
+        @app.post("/stream")
+        async def stream(request: Request):
+            """以 SSE 逐塊返回回答，事件格式與 python_a2a 的串流客戶端相容"""
+            data = await request.json()
+            message = Message.from_dict(data["message"] if isinstance(data.get("message"), dict) else data)
+            text = message.content.text if hasattr(message.content, "text") else str(message.content)
+            if limiter.saturated():
+                limiter.rejected += 1
+                return JSONResponse({"error": "服務器繁忙"}, status_code=503, headers={"Retry-After": "1"})
+
+            async def events():
+                index = 0
+                try:
+                    async with limiter.slot():
+                        chunks = respond_stream(text).__aiter__()
+                        deadline = asyncio.get_running_loop().time() + request_timeout
+                        while True:
+                            remaining = deadline - asyncio.get_running_loop().time()
+                            try:
+                                chunk = await asyncio.wait_for(chunks.__anext__(), timeout=max(remaining, 0))
+                            except StopAsyncIteration:
+                                break
+                            if chunk:
+                                yield sse_event({"content": chunk, "index": index, "append": True})
+                                index += 1
+                    yield sse_event({"content": "", "index": index, "append": True, "lastChunk": True})
+                except Exception as e:
+                    yield sse_event({"error": str(e) or type(e).__name__}, event="error")
+
+            return StreamingResponse(
+                events(),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
+
+    return app
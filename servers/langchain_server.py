@@ -2,57 +2,209 @@
 LangChain 服務器
 將 LangChain 組件暴露為 A2A 服務器
 """
-from langchain_openai import ChatOpenAI
+import json
+from typing import Any, AsyncIterator, Dict, Optional
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from python_a2a import run_server
+from langchain_core.runnables import RunnableLambda
+from python_a2a import AgentCard
 from python_a2a.langchain import to_a2a_server
 from config import Config
+from utils import uses_reserved_socket
+from servers.server_runner import serve_a2a_agent, serve_asgi_app
+from servers.asgi_app import create_a2a_asgi_app, ConcurrencyLimiter
+from servers.response_cache import ResponseCache, make_scope, default_cache_for
+from servers.single_flight import SingleFlight, AsyncSingleFlight, KeyFunction
+from servers.micro_batcher import MicroBatcher
+from servers.llm_pool import DEFAULT_LLM_POOL, get_chat_model
+from clients.agent_registry import registered_agent
 
 class LangChainServer:
     """LangChain 服務器類"""
     
-    def __init__(self, api_key: str):
+    PROMPT_TEMPLATE = (
+        "你是一個友善且知識豐富的助手。"
+        "請用繁體中文回答以下問題，答案要準確且有幫助。\n\n"
+        "問題: {question}\n"
+        "回答:"
+    )
+    
+    def __init__(self, api_key: str, cache: Optional[ResponseCache] = None,
+                 single_flight: bool = Config.SINGLE_FLIGHT_ENABLED,
+                 flight_key: Optional[KeyFunction] = None,
+                 batching: bool = Config.BATCH_ENABLED):
         self.api_key = api_key
         self.server = None
+        # 默認溫度較高，回答有隨機性，只有明確傳入 cache 時才緩存
+        self.cache = cache if cache is not None else default_cache_for(Config.DEFAULT_TEMPERATURE)
+        self.cache_scope = make_scope(Config.DEFAULT_MODEL, Config.DEFAULT_TEMPERATURE, self.PROMPT_TEMPLATE)
+        # 請求合併與緩存無關，相同問題同時到達時總是共用一次調用
+        self.flight = SingleFlight(flight_key) if single_flight else None
+        self.async_flight = AsyncSingleFlight(flight_key) if single_flight else None
+        self.batching = batching
+        self.batcher = None
         self._setup_chain()
     
     def _setup_chain(self):
         """設置 LangChain 鏈"""
-        # 創建 LLM
-        llm = ChatOpenAI(
-            api_key=self.api_key,
-            model=Config.DEFAULT_MODEL,
-            temperature=Config.DEFAULT_TEMPERATURE
-        )
+        # 從進程共用的客戶端池取得 LLM
+        llm = get_chat_model(Config.DEFAULT_MODEL, Config.DEFAULT_TEMPERATURE, api_key=self.api_key)
         
         # 創建提示模板
-        prompt = PromptTemplate.from_template(
-            "你是一個友善且知識豐富的助手。"
-            "請用繁體中文回答以下問題，答案要準確且有幫助。\n\n"
-            "問題: {question}\n"
-            "回答:"
-        )
+        prompt = PromptTemplate.from_template(self.PROMPT_TEMPLATE)
         
-        # 創建處理鏈
-        self.chain = prompt | llm | StrOutputParser()
+        # 創建處理鏈，啟用緩存或請求合併時在鏈前加一層查找
+        self.llm_chain = prompt | llm | StrOutputParser()
+        # 異步服務器的請求經微批次以 llm_chain.abatch 提交；串流請求逐個處理
+        if self.batching:
+            self.batcher = MicroBatcher(self.llm_chain)
+        if self.cache is not None or self.flight is not None or self.batcher is not None:
+            self.chain = RunnableLambda(self._invoke, afunc=self._ainvoke)
+        else:
+            self.chain = self.llm_chain
         
         # 轉換為 A2A 服務器
         self.server = to_a2a_server(self.chain)
     
+    @staticmethod
+    def _as_inputs(inputs: Any) -> Dict[str, Any]:
+        """統一鏈輸入：A2A 適配器傳入原始文本或 {"input": ...}，與未包裝的鏈一樣接受"""
+        if isinstance(inputs, dict):
+            if "question" in inputs:
+                return inputs
+            if "input" in inputs:
+                return {"question": str(inputs["input"])}
+        return {"question": str(inputs)}
+    
+    def _invoke(self, inputs: Any) -> str:
+        inputs = self._as_inputs(inputs)
+        question = inputs["question"]
+        answer = self.cache.get(self.cache_scope, question) if self.cache else None
+        if answer is not None:
+            return answer
+        if self.flight is not None:
+            return self.flight.do(question, self._invoke_llm, inputs)
+        return self._invoke_llm(inputs)
+    
+    def _invoke_llm(self, inputs: Any) -> str:
+        inputs = self._as_inputs(inputs)
+        answer = self.llm_chain.invoke(inputs)
+        if self.cache:
+            self.cache.set(self.cache_scope, inputs["question"], answer)
+        return answer
+    
+    async def _ainvoke(self, inputs: Any) -> str:
+        inputs = self._as_inputs(inputs)
+        question = inputs["question"]
+        answer = self.cache.get(self.cache_scope, question) if self.cache else None
+        if answer is not None:
+            return answer
+        if self.async_flight is not None:
+            return await self.async_flight.do(question, lambda: self._ainvoke_llm(inputs))
+        return await self._ainvoke_llm(inputs)
+    
+    async def _ainvoke_llm(self, inputs: Any) -> str:
+        inputs = self._as_inputs(inputs)
+        if self.batcher is not None:
+            answer = await self.batcher.submit(inputs)
+        else:
+            answer = await self.llm_chain.ainvoke(inputs)
+        if self.cache:
+            self.cache.set(self.cache_scope, inputs["question"], answer)
+        return answer
+    
     def start(self, port: int):
         """啟動服務器"""
         if self.server:
-            run_server(self.server, host=Config.DEFAULT_HOST, port=port)
+            with registered_agent(self.get_agent_card(port)):
+                serve_a2a_agent(self.server, port)
         else:
             raise RuntimeError("服務器未初始化")
+    
+    @staticmethod
+    def _prepare_input(text: str) -> Dict[str, Any]:
+        """將 A2A 消息文本轉換為鏈輸入，支援 '{"question": ...}' 形式的 JSON"""
+        try:
+            data = json.loads(text)
+        except (TypeError, ValueError):
+            data = None
+        if isinstance(data, dict) and "question" in data:
+            return {"question": str(data["question"])}
+        return {"question": text}
+    
+    async def arespond(self, text: str) -> str:
+        """異步回答問題"""
+        return await self.chain.ainvoke(self._prepare_input(text))
+    
+    async def astream(self, text: str) -> AsyncIterator[str]:
+        """以 chain.astream 逐塊產生回答；緩存命中時一次返回"""
+        inputs = self._prepare_input(text)
+        answer = self.cache.get(self.cache_scope, inputs["question"]) if self.cache else None
+        if answer is not None:
+            yield answer
+            return
+        
+        if self.async_flight is not None:
+            chunks = self.async_flight.stream(inputs["question"], lambda: self._astream_llm(inputs))
+        else:
+            chunks = self._astream_llm(inputs)
+        async for chunk in chunks:
+            yield chunk
+    
+    async def _astream_llm(self, inputs: Any) -> AsyncIterator[str]:
+        inputs = self._as_inputs(inputs)
+        chunks = []
+        async for chunk in self.llm_chain.astream(inputs):
+            chunks.append(chunk)
+            yield chunk
+        if self.cache:
+            self.cache.set(self.cache_scope, inputs["question"], "".join(chunks))
+    
+    def get_agent_card(self, port: int) -> AgentCard:
+        """獲取代理卡片"""
+        return AgentCard(
+            name="LangChain 助手",
+            description="基於 LangChain 的友善問答助手",
+            url=f"http://{Config.DEFAULT_HOST}:{port}",
+            version="1.0.0"
+        )
+    
+    def create_asgi_app(self, port: int, limiter: Optional[ConcurrencyLimiter] = None):
+        """創建異步 A2A 應用，直接以 chain.ainvoke 處理請求，並以 /stream 串流回答"""
+        return create_a2a_asgi_app(
+            self.arespond,
+            self.get_agent_card(port).to_dict(),
+            limiter=limiter,
+            respond_stream=self.astream,
+            monitored={
+                "cache": self.cache,
+                "single_flight": self.async_flight,
+                "batching": self.batcher,
+                "llm": DEFAULT_LLM_POOL
+            },
+            # 微批次只在異步服務器的事件循環中啟動，同步服務器的請求直接調用鏈
+            background=[self.batcher]
+        )
+    
+    def start_async(self, port: int):
+        """以異步模式啟動服務器，所有請求共用一個事件循環"""
+        with registered_agent(self.get_agent_card(port)):
+            serve_asgi_app(self.create_asgi_app(port), port)
 
-def create_langchain_server(api_key: str) -> LangChainServer:
+def create_langchain_server(api_key: str, cache: Optional[ResponseCache] = None) -> LangChainServer:
     """創建 LangChain 服務器實例"""
-    return LangChainServer(api_key)
+    return LangChainServer(api_key, cache=cache)
 
+@uses_reserved_socket
 def start_langchain_server(port: int):
     """啟動 LangChain 服務器的便捷函數"""
     Config.validate()
     server = create_langchain_server(Config.OPENAI_API_KEY)
-    server.start(port)
\ No newline at end of file
+    server.start(port)
+
+@uses_reserved_socket
+def start_async_langchain_server(port: int):
+    """以異步模式啟動 LangChain 服務器的便捷函數"""
+    Config.validate()
+    server = create_langchain_server(Config.OPENAI_API_KEY)
+    server.start_async(port)
\ No newline at end of file
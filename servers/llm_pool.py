@@ -0,0 +1,352 @@
+"""
+模型客戶端池
+進程內所有代理和鏈共用的 OpenAI 客戶端：共用連接池，並以全局上限限制進行中的請求數和每分鐘 token 數
+"""
+import asyncio
+import json
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Any, Dict, Optional, Tuple
+import httpx
+from config import Config
+
+class InflightLimiter:
+    """跨線程和事件循環的併發上限
+
+    同步調用者在線程中等待，異步調用者等待自己事件循環上的 future；
+    釋放名額時按先來先到直接交給下一個等待者。
+    """
+
+    def __init__(self, limit: int = Config.LLM_MAX_INFLIGHT):
+        self.limit = limit
+        self.active = 0
+        self._waiters = deque()  # threading.Event 或 (事件循環, future)
+        self._lock = threading.Lock()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def acquire(self):
+        with self._lock:
+            if self.active < self.limit and not self._waiters:
+                self.active += 1
+                return
+            event = threading.Event()
+            self._waiters.append(event)
+        # 名額由 release() 直接轉交，醒來時已經持有
+        event.wait()
+
+    async def aacquire(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.active < self.limit and not self._waiters:
+                self.active += 1
+                return
+            future = loop.create_future()
+            waiter = (loop, future)
+            self._waiters.append(waiter)
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                handed_over = waiter not in self._waiters
+                if not handed_over:
+                    self._waiters.remove(waiter)
+            # 名額已轉交給這個被取消的等待者時，交給下一個
+            if handed_over and future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            if not self._waiters:
+                self.active -= 1
+                return
+            waiter = self._waiters.popleft()
+        if isinstance(waiter, threading.Event):
+            waiter.set()
+            return
+        loop, future = waiter
+        try:
+            loop.call_soon_threadsafe(self._hand_over, future)
+        except RuntimeError:
+            # 等待者的事件循環已關閉
+            self.release()
+
+    def _hand_over(self, future: "asyncio.Future"):
+        if future.cancelled():
+            self.release()
+        else:
+            future.set_result(None)
+
+class TokenBucket:
+    """每分鐘 token 上限；預約制：先扣除估計用量，不足時返回需要等待的秒數"""
+
+    def __init__(self, tokens_per_minute: int = Config.LLM_TOKENS_PER_MINUTE):
+        self.capacity = tokens_per_minute
+        self.rate = tokens_per_minute / 60.0
+        self.level = float(tokens_per_minute)
+        self.updated = time.monotonic()
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int) -> float:
+        if self.capacity <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+            self.updated = now
+            # 單個請求超過整個預算時按預算計，避免永遠等不到
+            self.level -= min(tokens, self.capacity)
+            if self.level >= 0:
+                return 0.0
+            self.throttled += 1
+            return -self.level / self.rate
+
+def estimate_tokens(request: httpx.Request) -> int:
+    """估計請求的 token 用量：請求體大小換算的輸入 token 加上最大輸出 token"""
+    try:
+        content = request.content
+    except httpx.RequestNotRead:
+        content = b""
+    completion = Config.LLM_DEFAULT_COMPLETION_TOKENS
+    try:
+        body = json.loads(content) if content else {}
+        limit = body.get("max_completion_tokens") or body.get("max_tokens")
+        if limit:
+            completion = int(limit)
+        elif "input" in body and "messages" not in body:
+            completion = 0  # 嵌入請求沒有輸出 token
+    except (ValueError, TypeError, AttributeError):
+        pass
+    return len(content) // Config.LLM_BYTES_PER_TOKEN + completion
+
+class _Release:
+    """只釋放一次的名額"""
+
+    def __init__(self, limiter: InflightLimiter):
+        self._limiter = limiter
+        self._released = False
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._limiter.release()
+
+class _ReleasingStream(httpx.SyncByteStream):
+    # 串流回應在讀完或關閉時才釋放名額
+    def __init__(self, stream, release: _Release):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._release()
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream, release: _Release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+class LimitedTransport(httpx.HTTPTransport):
+    """共用的同步傳輸層：發送前預約 token 並取得併發名額"""
+
+    def __init__(self, pool: "LLMClientPool", **kwargs):
+        super().__init__(**kwargs)
+        self.pool = pool
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        wait = self.pool.tokens.reserve(estimate_tokens(request))
+        if wait:
+            time.sleep(wait)
+        self.pool.inflight.acquire()
+        release = _Release(self.pool.inflight)
+        try:
+            response = super().handle_request(request)
+        except BaseException:
+            release()
+            raise
+        self.pool.requests += 1
+        return httpx.Response(response.status_code, headers=response.headers,
+                              stream=_ReleasingStream(response.stream, release),
+                              extensions=response.extensions)
+
+class AsyncLimitedTransport(httpx.AsyncBaseTransport):
+    """異步傳輸層，與同步傳輸層共用同一組全局上限
+
+    異步連接綁定創建它的事件循環，每個事件循環使用自己的連接池；事件循環被回收時連接池隨之釋放。
+    """
+
+    def __init__(self, pool: "LLMClientPool", **kwargs):
+        self.pool = pool
+        self._kwargs = kwargs
+        self._transports: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncHTTPTransport]" = \
+            weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _loop_transport(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            transport = self._transports.get(loop)
+            if transport is None:
+                transport = self._transports[loop] = httpx.AsyncHTTPTransport(**self._kwargs)
+            return transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        wait = self.pool.tokens.reserve(estimate_tokens(request))
+        if wait:
+            await asyncio.sleep(wait)
+        await self.pool.inflight.aacquire()
+        release = _Release(self.pool.inflight)
+        try:
+            response = await self._loop_transport().handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+        self.pool.requests += 1
+        return httpx.Response(response.status_code, headers=response.headers,
+                              stream=_AsyncReleasingStream(response.stream, release),
+                              extensions=response.extensions)
+
+    async def aclose(self):
+        """關閉當前事件循環的連接池"""
+        with self._lock:
+            transport = self._transports.pop(asyncio.get_running_loop(), None)
+        if transport is not None:
+            await transport.aclose()
+
+class LLMClientPool:
+    """進程內的模型客戶端註冊表
+
+    同步請求共用一個 httpx.Client，異步請求共用一個 httpx.AsyncClient（按事件循環區分連接），
+    所有客戶端經過同一組併發和 token 上限。
+    OpenAI 客戶端按 (API key, base URL)、LangChain 模型按 (模型, base URL, API key, 參數) 緩存。
+    """
+
+    def __init__(self, max_inflight: int = Config.LLM_MAX_INFLIGHT,
+                 tokens_per_minute: int = Config.LLM_TOKENS_PER_MINUTE,
+                 max_connections: int = Config.LLM_MAX_CONNECTIONS,
+                 max_keepalive: int = Config.LLM_MAX_KEEPALIVE,
+                 timeout: float = Config.REQUEST_TIMEOUT):
+        self.inflight = InflightLimiter(max_inflight)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.requests = 0
+        self._limits = httpx.Limits(max_connections=max_connections,
+                                    max_keepalive_connections=max_keepalive)
+        self._timeout = httpx.Timeout(timeout, connect=10.0)
+        self._http: Optional[httpx.Client] = None
+        self._async_http: Optional[httpx.AsyncClient] = None
+        self._clients: Dict[Tuple, Any] = {}
+        self._lock = threading.Lock()
+
+    def http_client(self) -> httpx.Client:
+        """進程共用的同步 HTTP 客戶端"""
+        with self._lock:
+            if self._http is None:
+                self._http = httpx.Client(transport=LimitedTransport(self, limits=self._limits),
+                                          timeout=self._timeout)
+            return self._http
+
+    def async_http_client(self) -> httpx.AsyncClient:
+        """進程共用的異步 HTTP 客戶端"""
+        with self._lock:
+            if self._async_http is None:
+                self._async_http = httpx.AsyncClient(transport=AsyncLimitedTransport(self, limits=self._limits),
+                                                     timeout=self._timeout)
+            return self._async_http
+
+    def _cached(self, key: Tuple, factory):
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self._clients[key] = factory()
+            return client
+
+    def openai_client(self, api_key: str = Config.OPENAI_API_KEY,
+                      base_url: Optional[str] = Config.OPENAI_BASE_URL):
+        """共用連接池的同步 OpenAI 客戶端"""
+        from openai import OpenAI
+
+        http = self.http_client()
+        return self._cached(("openai", api_key, base_url),
+                            lambda: OpenAI(api_key=api_key, base_url=base_url, http_client=http))
+
+    def async_openai_client(self, api_key: str = Config.OPENAI_API_KEY,
+                            base_url: Optional[str] = Config.OPENAI_BASE_URL):
+        """共用連接池的異步 OpenAI 客戶端"""
+        from openai import AsyncOpenAI
+
+        http = self.async_http_client()
+        return self._cached(("async_openai", api_key, base_url),
+                            lambda: AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http))
+
+    def chat_model(self, model: str = Config.DEFAULT_MODEL,
+                   temperature: float = Config.DEFAULT_TEMPERATURE,
+                   api_key: str = Config.OPENAI_API_KEY,
+                   base_url: Optional[str] = Config.OPENAI_BASE_URL, **kwargs):
+        """共用連接池的 LangChain ChatOpenAI；相同參數返回同一個實例"""
+        from langchain_openai import ChatOpenAI
+
+        http = self.http_client()
+        async_http = self.async_http_client()
+        key = ("chat", model, base_url, api_key, temperature, tuple(sorted(kwargs.items())))
+        return self._cached(key, lambda: ChatOpenAI(
+            model=model,
+            temperature=temperature,
+            api_key=api_key,
+            base_url=base_url,
+            http_client=http,
+            http_async_client=async_http,
+            **kwargs
+        ))
+
+    def stats(self) -> Dict[str, Any]:
+        """併發與 token 上限的統計"""
+        return {
+            "requests": self.requests,
+            "inflight": self.inflight.active,
+            "waiting": self.inflight.waiting,
+            "max_inflight": self.inflight.limit,
+            "tokens_per_minute": self.tokens.capacity,
+            "throttled": self.tokens.throttled
+        }
+
+DEFAULT_LLM_POOL = LLMClientPool()
+
+def get_openai_client(api_key: str = Config.OPENAI_API_KEY,
+                      base_url: Optional[str] = Config.OPENAI_BASE_URL):
+    """從默認客戶端池取得同步 OpenAI 客戶端"""
+    return DEFAULT_LLM_POOL.openai_client(api_key, base_url)
+
+def get_async_openai_client(api_key: str = Config.OPENAI_API_KEY,
+                            base_url: Optional[str] = Config.OPENAI_BASE_URL):
+    """從默認客戶端池取得異步 OpenAI 客戶端"""
+    return DEFAULT_LLM_POOL.async_openai_client(api_key, base_url)
+
+def get_chat_model(model: str = Config.DEFAULT_MODEL,
+                   temperature: float = Config.DEFAULT_TEMPERATURE,
+                   api_key: str = Config.OPENAI_API_KEY, **kwargs):
+    """從默認客戶端池取得 LangChain ChatOpenAI"""
+    return DEFAULT_LLM_POOL.chat_model(model, temperature, api_key, **kwargs)
\ No newline at end of file
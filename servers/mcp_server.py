@@ -2,16 +2,48 @@
 MCP 服務器
 創建和管理 MCP (Model Context Protocol) 服務器
 """
+import functools
+from typing import Any, Dict, List, Optional
 from python_a2a.mcp import FastMCP, text_response
-from python_a2a.langchain import to_mcp_server
-from tools.calculator import CalculatorTool
-from tools.text_tools import TextLengthTool, TextCountTool
+from tools.calculator import CalculatorTool, VectorizedCalculator, format_exact
+from tools.text_tools import TextLengthTool, TextCountTool, TextTransformTool, TextValidatorTool
+from tools.text_stats import compute_text_stats
+from tools.text_pipeline import TextPipelineTool
+from tools.text_source import iter_lines, source_name, text_chunks, transform_file
+from tools.validators import DEFAULT_REGISTRY
+from tools.expression_engine import get_engine, ExpressionError
+from tools.sandbox import SandboxError, ToolSandbox, create_tool_sandbox
 from config import Config
+from utils import uses_reserved_socket
+from servers.server_runner import serve_mcp_server
+
+def sandboxed_tool(server: FastMCP, sandbox: Optional[ToolSandbox], name: str, description: str):
+    """註冊 MCP 工具；設置了沙箱時工具在沙箱 worker 中執行，服務器只等待結果
+    
+    處理函數保留原函數的簽名，FastMCP 仍以它生成參數 schema。
+    """
+    def decorator(func):
+        if sandbox is None:
+            return server.tool(name=name, description=description)(func)
+        
+        sandbox.register(name, func)
+        
+        @functools.wraps(func)
+        async def handler(**kwargs):
+            try:
+                return await sandbox.acall(name, **kwargs)
+            except SandboxError as e:
+                return text_response(f"錯誤: {e}")
+        
+        server.tool(name=name, description=description)(handler)
+        return func
+    return decorator
 
 class SimpleMCPServer:
     """簡單的 MCP 服務器"""
     
-    def __init__(self):
+    def __init__(self, sandboxed: bool = Config.SANDBOX_ENABLED):
+        self.sandbox = create_tool_sandbox(sandboxed)
         self.server = FastMCP(
             name="基本工具集",
             description="提供基本實用工具的 MCP 服務器"
@@ -21,66 +53,128 @@ class SimpleMCPServer:
     def _register_tools(self):
         """註冊工具"""
         
-        @self.server.tool(
+        @sandboxed_tool(
+            self.server, self.sandbox,
             name="text_length",
-            description="計算文本的字符長度"
+            description="計算文本的字符長度；大文件可改用 path 參數傳入 TEXT_FILE_ROOT 下的路徑"
         )
-        def text_length(text: str):
+        def text_length(text: str = "", path: str = ""):
             """計算文本長度工具"""
             try:
-                length = len(text)
-                return text_response(f"文本 '{text[:50]}...' 的長度是 {length} 個字符")
+                length = sum(map(len, text_chunks(text, path)))
+                name = source_name(path)
+                source = f"文件 {name} " if name else "文本"
+                return text_response(f"{source}的長度是 {length} 個字符")
             except Exception as e:
                 return text_response(f"錯誤: {e}")
         
-        @self.server.tool(
+        @sandboxed_tool(
+            self.server, self.sandbox,
             name="word_count",
-            description="計算文本的單詞數量"
+            description="計算文本的單詞數量；大文件可改用 path 參數傳入 TEXT_FILE_ROOT 下的路徑"
         )
-        def word_count(text: str):
+        def word_count(text: str = "", path: str = ""):
             """計算單詞數量工具"""
             try:
-                words = text.split()
-                word_count = len(words)
-                return text_response(f"文本包含 {word_count} 個單詞")
+                stats = compute_text_stats(text_chunks(text, path), frequencies=False, sentences=False)
+                return text_response(f"文本包含 {stats.words} 個單詞")
             except Exception as e:
                 return text_response(f"錯誤: {e}")
         
-        @self.server.tool(
+        @sandboxed_tool(
+            self.server, self.sandbox,
             name="text_reverser",
-            description="反轉文本內容"
+            description="反轉文本內容；傳入 path 時結果寫入同目錄的新文件"
         )
-        def text_reverser(text: str):
+        def text_reverser(text: str = "", path: str = ""):
             """文本反轉工具"""
             try:
+                if path:
+                    output, characters = transform_file(path, "reverse")
+                    return text_response(f"反轉後的文本已寫入 {output}，共 {characters} 個字符")
                 reversed_text = text[::-1]
                 return text_response(f"反轉後的文本: {reversed_text}")
             except Exception as e:
                 return text_response(f"錯誤: {e}")
         
-        @self.server.tool(
+        @sandboxed_tool(
+            self.server, self.sandbox,
             name="text_upper",
-            description="將文本轉換為大寫"
+            description="將文本轉換為大寫；傳入 path 時結果寫入同目錄的新文件"
         )
-        def text_upper(text: str):
+        def text_upper(text: str = "", path: str = ""):
             """文本轉大寫工具"""
             try:
+                if path:
+                    output, characters = transform_file(path, "upper")
+                    return text_response(f"大寫文本已寫入 {output}，共 {characters} 個字符")
                 upper_text = text.upper()
                 return text_response(f"大寫文本: {upper_text}")
             except Exception as e:
                 return text_response(f"錯誤: {e}")
+        
+        text_pipeline_tool = TextPipelineTool()
+        
+        @sandboxed_tool(
+            self.server, self.sandbox,
+            name="text_pipeline",
+            description="在服務器端依序執行多個文本轉換（upper、lower、title、reverse、capitalize、swapcase）"
+                        "和統計（length、word_count、line_count、stats、analyze），一次調用只返回統計結果"
+        )
+        def text_pipeline(operations: List[str], text: str = "", path: str = "", return_text: bool = False):
+            """文本管道工具
+            
+            Args:
+                operations: 依序執行的操作，統計記錄它所在位置的文本結果
+                text: 輸入文本
+                path: TEXT_FILE_ROOT 下的文件，可代替 text
+                return_text: 是否返回最終文本；文件輸入時寫入同目錄的 .pipeline 文件
+            """
+            return text_response(text_pipeline_tool.run(operations, text, path, return_text))
     
     def start(self, port: int):
         """啟動 MCP 服務器"""
-        self.server.run(host=Config.DEFAULT_HOST, port=port)
+        # 在開始服務前 fork 出沙箱 worker
+        if self.sandbox is not None:
+            self.sandbox.start()
+        serve_mcp_server(self.server, port)
+
+def publish_langchain_tools(tools, name: str = "LangChain Tools",
+                            description: str = "MCP server exposing LangChain tools",
+                            sandbox: Optional[ToolSandbox] = None) -> FastMCP:
+    """把 LangChain 工具發布為 MCP 工具，參數 schema 直接取自工具的 args_schema
+    
+    調用時由工具自身以同一 schema 驗證參數，列表等結構化參數不需要再拼接成字符串。
+    設置了沙箱時工具在沙箱 worker 中執行。
+    """
+    server = FastMCP(name=name, description=description)
+    
+    def create_handler(tool):
+        if sandbox is not None:
+            sandbox.register(tool.name, tool.invoke)
+        
+        async def handler(**kwargs):
+            if sandbox is None:
+                return text_response(await tool.ainvoke(kwargs))
+            try:
+                return text_response(await sandbox.acall(tool.name, kwargs))
+            except SandboxError as e:
+                return text_response(f"錯誤: {e}")
+        return handler
+    
+    for tool in tools:
+        server.tool(name=tool.name, description=tool.description)(create_handler(tool))
+        server.tools[tool.name].parameters = tool.args_schema.model_json_schema()
+    return server
 
 class LangChainMCPServer:
     """基於 LangChain 工具的 MCP 服務器"""
     
-    def __init__(self):
+    def __init__(self, sandboxed: bool = Config.SANDBOX_ENABLED):
         self.tools = []
         self._setup_tools()
-        self.server = to_mcp_server(self.tools)
+        self.sandbox = create_tool_sandbox(sandboxed)
+        self.server = publish_langchain_tools(self.tools, sandbox=self.sandbox)
     
     def _setup_tools(self):
         """設置 LangChain 工具"""
@@ -94,15 +188,25 @@ class LangChainMCPServer:
         
         text_count_tool = TextCountTool()
         self.tools.append(text_count_tool.get_langchain_tool())
+        
+        text_transform_tool = TextTransformTool()
+        self.tools.append(text_transform_tool.get_langchain_tool())
+        
+        text_validator_tool = TextValidatorTool()
+        self.tools.append(text_validator_tool.get_langchain_tool())
     
     def start(self, port: int):
         """啟動服務器"""
-        self.server.run(host=Config.DEFAULT_HOST, port=port)
+        # 在開始服務前 fork 出沙箱 worker
+        if self.sandbox is not None:
+            self.sandbox.start()
+        serve_mcp_server(self.server, port)
 
 class AdvancedMCPServer:
     """進階 MCP 服務器"""
     
-    def __init__(self):
+    def __init__(self, sandboxed: bool = Config.SANDBOX_ENABLED):
+        self.sandbox = create_tool_sandbox(sandboxed)
         self.server = FastMCP(
             name="進階工具集",
             description="提供進階分析和處理工具"
@@ -112,64 +216,127 @@ class AdvancedMCPServer:
     def _register_advanced_tools(self):
         """註冊進階工具"""
         
-        @self.server.tool(
+        @sandboxed_tool(
+            self.server, self.sandbox,
             name="text_analyzer",
-            description="分析文本的詳細統計資訊"
+            description="分析文本的詳細統計資訊；大文件可改用 path 參數傳入 TEXT_FILE_ROOT 下的路徑"
         )
-        def text_analyzer(text: str):
+        def text_analyzer(text: str = "", path: str = ""):
             """文本分析工具"""
             try:
-                char_count = len(text)
-                word_count = len(text.split())
-                line_count = len(text.split('\n'))
-                
-                # 字符統計
-                letters = sum(c.isalpha() for c in text)
-                digits = sum(c.isdigit() for c in text)
-                spaces = sum(c.isspace() for c in text)
+                stats = compute_text_stats(text_chunks(text, path), frequencies=False, sentences=False)
+                name = source_name(path)
                 
-                analysis = f"""文本分析結果:
+                analysis = f"""文本分析結果{f' (文件: {name})' if name else ''}:
 📊 基本統計:
-   - 總字符數: {char_count}
-   - 單詞數: {word_count}
-   - 行數: {line_count}
+   - 總字符數: {stats.characters}
+   - 單詞數: {stats.words}
+   - 行數: {stats.lines}
 
 🔤 字符分類:
-   - 字母: {letters}
-   - 數字: {digits}
-   - 空格: {spaces}
-   - 其他: {char_count - letters - digits - spaces}"""
+   - 字母: {stats.letters}
+   - 數字: {stats.digits}
+   - 空格: {stats.spaces}
+   - 其他: {stats.others}"""
                 
                 return text_response(analysis)
             except Exception as e:
                 return text_response(f"分析錯誤: {e}")
         
-        @self.server.tool(
+        @sandboxed_tool(
+            self.server, self.sandbox,
             name="math_evaluator",
             description="安全地計算數學表達式"
         )
-        def math_evaluator(expression: str):
-            """數學表達式求值工具"""
+        def math_evaluator(expression: str, numeric: str = "float", precision: int = 0):
+            """數學表達式求值工具
+            
+            Args:
+                expression: 數學表達式
+                numeric: 數值模式：float、decimal（十進位）或 fraction（精確分數）
+                precision: decimal 模式的有效數字位數，0 表示使用默認值
+            """
             try:
-                # 安全檢查
-                allowed_chars = set('0123456789+-*/(). ')
-                if not all(c in allowed_chars for c in expression):
-                    return text_response("錯誤: 表達式包含不允許的字符")
-                
                 # 避免過於複雜的表達式
                 if len(expression) > 100:
                     return text_response("錯誤: 表達式過長")
                 
-                result = eval(expression)
-                return text_response(f"計算結果: {expression} = {result}")
+                # 與 CalculatorTool 共用同一個基本算術引擎和編譯緩存
+                result = get_engine("basic").evaluate(expression, numeric=numeric, precision=precision or None)
+                return text_response(f"計算結果: {expression} = {format_exact(result, precision or None)}")
             except ZeroDivisionError:
                 return text_response("錯誤: 除零錯誤")
+            except ExpressionError as e:
+                return text_response(f"錯誤: {e}")
             except Exception as e:
                 return text_response(f"計算錯誤: {e}")
+        
+        vectorized_calculator = VectorizedCalculator()
+        
+        @sandboxed_tool(
+            self.server, self.sandbox,
+            name="batch_evaluator",
+            description="對同一個數學表達式批次代入多組參數求值，一次調用完成參數掃描"
+        )
+        def batch_evaluator(expression: str, variables: Dict[str, Any],
+                            grid: bool = False, summary_only: bool = False):
+            """批次表達式求值工具
+            
+            Args:
+                expression: 含自由變數的表達式，例如 sin(x)*r
+                variables: 變數值：數值、列表或 {"start", "stop", "num"} 等距範圍
+                grid: 為 true 時對所有列表取笛卡兒積
+                summary_only: 為 true 時只返回最小值、最大值和平均值
+            """
+            return text_response(vectorized_calculator.evaluate(expression, variables, grid, summary_only))
+        
+        @sandboxed_tool(
+            self.server, self.sandbox,
+            name="text_validator",
+            description="批次驗證電子郵件、URL、電話號碼、IP 等格式，返回每種類型的數量和無效值示例"
+        )
+        def text_validator(values: Optional[List[str]] = None, text: str = "", path: str = "",
+                           validation_types: str = "email"):
+            """批次驗證工具
+            
+            Args:
+                values: 待驗證的值列表
+                text: 按行分隔的值，可代替 values
+                path: TEXT_FILE_ROOT 下按行分隔的文件
+                validation_types: 驗證類型，可用逗號分隔多個類型，auto 表示全部類型
+            """
+            try:
+                if values is None:
+                    values = iter_lines(text_chunks(text, path))
+                return text_response(DEFAULT_REGISTRY.validate_many(values, validation_types).summary())
+            except Exception as e:
+                return text_response(f"驗證錯誤: {e}")
+        
+        text_pipeline_tool = TextPipelineTool()
+        
+        @sandboxed_tool(
+            self.server, self.sandbox,
+            name="text_pipeline",
+            description="在服務器端依序執行多個文本轉換（upper、lower、title、reverse、capitalize、swapcase）"
+                        "和統計（length、word_count、line_count、stats、analyze），一次調用只返回統計結果"
+        )
+        def text_pipeline(operations: List[str], text: str = "", path: str = "", return_text: bool = False):
+            """文本管道工具
+            
+            Args:
+                operations: 依序執行的操作，統計記錄它所在位置的文本結果
+                text: 輸入文本
+                path: TEXT_FILE_ROOT 下的文件，可代替 text
+                return_text: 是否返回最終文本；文件輸入時寫入同目錄的 .pipeline 文件
+            """
+            return text_response(text_pipeline_tool.run(operations, text, path, return_text))
     
     def start(self, port: int):
         """啟動進階 MCP 服務器"""
-        self.server.run(host=Config.DEFAULT_HOST, port=port)
+        # 在開始服務前 fork 出沙箱 worker
+        if self.sandbox is not None:
+            self.sandbox.start()
+        serve_mcp_server(self.server, port)
 
 def create_simple_mcp_server() -> SimpleMCPServer:
     """創建簡單 MCP 服務器"""
@@ -183,16 +350,19 @@ def create_advanced_mcp_server() -> AdvancedMCPServer:
     """創建進階 MCP 服務器"""
     return AdvancedMCPServer()
 
+@uses_reserved_socket
 def start_simple_mcp_server(port: int):
     """啟動簡單 MCP 服務器的便捷函數"""
     server = create_simple_mcp_server()
     server.start(port)
 
+@uses_reserved_socket
 def start_langchain_mcp_server(port: int):
     """啟動 LangChain MCP 服務器的便捷函數"""
     server = create_langchain_mcp_server()
     server.start(port)
 
+@uses_reserved_socket
 def start_advanced_mcp_server(port: int):
     """啟動進階 MCP 服務器的便捷函數"""
     server = create_advanced_mcp_server()
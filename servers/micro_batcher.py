@@ -0,0 +1,153 @@
+"""
+微批次處理
+在短時間窗口內收集多個請求，以 Runnable.abatch 一次提交，再把結果分發回各個調用者
+"""
+import asyncio
+import weakref
+from typing import Any, Dict, List, Optional, Tuple
+from config import Config
+from servers.asgi_app import ServerOverloadedError
+
+class MicroBatcher:
+    """LangChain Runnable 的微批次提交器
+
+    第一個請求到達後最多等待 max_wait_ms 毫秒或湊滿 max_batch_size 個請求，
+    然後以 abatch 提交；批內由 max_concurrency 限制同時進行的上游調用。
+    排隊的請求達到 max_queue 時拒絕新請求。
+
+    批次只在以 start() 綁定的長期事件循環（異步服務器的事件循環）中進行；
+    其他事件循環的請求（例如同步服務器每個請求一個 asyncio.run）直接以 ainvoke 調用，
+    不必等待湊批，也不會讓批次器持有這些事件循環。
+    """
+
+    def __init__(self, runnable,
+                 max_batch_size: int = Config.BATCH_MAX_SIZE,
+                 max_wait_ms: float = Config.BATCH_MAX_WAIT_MS,
+                 max_queue: int = Config.BATCH_MAX_QUEUE,
+                 max_concurrency: int = Config.BATCH_MAX_CONCURRENCY):
+        self.runnable = runnable
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue = max_queue
+        self.max_concurrency = max_concurrency
+
+        self.submitted = 0
+        self.rejected = 0
+        self.bypassed = 0
+        self.batches = 0
+        self.largest_batch = 0
+        self._batched_items = 0
+        self._total_wait = 0.0
+        self.in_flight = 0
+
+        # 綁定的事件循環只以弱引用保存；隊列和分派任務在 close() 或事件循環關閉後釋放
+        self._loop: Optional["weakref.ReferenceType[asyncio.AbstractEventLoop]"] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._running = set()
+
+    async def start(self):
+        """在當前事件循環中啟動分派任務，之後這個事件循環中的請求都經過批次"""
+        if self._bound_loop() is asyncio.get_running_loop():
+            return
+        self._queue = asyncio.Queue()
+        self._dispatcher = asyncio.ensure_future(self._dispatch(self._queue))
+        self._loop = weakref.ref(asyncio.get_running_loop())
+
+    def _bound_loop(self) -> Optional[asyncio.AbstractEventLoop]:
+        loop = self._loop() if self._loop is not None else None
+        if loop is None or loop.is_closed() or self._dispatcher is None or self._dispatcher.done():
+            # 綁定的事件循環已結束：放開隊列和任務，讓事件循環可以被回收
+            self._loop = self._queue = self._dispatcher = None
+            return None
+        return loop
+
+    async def submit(self, inputs: Any) -> Any:
+        """提交一個輸入並等待它在批次中的結果；不在綁定的事件循環中時直接調用"""
+        loop = asyncio.get_running_loop()
+        if self._bound_loop() is not loop:
+            self.bypassed += 1
+            return await self.runnable.ainvoke(inputs)
+        if self._queue.qsize() >= self.max_queue:
+            self.rejected += 1
+            raise ServerOverloadedError(f"批次隊列已滿 ({self.max_queue})")
+
+        future = loop.create_future()
+        self.submitted += 1
+        self._queue.put_nowait((inputs, future, loop.time()))
+        return await future
+
+    async def _dispatch(self, queue: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # 調用者已經放棄的請求不再提交
+            batch = [item for item in batch if not item[1].done()]
+            if not batch:
+                continue
+            task = asyncio.ensure_future(self._run(batch, loop.time()))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future, float]], started: float):
+        self.batches += 1
+        self.largest_batch = max(self.largest_batch, len(batch))
+        self._batched_items += len(batch)
+        self._total_wait += sum(started - queued for _, _, queued in batch)
+        self.in_flight += len(batch)
+        try:
+            results = await self.runnable.abatch(
+                [inputs for inputs, _, _ in batch],
+                config={"max_concurrency": self.max_concurrency},
+                return_exceptions=True
+            )
+        except Exception as e:
+            results = [e] * len(batch)
+        finally:
+            self.in_flight -= len(batch)
+
+        for (_, future, _), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, float]:
+        """批次統計"""
+        return {
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "avg_batch_size": self._batched_items / self.batches if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "avg_wait_ms": self._total_wait / self._batched_items * 1000 if self._batched_items else 0.0,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "bypassed": self.bypassed,
+            "in_flight": self.in_flight,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "max_concurrency": self.max_concurrency
+        }
+
+    async def close(self):
+        """停止分派並解除綁定；排隊中尚未提交的請求會收到取消"""
+        queue, dispatcher = self._queue, self._dispatcher
+        self._loop = self._queue = self._dispatcher = None
+        if dispatcher is not None:
+            dispatcher.cancel()
+        if queue is not None:
+            while not queue.empty():
+                _, future, _ = queue.get_nowait()
+                future.cancel()
\ No newline at end of file
@@ -0,0 +1,274 @@
+"""
+回應緩存
+以模型、溫度、系統提示和規範化問題為鍵緩存 LLM 回答，支援記憶體 LRU、SQLite 與語義相似查詢
+"""
+import hashlib
+import json
+import math
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from config import Config
+
+EmbeddingFunction = Callable[[str], Sequence[float]]
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = "?？!！。.,，;；:： "
+
+def normalize_question(question: str) -> str:
+    """規範化問題：全半形統一、忽略大小寫、合併空白、去掉結尾標點"""
+    text = unicodedata.normalize("NFKC", question).casefold()
+    text = _WHITESPACE.sub(" ", text).strip()
+    return text.rstrip(_TRAILING_PUNCTUATION)
+
+def make_scope(model: str, temperature: float, system_prompt: str) -> str:
+    """同一模型、溫度和系統提示的回答才能互相復用"""
+    raw = json.dumps([model, round(float(temperature), 3), system_prompt], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def make_cache_key(scope: str, question: str) -> str:
+    """緩存鍵"""
+    return hashlib.sha256(f"{scope}\n{normalize_question(question)}".encode("utf-8")).hexdigest()
+
+class MemoryCacheBackend:
+    """記憶體 LRU 緩存，條目超過 ttl 秒後失效"""
+
+    def __init__(self, max_entries: int = Config.RESPONSE_CACHE_MAX_ENTRIES,
+                 ttl: Optional[float] = Config.RESPONSE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at and expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str):
+        expires_at = time.monotonic() + self.ttl if self.ttl else 0
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class SQLiteCacheBackend:
+    """SQLite 磁碟緩存，重啟後仍然有效"""
+
+    def __init__(self, path: str = Config.RESPONSE_CACHE_PATH,
+                 ttl: Optional[float] = Config.RESPONSE_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at and expires_at < time.time():
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            return value
+
+    def set(self, key: str, value: str):
+        expires_at = time.time() + self.ttl if self.ttl else 0
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at)
+            )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+class SemanticIndex:
+    """語義索引：以嵌入向量的餘弦相似度找出近似的已緩存問題"""
+
+    def __init__(self, embed: EmbeddingFunction,
+                 threshold: float = Config.SEMANTIC_CACHE_THRESHOLD,
+                 max_entries: int = Config.RESPONSE_CACHE_MAX_ENTRIES):
+        self.embed = embed
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[str, List[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _unit(vector: Sequence[float]) -> List[float]:
+        norm = math.sqrt(sum(x * x for x in vector))
+        return [x / norm for x in vector] if norm else list(vector)
+
+    def lookup(self, scope: str, question: str) -> Optional[str]:
+        """返回最相似且超過閾值的緩存鍵"""
+        with self._lock:
+            candidates = [(key, vector) for key, (entry_scope, vector) in self._entries.items()
+                          if entry_scope == scope]
+        if not candidates:
+            return None
+
+        query = self._unit(self.embed(normalize_question(question)))
+        best_key, best_score = None, self.threshold
+        for key, vector in candidates:
+            score = sum(a * b for a, b in zip(query, vector))
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+
+    def add(self, scope: str, question: str, key: str):
+        vector = self._unit(self.embed(normalize_question(question)))
+        with self._lock:
+            self._entries[key] = (scope, vector)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class ResponseCache:
+    """LLM 回答緩存
+
+    先以規範化問題精確查找，未命中且設置了語義索引時再找相似問題。
+    """
+
+    def __init__(self, backend=None, semantic: Optional[SemanticIndex] = None):
+        self.backend = backend if backend is not None else MemoryCacheBackend()
+        self.semantic = semantic
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, scope: str, question: str) -> Optional[str]:
+        """查找緩存的回答"""
+        value = self.backend.get(make_cache_key(scope, question))
+        semantic_hit = False
+        if value is None and self.semantic is not None:
+            key = self.semantic.lookup(scope, question)
+            if key is not None:
+                value = self.backend.get(key)
+                semantic_hit = value is not None
+
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                if semantic_hit:
+                    self.semantic_hits += 1
+        return value
+
+    def set(self, scope: str, question: str, answer: str):
+        """保存回答"""
+        key = make_cache_key(scope, question)
+        self.backend.set(key, answer)
+        if self.semantic is not None:
+            self.semantic.add(scope, question, key)
+
+    def clear(self):
+        """清空緩存"""
+        self.backend.clear()
+        if self.semantic is not None:
+            self.semantic.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """命中統計"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self.backend)
+            }
+
+def openai_embedding_function(api_key: str, model: str = Config.EMBEDDING_MODEL) -> EmbeddingFunction:
+    """以 OpenAI Embeddings API 計算問題向量"""
+    from servers.llm_pool import get_openai_client
+
+    client = get_openai_client(api_key)
+
+    def embed(text: str) -> List[float]:
+        return client.embeddings.create(model=model, input=text).data[0].embedding
+
+    return embed
+
+def create_response_cache(backend: str = Config.RESPONSE_CACHE_BACKEND,
+                          embed: Optional[EmbeddingFunction] = None,
+                          threshold: float = Config.SEMANTIC_CACHE_THRESHOLD) -> ResponseCache:
+    """創建回應緩存
+
+    Args:
+        backend: "memory" 或 "sqlite"
+        embed: 嵌入函數，提供時啟用語義相似查找
+        threshold: 語義命中所需的最低餘弦相似度
+    """
+    if backend == "memory":
+        store = MemoryCacheBackend()
+    elif backend == "sqlite":
+        store = SQLiteCacheBackend()
+    else:
+        raise ValueError(f"未知的緩存後端: {backend}")
+
+    semantic = SemanticIndex(embed, threshold=threshold) if embed is not None else None
+    return ResponseCache(store, semantic)
+
+_default_cache: Optional[ResponseCache] = None
+_default_cache_lock = threading.Lock()
+
+def get_default_cache() -> ResponseCache:
+    """進程內共用的回應緩存"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = create_response_cache()
+        return _default_cache
+
+def default_cache_for(temperature: float) -> Optional[ResponseCache]:
+    """低溫度的回答足夠穩定，默認啟用緩存；其餘默認不緩存"""
+    if Config.RESPONSE_CACHE_ENABLED and temperature <= Config.RESPONSE_CACHE_MAX_TEMPERATURE:
+        return get_default_cache()
+    return None
\ No newline at end of file
@@ -0,0 +1,98 @@
+"""
+服務器運行工具
+以 PortManager 預先綁定的監聽 socket 運行 A2A (WSGI) 與 MCP (ASGI) 服務器
+"""
+import socket
+import threading
+from config import Config
+from utils import PortManager, ServerManager, ServerHandle
+
+def bind_listening_socket(port: int) -> socket.socket:
+    """取得端口的監聽 socket，優先接手 PortManager 預先綁定的 socket"""
+    sock = PortManager.claim_socket(port)
+    if sock is None:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((Config.DEFAULT_HOST, port))
+        sock.listen(Config.SOCKET_BACKLOG)
+    return sock
+
+class InFlightCounter:
+    """WSGI 中間件：統計進行中的請求數，回應迭代器關閉時才算完成"""
+    
+    def __init__(self, app):
+        self.app = app
+        self.count = 0
+        self._lock = threading.Lock()
+    
+    def _done(self):
+        with self._lock:
+            self.count -= 1
+    
+    def __call__(self, environ, start_response):
+        from werkzeug.wsgi import ClosingIterator
+
+        with self._lock:
+            self.count += 1
+        try:
+            result = self.app(environ, start_response)
+        except BaseException:
+            self._done()
+            raise
+        return ClosingIterator(result, [self._done])
+
+def serve_wsgi_app(app, port: int):
+    """在已綁定的 socket 上運行 WSGI 應用"""
+    from werkzeug.serving import make_server
+
+    counter = InFlightCounter(app)
+    sock = bind_listening_socket(port)
+    # make_server 會複製文件描述符，原 socket 可以立即關閉
+    server = make_server(Config.DEFAULT_HOST, port, counter, threaded=True, fd=sock.fileno())
+    sock.close()
+    
+    ServerManager.register_handle(port, ServerHandle(
+        shutdown=server.shutdown,
+        inflight=lambda: counter.count,
+        close=server.server_close
+    ))
+    server.serve_forever()
+
+def serve_asgi_app(app, port: int):
+    """在已綁定的 socket 上運行 ASGI 應用"""
+    import uvicorn
+
+    sock = bind_listening_socket(port)
+    config = uvicorn.Config(app, host=Config.DEFAULT_HOST, port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    
+    def shutdown():
+        # uvicorn 會停止監聽並等待現有連接上的請求完成
+        server.should_exit = True
+    
+    ServerManager.register_handle(port, ServerHandle(
+        shutdown=shutdown,
+        inflight=lambda: len(server.server_state.tasks)
+    ))
+    try:
+        server.run(sockets=[sock])
+    finally:
+        sock.close()
+
+def serve_a2a_agent(agent, port: int):
+    """運行 A2A 代理服務器（取代 python_a2a.run_server 的自行綁定）"""
+    from python_a2a.server.http import create_flask_app
+
+    serve_wsgi_app(create_flask_app(agent), port)
+
+def serve_mcp_server(mcp_server, port: int):
+    """運行 MCP 服務器（取代 FastMCP.run 的自行綁定）"""
+    try:
+        from python_a2a.mcp.transport import create_fastapi_app
+    except ImportError:
+        # 舊版 python_a2a 沒有獨立的 app 工廠，只能交回 FastMCP.run 自行綁定
+        PortManager.unbind_reserved(port)
+        mcp_server.run(host=Config.DEFAULT_HOST, port=port)
+        return
+
+    serve_asgi_app(create_fastapi_app(mcp_server), port)
@@ -0,0 +1,206 @@
+"""
+請求合併 (single-flight)
+相同的問題同時到達時只向上游發起一次調用，結果分發給所有等待者
+"""
+import asyncio
+import concurrent.futures
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional
+from config import Config
+from servers.response_cache import normalize_question
+
+KeyFunction = Callable[[Any], Hashable]
+
+class SingleFlightTimeout(TimeoutError):
+    """等待合併中的上游調用超時"""
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+class _Broadcast:
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Condition()
+        self.task: Optional[asyncio.Task] = None
+
+class _Flight:
+    def __init__(self, loop: asyncio.AbstractEventLoop, task: asyncio.Task):
+        self.loop = loop
+        self.task = task
+        # 其他事件循環的等待者經由線程安全的 future 取得結果
+        self.result: concurrent.futures.Future = concurrent.futures.Future()
+
+class _FlightStats(ABC):
+    """線程版和異步版共用的鍵函數、超時和統計"""
+
+    def __init__(self, key_func: Optional[KeyFunction], timeout: Optional[float]):
+        self.key_func = key_func or normalize_question
+        self.timeout = timeout
+        self.leaders = 0
+        self.shared = 0
+
+    def stats(self) -> Dict[str, int]:
+        """合併統計：leaders 為實際的上游調用數，shared 為搭便車的請求數"""
+        return {"leaders": self.leaders, "shared": self.shared, "in_flight": self.in_flight()}
+
+    @abstractmethod
+    def in_flight(self) -> int:
+        """進行中的上游調用數"""
+
+class SingleFlight(_FlightStats):
+    """線程版請求合併，用於 WSGI 服務器的工作線程"""
+
+    def __init__(self, key_func: Optional[KeyFunction] = None,
+                 timeout: Optional[float] = Config.SINGLE_FLIGHT_TIMEOUT):
+        super().__init__(key_func, timeout)
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Any, fn: Callable, *args, **kwargs):
+        """以 key_func(key) 為鍵執行 fn；同鍵的調用進行中時等待其結果"""
+        flight_key = self.key_func(key)
+        with self._lock:
+            call = self._calls.get(flight_key)
+            leader = call is None
+            if leader:
+                call = self._calls[flight_key] = _Call()
+                self.leaders += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            if not call.event.wait(self.timeout):
+                raise SingleFlightTimeout(f"等待相同請求的結果超過 {self.timeout} 秒")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            # 先移除再通知，之後到達的請求會重新調用上游
+            with self._lock:
+                del self._calls[flight_key]
+            call.event.set()
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+class AsyncSingleFlight(_FlightStats):
+    """異步版請求合併，支援一次性結果和串流結果
+
+    一次性結果可跨事件循環共用：同步服務器的每個請求在自己線程的 asyncio.run 中處理，
+    其他事件循環的等待者不直接等待發起者的任務，而是等待它完成時設置的線程安全 future。
+    """
+
+    def __init__(self, key_func: Optional[KeyFunction] = None,
+                 timeout: Optional[float] = Config.SINGLE_FLIGHT_TIMEOUT):
+        super().__init__(key_func, timeout)
+        self._tasks: Dict[Hashable, _Flight] = {}
+        self._streams: Dict[Hashable, _Broadcast] = {}
+        self._lock = threading.Lock()
+
+    async def do(self, key: Any, factory: Callable[[], Awaitable]):
+        """以 key_func(key) 為鍵等待 factory() 的結果；同鍵的調用進行中時共用它"""
+        flight_key = self.key_func(key)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            flight = self._tasks.get(flight_key)
+            leader = flight is None
+            if leader:
+                self.leaders += 1
+                flight = self._tasks[flight_key] = _Flight(loop, asyncio.ensure_future(factory()))
+                flight.task.add_done_callback(lambda t: self._finish(flight_key, flight))
+            else:
+                self.shared += 1
+
+        if leader:
+            # shield 讓發起者斷開時上游調用繼續，其他等待者不受影響
+            return await asyncio.shield(flight.task)
+        if flight.loop is loop:
+            waiter = asyncio.shield(flight.task)
+        else:
+            # shield 避免等待者超時或斷開時取消共用的 future
+            waiter = asyncio.shield(asyncio.wrap_future(flight.result))
+        try:
+            return await asyncio.wait_for(waiter, self.timeout)
+        except asyncio.TimeoutError:
+            raise SingleFlightTimeout(f"等待相同請求的結果超過 {self.timeout} 秒")
+
+    def _finish(self, flight_key: Hashable, flight: _Flight):
+        with self._lock:
+            if self._tasks.get(flight_key) is flight:
+                del self._tasks[flight_key]
+        task = flight.task
+        if task.cancelled():
+            flight.result.set_exception(RuntimeError("上游調用被取消"))
+        elif task.exception() is not None:  # 同時避免沒有等待者時「異常未被讀取」的警告
+            flight.result.set_exception(task.exception())
+        else:
+            flight.result.set_result(task.result())
+
+    async def stream(self, key: Any, factory: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """共用一個上游串流；中途加入的等待者先收到已產生的文本塊"""
+        # 串流的廣播綁定事件循環，只在同一個事件循環中共用（異步服務器的所有請求共用一個）
+        flight_key = (asyncio.get_running_loop(), self.key_func(key))
+        broadcast = self._streams.get(flight_key)
+        if broadcast is None:
+            self.leaders += 1
+            broadcast = self._streams[flight_key] = _Broadcast()
+            broadcast.task = asyncio.ensure_future(self._pump(flight_key, broadcast, factory))
+            timeout = None
+        else:
+            self.shared += 1
+            timeout = self.timeout
+
+        index = 0
+        while True:
+            async with broadcast.changed:
+                try:
+                    await asyncio.wait_for(
+                        broadcast.changed.wait_for(lambda: len(broadcast.chunks) > index or broadcast.done),
+                        timeout
+                    )
+                except asyncio.TimeoutError:
+                    raise SingleFlightTimeout(f"等待相同請求的串流超過 {timeout} 秒")
+                chunks = broadcast.chunks[index:]
+                done = broadcast.done
+            for chunk in chunks:
+                yield chunk
+            index += len(chunks)
+            if done and index == len(broadcast.chunks):
+                if broadcast.error is not None:
+                    raise broadcast.error
+                return
+
+    async def _pump(self, flight_key: Hashable, broadcast: _Broadcast,
+                    factory: Callable[[], AsyncIterator[str]]):
+        try:
+            async for chunk in factory():
+                async with broadcast.changed:
+                    broadcast.chunks.append(chunk)
+                    broadcast.changed.notify_all()
+        except Exception as e:
+            broadcast.error = e
+        except asyncio.CancelledError:
+            broadcast.error = RuntimeError("上游串流被取消")
+            raise
+        finally:
+            if self._streams.get(flight_key) is broadcast:
+                del self._streams[flight_key]
+            async with broadcast.changed:
+                broadcast.done = True
+                broadcast.changed.notify_all()
+
+    def in_flight(self) -> int:
+        return len(self._tasks) + len(self._streams)
\ No newline at end of file
@@ -0,0 +1,156 @@
+"""
+多進程 Worker 模式
+父進程綁定監聽 socket 後 fork 出多個 worker 進程共享同一端口，並由監督器重啟退出的 worker
+"""
+import multiprocessing
+import signal
+import threading
+import time
+from typing import Callable, List, Optional
+from config import Config
+from utils import ServerManager, ServerHandle
+from servers.server_runner import bind_listening_socket, InFlightCounter
+
+def _worker_main(app_factory: Callable, sock, port: int):
+    """worker 進程入口：在繼承的監聽 socket 上運行 WSGI 應用"""
+    from werkzeug.serving import make_server
+
+    # Ctrl+C 由父進程統一處理
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    counter = InFlightCounter(app_factory())
+    server = make_server(Config.DEFAULT_HOST, port, counter, threaded=True, fd=sock.fileno())
+    sock.close()
+    # 多個進程同時等待同一 socket，沒搶到連接的 worker 不能阻塞在 accept 上
+    server.socket.setblocking(False)
+
+    def on_terminate(signum, frame):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, on_terminate)
+    server.serve_forever()
+
+    # 等待進行中的請求完成後再退出
+    deadline = time.monotonic() + Config.SERVER_SHUTDOWN_TIMEOUT
+    while counter.count > 0 and time.monotonic() < deadline:
+        time.sleep(Config.READINESS_POLL_INTERVAL)
+    server.server_close()
+
+class PreforkSupervisor:
+    """Pre-fork worker 監督器"""
+
+    def __init__(self, app_factory: Callable, port: int,
+                 workers: Optional[int] = None, name: str = "worker"):
+        try:
+            self._ctx = multiprocessing.get_context("fork")
+        except ValueError:
+            raise RuntimeError("多進程 worker 模式需要支援 fork 的作業系統")
+
+        self.app_factory = app_factory
+        self.port = port
+        self.workers = workers or Config.AGENT_WORKERS
+        self.name = name
+        self.restart_count = 0
+
+        self._sock = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._stopped = threading.Event()
+        self._processes: List[Optional[multiprocessing.Process]] = [None] * self.workers
+        self._started_at = [0.0] * self.workers
+        self._backoff = [Config.WORKER_RESTART_BACKOFF] * self.workers
+        self._next_start = [0.0] * self.workers
+
+    def start(self):
+        """綁定端口並啟動所有 worker"""
+        self._sock = bind_listening_socket(self.port)
+        with self._lock:
+            for slot in range(self.workers):
+                self._spawn(slot)
+        threading.Thread(target=self._monitor, daemon=True).start()
+        print(f"👷 {self.name} 已啟動 {self.workers} 個 worker 進程於端口 {self.port}")
+
+    def _spawn(self, slot: int):
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(self.app_factory, self._sock, self.port),
+            name=f"{self.name}-worker-{slot}",
+            daemon=True
+        )
+        process.start()
+        self._processes[slot] = process
+        self._started_at[slot] = time.monotonic()
+
+    def _monitor(self):
+        """監督 worker，退出的 worker 以退避間隔重啟"""
+        while not self._stopping.wait(Config.WORKER_MONITOR_INTERVAL):
+            with self._lock:
+                if self._stopping.is_set():
+                    return
+                now = time.monotonic()
+                for slot, process in enumerate(self._processes):
+                    if process is not None and process.is_alive():
+                        continue
+
+                    if process is not None:
+                        # 啟動後很快又退出的 worker 加倍退避，避免崩潰循環占滿 CPU
+                        if now - self._started_at[slot] < Config.WORKER_MIN_UPTIME:
+                            self._backoff[slot] = min(self._backoff[slot] * 2, Config.WORKER_RESTART_MAX_BACKOFF)
+                        else:
+                            self._backoff[slot] = Config.WORKER_RESTART_BACKOFF
+                        self._next_start[slot] = now + self._backoff[slot]
+                        self._processes[slot] = None
+                        print(f"⚠️  {self.name} worker {slot} (pid {process.pid}) 已退出 "
+                              f"(退出碼 {process.exitcode})，{self._backoff[slot]:.1f} 秒後重啟")
+
+                    if now >= self._next_start[slot]:
+                        self._spawn(slot)
+                        self.restart_count += 1
+
+    def alive_workers(self) -> int:
+        """存活的 worker 數量"""
+        return sum(1 for p in self._processes if p is not None and p.is_alive())
+
+    def stop(self, timeout: float = Config.SERVER_SHUTDOWN_TIMEOUT):
+        """通知所有 worker 排空請求後退出，超時則強制結束"""
+        with self._lock:
+            self._stopping.set()
+            processes = [p for p in self._processes if p is not None]
+
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+        deadline = time.monotonic() + timeout
+        for process in processes:
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                process.kill()
+                process.join()
+
+        if self._sock is not None:
+            self._sock.close()
+        self._stopped.set()
+
+    def serve_forever(self):
+        """啟動 worker 並阻塞直到監督器被停止"""
+        self.start()
+        ServerManager.register_handle(self.port, ServerHandle(shutdown=self.stop))
+        try:
+            self._stopped.wait()
+        finally:
+            if not self._stopped.is_set():
+                self.stop()
+
+def serve_a2a_agent_workers(agent_factory: Callable, port: int,
+                            workers: Optional[int] = None, name: str = "A2A代理"):
+    """以多進程 worker 模式運行 A2A 代理；代理在各 worker 內部創建"""
+    from python_a2a.server.http import create_flask_app
+
+    supervisor = PreforkSupervisor(
+        lambda: create_flask_app(agent_factory()),
+        port,
+        workers=workers,
+        name=name
+    )
+    supervisor.serve_forever()
@@ -0,0 +1,70 @@
+"""
+表達式引擎測試
+"""
+import decimal
+import time
+from fractions import Fraction
+import pytest
+from tools.expression_engine import build_columns, get_engine, ExpressionError, ExpressionLimitError
+
+PI = "3.14159265358979323846264338327950288"
+
+@pytest.fixture
+def engine():
+    return get_engine("basic")
+
+def test_decimal_literal_keeps_source_digits(engine):
+    assert engine.evaluate("1.00000000000000000001 - 1", numeric="decimal", precision=50) == decimal.Decimal("1E-20")
+    assert engine.evaluate(PI, numeric="decimal", precision=50) == decimal.Decimal(PI)
+    assert engine.evaluate("0.1 + 0.2", numeric="decimal") == decimal.Decimal("0.3")
+
+def test_fraction_literal_keeps_source_digits(engine):
+    assert engine.evaluate(PI, numeric="fraction") == Fraction(PI)
+    assert engine.evaluate("1_000.5 + 0.1", numeric="fraction") == Fraction(5003, 5)
+    assert engine.evaluate("1.5e-3 * 2", numeric="fraction") == Fraction(3, 1000)
+
+def test_literal_beyond_float_range(engine):
+    assert engine.evaluate("1e400", numeric="decimal") == decimal.Decimal("1E+400")
+    assert engine.evaluate("1e400", numeric="fraction") == 10 ** 400
+
+@pytest.mark.parametrize("expression, numeric", [("1e999999*10", "decimal"),
+                                                 ("1e100000000", "fraction"),
+                                                 ("1e-100000000", "fraction")])
+def test_oversized_literal_is_rejected(engine, expression, numeric):
+    with pytest.raises(ExpressionLimitError):
+        engine.evaluate(expression, numeric=numeric)
+
+@pytest.mark.parametrize("expression", ["2**7000", "2**12999", "(-2)**12999", "3**8000", "10**3900"])
+def test_power_below_limit_is_accepted(engine, expression):
+    assert engine.evaluate(expression) == eval(expression)
+
+@pytest.mark.parametrize("expression", ["2**13000", "3**8300", "10**4300"])
+def test_power_above_limit_is_rejected(engine, expression):
+    with pytest.raises(ExpressionLimitError):
+        engine.evaluate(expression)
+
+def test_fraction_power_below_limit_is_accepted(engine):
+    assert engine.evaluate("2**7000", numeric="fraction") == 2 ** 7000
+    assert engine.evaluate("(1/2)**-7000", numeric="fraction") == 2 ** 7000
+    with pytest.raises(ExpressionLimitError):
+        engine.evaluate("(2/3)**6000", numeric="fraction")
+
+def test_build_columns_rejects_huge_range_before_allocation():
+    start = time.monotonic()
+    with pytest.raises(ExpressionLimitError):
+        build_columns({"x": {"start": 0, "stop": 1, "num": 10 ** 12}})
+    with pytest.raises(ExpressionLimitError):
+        build_columns({"x": {"start": 0, "stop": 1, "num": 10 ** 4},
+                       "y": {"start": 0, "stop": 1, "num": 10 ** 4}}, grid=True)
+    assert time.monotonic() - start < 1
+
+def test_build_columns_zip_and_grid():
+    assert build_columns({"x": [1, 2, 3], "y": 10}) == {"x": [1, 2, 3], "y": 10}
+    assert build_columns({"x": {"start": 0, "stop": 1, "num": 3}}) == {"x": [0.0, 0.5, 1.0]}
+    assert build_columns({"x": [1, 2], "y": [10, 20]}, grid=True) == {"x": [1, 1, 2, 2], "y": [10, 20, 10, 20]}
+
+def test_evaluate_batch(engine):
+    result = engine.evaluate_batch("x * y + 1", build_columns({"x": [1, 2, 3], "y": 2}))
+    assert result.to_list() == [3.0, 5.0, 7.0]
+    with pytest.raises(ExpressionError):
+        engine.evaluate_batch("x + y", {"x": [1, 2], "y": [1, 2, 3]})
\ No newline at end of file
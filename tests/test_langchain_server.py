@@ -0,0 +1,102 @@
+"""
+LangChain 服務器測試
+以不連網的替身模型檢查 A2A 適配器傳入的輸入格式
+"""
+import asyncio
+import gc
+import threading
+import time
+import weakref
+import pytest
+from langchain_core.runnables import RunnableLambda
+from python_a2a import Message, MessageRole, TextContent
+from python_a2a.langchain.a2a import AdapterRegistry
+from python_a2a.langchain.exceptions import LangChainAgentConversionError
+import servers.langchain_server as langchain_server
+
+class SlowChatModel:
+    """記錄調用次數並延遲回答的替身模型，讓相同的問題同時處於進行中"""
+
+    def __init__(self, delay: float = 0.3):
+        self.calls = 0
+        self.delay = delay
+
+    def __call__(self, *args, **kwargs):
+        def answer(prompt):
+            self.calls += 1
+            time.sleep(self.delay)
+            return fake_chat_model().invoke(prompt)
+        return RunnableLambda(answer)
+
+def fake_chat_model(*args, **kwargs):
+    # 把提示中的問題原樣回答，不發出網絡請求
+    return RunnableLambda(lambda prompt: "回答 " + prompt.to_string().split("問題: ")[1].split("\n")[0])
+
+@pytest.fixture
+def server(monkeypatch):
+    # 只測試包裝後的鏈和適配器，不需要創建 A2A 服務器
+    monkeypatch.setattr(langchain_server, "get_chat_model", fake_chat_model)
+    monkeypatch.setattr(langchain_server, "to_a2a_server", lambda chain: None)
+    return langchain_server.LangChainServer("test-key", single_flight=True, batching=True)
+
+@pytest.mark.parametrize("inputs", ["天空為什麼是藍色", {"input": "天空為什麼是藍色"},
+                                    {"question": "天空為什麼是藍色"}])
+def test_wrapped_chain_accepts_adapter_inputs(server, inputs):
+    assert server.chain.invoke(inputs) == "回答 天空為什麼是藍色"
+    assert asyncio.run(server.chain.ainvoke(inputs)) == "回答 天空為什麼是藍色"
+
+def test_adapter_process_message(server):
+    adapter = AdapterRegistry().get_adapter(server.chain)
+    for question in ["1 加 1 等於幾", "台北在哪裡"]:
+        assert asyncio.run(adapter.process_message(question)) == f"回答 {question}"
+
+def test_handle_message(monkeypatch):
+    monkeypatch.setattr(langchain_server, "get_chat_model", fake_chat_model)
+    try:
+        server = langchain_server.LangChainServer("test-key", single_flight=True, batching=True)
+    except LangChainAgentConversionError as e:
+        pytest.skip(f"安裝的 python_a2a 無法轉換鏈: {e}")
+    for question in ["1 加 1 等於幾", "台北在哪裡"]:
+        message = Message(content=TextContent(text=question), role=MessageRole.USER)
+        response = server.server.handle_message(message)
+        assert response.content.text == f"回答 {question}"
+
+def test_sync_path_coalesces_identical_questions_across_loops(monkeypatch):
+    # 同步服務器的每個請求在自己的線程中以 asyncio.run 處理
+    model = SlowChatModel()
+    monkeypatch.setattr(langchain_server, "get_chat_model", model)
+    monkeypatch.setattr(langchain_server, "to_a2a_server", lambda chain: None)
+    server = langchain_server.LangChainServer("test-key", single_flight=True, batching=True)
+    adapter = AdapterRegistry().get_adapter(server.chain)
+
+    answers = []
+    def handle():
+        try:
+            answers.append(asyncio.run(adapter.process_message("同一個問題")))
+        except Exception as e:
+            answers.append(repr(e))
+
+    threads = [threading.Thread(target=handle) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert answers == ["回答 同一個問題"] * 3
+    assert model.calls == 1
+    assert server.async_flight.stats() == {"leaders": 1, "shared": 2, "in_flight": 0}
+
+def test_sync_path_bypasses_batcher_without_keeping_loops(server):
+    loops = []
+
+    async def handle(question):
+        loops.append(weakref.ref(asyncio.get_running_loop()))
+        return await server.chain.ainvoke(question)
+
+    for i in range(20):
+        assert asyncio.run(handle(f"問題 {i}")) == f"回答 問題 {i}"
+    gc.collect()
+
+    stats = server.batcher.stats()
+    assert stats["bypassed"] == 20 and stats["batches"] == 0
+    assert not any(ref() is not None for ref in loops)
\ No newline at end of file
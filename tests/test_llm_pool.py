@@ -0,0 +1,131 @@
+"""
+模型客戶端池測試
+"""
+import asyncio
+import json
+import threading
+import time
+import httpx
+import pytest
+from config import Config
+from servers.llm_pool import InflightLimiter, TokenBucket, estimate_tokens
+
+class Tracker:
+    """記錄同時持有名額的最大數量"""
+
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+        self.done = 0
+        self._lock = threading.Lock()
+
+    def enter(self):
+        with self._lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+
+    def leave(self):
+        with self._lock:
+            self.current -= 1
+            self.done += 1
+
+def test_inflight_limit_across_threads_and_loops():
+    limiter = InflightLimiter(3)
+    tracker = Tracker()
+
+    def sync_call():
+        limiter.acquire()
+        tracker.enter()
+        time.sleep(0.02)
+        tracker.leave()
+        limiter.release()
+
+    async def async_call():
+        await limiter.aacquire()
+        tracker.enter()
+        await asyncio.sleep(0.02)
+        tracker.leave()
+        limiter.release()
+
+    async def async_batch():
+        await asyncio.gather(*[async_call() for _ in range(5)])
+
+    threads = [threading.Thread(target=sync_call) for _ in range(10)]
+    threads += [threading.Thread(target=asyncio.run, args=(async_batch(),)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert tracker.done == 30
+    assert tracker.peak <= 3
+    assert limiter.active == 0 and limiter.waiting == 0
+
+def test_cancelled_waiter_does_not_leak_slot():
+    limiter = InflightLimiter(1)
+
+    async def main():
+        limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.aacquire())
+        await asyncio.sleep(0)
+        assert limiter.waiting == 1
+        # 名額轉交給等待者之後它才被取消
+        limiter.release()
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+    assert limiter.active == 0 and limiter.waiting == 0
+
+def test_waiter_on_closed_loop_is_skipped():
+    limiter = InflightLimiter(1)
+    limiter.acquire()
+    loop = asyncio.new_event_loop()
+    waiter = loop.create_task(limiter.aacquire())
+    loop.run_until_complete(asyncio.sleep(0))
+    assert limiter.waiting == 1
+    waiter.cancel()
+    loop.close()  # 循環關閉時未能清理等待者
+
+    acquired = threading.Event()
+
+    def next_caller():
+        limiter.acquire()
+        acquired.set()
+
+    thread = threading.Thread(target=next_caller)
+    thread.start()
+    time.sleep(0.05)
+    limiter.release()
+    assert acquired.wait(2)
+    thread.join()
+    limiter.release()
+    assert limiter.active == 0 and limiter.waiting == 0
+
+def test_token_bucket_reserve():
+    bucket = TokenBucket(600)  # 每秒補充 10 個
+    assert bucket.reserve(500) == 0
+    assert bucket.reserve(100) == 0
+    assert bucket.reserve(50) == pytest.approx(5, abs=0.1)
+    # 超過整個預算的請求按預算計
+    assert bucket.reserve(10 ** 6) == pytest.approx(65, abs=0.1)
+    assert bucket.throttled == 2
+    assert TokenBucket(0).reserve(10 ** 6) == 0
+
+def request(body=None):
+    content = json.dumps(body).encode() if body is not None else b""
+    return httpx.Request("POST", "https://api.example.com/v1/chat/completions", content=content)
+
+def test_estimate_tokens():
+    chat = {"messages": [{"role": "user", "content": "你好"}], "max_tokens": 100}
+    size = len(json.dumps(chat).encode())
+    assert estimate_tokens(request(chat)) == size // Config.LLM_BYTES_PER_TOKEN + 100
+
+    chat = {"messages": [], "max_completion_tokens": 7}
+    assert estimate_tokens(request(chat)) == len(json.dumps(chat).encode()) // Config.LLM_BYTES_PER_TOKEN + 7
+
+    embedding = {"input": "x" * 400, "model": "text-embedding-3-small"}
+    assert estimate_tokens(request(embedding)) == len(json.dumps(embedding).encode()) // Config.LLM_BYTES_PER_TOKEN
+    assert estimate_tokens(request()) == Config.LLM_DEFAULT_COMPLETION_TOKENS
\ No newline at end of file
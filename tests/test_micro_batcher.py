@@ -0,0 +1,71 @@
+"""
+微批次測試
+"""
+import asyncio
+import gc
+import weakref
+from langchain_core.runnables import RunnableLambda
+from servers.micro_batcher import MicroBatcher
+
+class CountingRunnable:
+    """記錄每次 abatch 的批次大小"""
+
+    def __init__(self):
+        self.batches = []
+        self.runnable = RunnableLambda(lambda x: x * 2)
+
+    async def abatch(self, inputs, **kwargs):
+        self.batches.append(len(inputs))
+        return await self.runnable.abatch(inputs, **kwargs)
+
+    async def ainvoke(self, inputs):
+        return await self.runnable.ainvoke(inputs)
+
+def test_coalesces_requests_on_started_loop():
+    runnable = CountingRunnable()
+    batcher = MicroBatcher(runnable, max_batch_size=16, max_wait_ms=50)
+
+    async def main():
+        await batcher.start()
+        try:
+            return await asyncio.gather(*(batcher.submit(i) for i in range(20)))
+        finally:
+            await batcher.close()
+
+    assert asyncio.run(main()) == [i * 2 for i in range(20)]
+    assert runnable.batches == [16, 4]
+    stats = batcher.stats()
+    assert stats["batches"] == 2 and stats["largest_batch"] == 16 and stats["bypassed"] == 0
+
+def test_other_loops_bypass_without_leaking():
+    runnable = CountingRunnable()
+    batcher = MicroBatcher(runnable)
+    loops = []
+
+    async def request(i):
+        loops.append(weakref.ref(asyncio.get_running_loop()))
+        return await batcher.submit(i)
+
+    for i in range(200):
+        assert asyncio.run(request(i)) == i * 2
+    gc.collect()
+
+    assert runnable.batches == []
+    assert batcher.stats()["bypassed"] == 200
+    assert sum(ref() is not None for ref in loops) == 0
+
+def test_releases_loop_after_it_closes():
+    batcher = MicroBatcher(CountingRunnable(), max_wait_ms=1)
+
+    async def serve():
+        await batcher.start()
+        loop = weakref.ref(asyncio.get_running_loop())
+        assert await batcher.submit(1) == 2
+        return loop
+
+    # 沒有調用 close()：asyncio.run 結束時取消分派任務，之後的請求改為直接調用並放開舊的事件循環
+    loop = asyncio.run(serve())
+    assert asyncio.run(batcher.submit(2)) == 4
+    gc.collect()
+    assert loop() is None
+    assert batcher.stats()["bypassed"] == 1
@@ -0,0 +1,70 @@
+"""
+工具沙箱測試
+"""
+import asyncio
+import os
+import time
+import pytest
+from tools.sandbox import (ToolSandbox, SandboxError, SandboxLimitExceeded, SandboxTimeout,
+                           sandbox_supported)
+
+pytestmark = pytest.mark.skipif(not sandbox_supported(), reason="平台不支援 fork 和 resource 模組")
+
+def fail(message):
+    raise ValueError(message)
+
+def spin():
+    while True:
+        pass
+
+@pytest.fixture
+def sandbox():
+    sandbox = ToolSandbox(workers=2, wall_timeout=1.0, cpu_seconds=1, max_memory_mb=64, max_calls=3)
+    sandbox.register("add", lambda a, b: a + b)
+    sandbox.register("pid", os.getpid)
+    sandbox.register("fail", fail)
+    sandbox.register("sleep", time.sleep)
+    sandbox.register("spin", spin)
+    sandbox.register("allocate", lambda mb: len(bytearray(mb * 1024 * 1024)))
+    yield sandbox
+    sandbox.close()
+
+def test_call_runs_in_worker(sandbox):
+    assert sandbox.call("add", 1, b=2) == 3
+    assert sandbox.call("pid") != os.getpid()
+    assert asyncio.run(sandbox.acall("add", "a", "b")) == "ab"
+
+def test_register_after_start_and_unknown_tool(sandbox):
+    sandbox.start()
+    with pytest.raises(RuntimeError):
+        sandbox.register("late", print)
+    with pytest.raises(SandboxError):
+        sandbox.call("missing")
+
+def test_tool_error_keeps_worker(sandbox):
+    with pytest.raises(SandboxError, match="ValueError: 壞輸入"):
+        sandbox.call("fail", "壞輸入")
+    assert sandbox.call("add", 1, 1) == 2
+    assert sandbox.stats()["errors"] == 1
+
+def test_timeout_replaces_worker(sandbox):
+    with pytest.raises(SandboxTimeout):
+        sandbox.call("sleep", 5)
+    # 被終止的 worker 由背景線程補充，其他調用不受影響
+    assert [sandbox.call("add", i, 1) for i in range(4)] == [1, 2, 3, 4]
+    assert sandbox.stats()["timeouts"] == 1
+
+def test_cpu_and_memory_limits(sandbox):
+    sandbox.wall_timeout = 10.0
+    with pytest.raises(SandboxLimitExceeded, match="CPU"):
+        sandbox.call("spin")
+    with pytest.raises(SandboxLimitExceeded, match="記憶體"):
+        sandbox.call("allocate", 256)
+    assert sandbox.call("allocate", 8) == 8 * 1024 * 1024
+    assert sandbox.stats()["limit_exceeded"] == 2
+
+def test_workers_are_recycled(sandbox):
+    pids = {sandbox.call("pid") for _ in range(12)}
+    # 每個 worker 最多執行 max_calls 次
+    assert len(pids) >= 4
+    assert sandbox.stats()["recycled"] >= 2
\ No newline at end of file
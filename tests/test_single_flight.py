@@ -0,0 +1,128 @@
+"""
+請求合併測試
+"""
+import asyncio
+import threading
+import time
+import pytest
+from servers.single_flight import AsyncSingleFlight, SingleFlight, SingleFlightTimeout
+
+def test_threads_share_one_call():
+    flight = SingleFlight()
+    calls = []
+
+    def slow(value):
+        calls.append(value)
+        time.sleep(0.2)
+        return value * 2
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("問題", slow, 21))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [42] * 4
+    assert len(calls) == 1
+    assert flight.stats() == {"leaders": 1, "shared": 3, "in_flight": 0}
+
+def test_same_loop_shares_one_task():
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def slow():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "答"
+
+    async def main():
+        return await asyncio.gather(*(flight.do(" 問題 ", slow) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["答"] * 5
+    assert len(calls) == 1
+
+def test_followers_on_other_loops_receive_leader_result():
+    flight = AsyncSingleFlight()
+    calls = []
+    started = threading.Event()
+
+    async def slow():
+        calls.append(1)
+        started.set()
+        await asyncio.sleep(0.2)
+        return "答"
+
+    results = []
+    def leader():
+        results.append(asyncio.run(flight.do("問題", slow)))
+    def follower():
+        started.wait()
+        results.append(asyncio.run(flight.do("問題", slow)))
+
+    threads = [threading.Thread(target=leader)] + [threading.Thread(target=follower) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["答"] * 3
+    assert len(calls) == 1
+
+def test_errors_reach_followers_on_other_loops():
+    flight = AsyncSingleFlight()
+    started = threading.Event()
+
+    async def failing():
+        started.set()
+        await asyncio.sleep(0.1)
+        raise ValueError("上游失敗")
+
+    errors = []
+    def run():
+        try:
+            asyncio.run(flight.do("問題", failing))
+        except ValueError as e:
+            errors.append(str(e))
+    def follower():
+        started.wait()
+        run()
+
+    threads = [threading.Thread(target=run), threading.Thread(target=follower)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == ["上游失敗"] * 2
+
+def test_follower_timeout():
+    flight = AsyncSingleFlight(timeout=0.05)
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do("問題", lambda: asyncio.sleep(0.3, "答")))
+        await asyncio.sleep(0)
+        with pytest.raises(SingleFlightTimeout):
+            await flight.do("問題", lambda: asyncio.sleep(0.3, "答"))
+        # 等待者超時不影響發起者
+        assert await leader == "答"
+
+    asyncio.run(main())
+
+def test_streams_share_chunks():
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def chunks():
+        calls.append(1)
+        for chunk in ["一", "二", "三"]:
+            await asyncio.sleep(0.01)
+            yield chunk
+
+    async def collect():
+        return "".join([chunk async for chunk in flight.stream("問題", chunks)])
+
+    async def main():
+        return await asyncio.gather(collect(), collect())
+
+    assert asyncio.run(main()) == ["一二三"] * 2
+    assert len(calls) == 1
@@ -0,0 +1,51 @@
+"""
+文本管道測試
+"""
+import itertools
+import pytest
+from tools.text_pipeline import plan_pipeline, run_pipeline, TextPipelineError
+from tools.text_tools import TEXT_OPERATIONS
+
+@pytest.mark.parametrize("operations, return_text, expected", [
+    # 反轉越過不受影響的統計，移到最前面時改為倒序讀取來源
+    (["length", "reverse", "upper"], True, (True, ["length", "upper"])),
+    (["reverse", "word_count", "reverse", "stats"], False, (False, ["word_count", "stats"])),
+    # 反轉不能越過轉換和 analyze
+    (["upper", "reverse", "length"], False, (False, ["upper", "length"])),
+    (["upper", "length", "reverse", "lower"], True, (False, ["upper", "reverse", "length", "lower"])),
+    (["analyze", "reverse", "upper", "length"], False, (False, ["analyze", "reverse", "upper", "length"])),
+    # 最後一個統計之後的轉換只有在需要返回文本時才保留，之後只剩不變統計的反轉也不執行
+    (["upper", "length", "reverse", "lower"], False, (False, ["upper", "length"])),
+    (["upper", "reverse", "length", "stats"], False, (False, ["upper", "length", "stats"])),
+    (["upper", "reverse", "lower", "reverse", "length"], False, (False, ["upper", "reverse", "lower", "length"])),
+    (["length", "reverse"], True, (True, ["length"])),
+    (["length", "reverse"], False, (False, ["length"])),
+])
+def test_plan_pipeline(operations, return_text, expected):
+    assert plan_pipeline(operations, return_text) == expected
+
+@pytest.mark.parametrize("operations", [[], ["nope"], ["upper"] * 33])
+def test_plan_pipeline_rejects_invalid(operations):
+    with pytest.raises(TextPipelineError):
+        plan_pipeline(operations)
+
+def naive_pipeline(operations, text):
+    """逐個操作直接計算，作為改寫後計劃的對照"""
+    results = []
+    for index, operation in enumerate(operations):
+        if operation == "length":
+            results.append((index, operation, f"{len(text)} 個字符"))
+        else:
+            text = TEXT_OPERATIONS[operation](text)
+    return results, text
+
+@pytest.mark.parametrize("operations", [list(ops) for ops in itertools.product(
+    ["reverse", "upper", "lower", "title", "length"], repeat=4)])
+def test_run_pipeline_matches_naive(operations):
+    # ǰ 轉為大寫後變成兩個字符，不能與反轉交換
+    text = "ǰx hello ﬁne\nWorld ß"
+    expected_results, expected_text = naive_pipeline(operations, text)
+    results, final_text, _ = run_pipeline(operations, text=text, return_text=True)
+    assert (results, final_text) == (expected_results, expected_text)
+    if expected_results:
+        assert run_pipeline(operations, text=text)[0] == expected_results
\ No newline at end of file
@@ -2,37 +2,58 @@
 計算器工具
 提供安全的數學計算功能
 """
-from langchain.tools import Tool
-from typing import Any
+import json
+from decimal import Decimal, localcontext
+from fractions import Fraction
+from langchain.tools import StructuredTool
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
+from config import Config
+from tools.expression_engine import get_engine, build_columns, BatchResult, ExpressionError, ExpressionLimitError
+
+# 工具參數 schema：LangChain 與 MCP 發布共用
+class CalculatorInput(BaseModel):
+    expressions: List[str] = Field(min_length=1, max_length=Config.CALCULATOR_MAX_EXPRESSIONS,
+                                   description="要計算的數學表達式，一次可以提交多個")
+
+class VectorizedCalculatorInput(BaseModel):
+    expression: str = Field(description="含自由變數的表達式，例如 sin(x)*r")
+    variables: Dict[str, Any] = Field(description='變數值：數值、列表或 {"start", "stop", "num"} 等距範圍')
+    grid: bool = Field(default=False, description="為 true 時對所有列表取笛卡兒積")
+    summary_only: bool = Field(default=False, description="為 true 時只返回最小值、最大值和平均值")
+
+def _calculate_each(calculate, expressions: List[str]) -> str:
+    """逐個計算表達式，每個結果一行"""
+    return "\n".join(calculate(expression) for expression in expressions)
 
 class CalculatorTool:
     """安全的計算器工具"""
     
-    def __init__(self):
+    def __init__(self, numeric: str = "float", precision: Optional[int] = None):
         self.name = "calculator"
         self.description = "安全地計算數學表達式，支援基本算術運算"
+        if numeric == "decimal":
+            self.description += f"（十進位精確計算，{precision or Config.DECIMAL_DEFAULT_PRECISION} 位有效數字）"
+        elif numeric == "fraction":
+            self.description += "（分數精確計算，結果以最簡分數表示）"
+        self.engine = get_engine("basic")
+        self.numeric = numeric
+        self.precision = precision
     
     def calculate(self, expression: str) -> str:
         """執行計算"""
         try:
-            # 安全檢查：只允許數字和基本運算符
-            allowed_chars = set('0123456789+-*/(). ')
-            if not all(c in allowed_chars for c in expression):
-                return "錯誤: 表達式包含不允許的字符。只允許數字、+、-、*、/、()、和空格。"
-            
             # 長度檢查
             if len(expression) > 200:
                 return "錯誤: 表達式過長（最多200個字符）"
             
-            # 括號匹配檢查
-            if expression.count('(') != expression.count(')'):
-                return "錯誤: 括號不匹配"
-            
-            # 執行計算
-            result = eval(expression)
+            # 執行計算：AST 白名單只允許數字、+、-、*、/、//、**、() 組成的表達式
+            result = self.engine.evaluate(expression, numeric=self.numeric, precision=self.precision)
             
             # 處理特殊結果
-            if isinstance(result, complex):
+            if isinstance(result, (Decimal, Fraction)):
+                return f"計算結果: {expression} = {format_exact(result, self.precision)}"
+            elif isinstance(result, complex):
                 return f"計算結果: {expression} = {result.real} + {result.imag}i"
             elif isinstance(result, float):
                 # 保留合理的小數位數
@@ -41,12 +62,14 @@ class CalculatorTool:
                 else:
                     return f"計算結果: {expression} = {result:.6f}".rstrip('0').rstrip('.')
             else:
-                return f"計算結果: {expression} = {result}"
+                return f"計算結果: {expression} = {format_exact(result)}"
                 
         except ZeroDivisionError:
             return "錯誤: 除零錯誤"
         except OverflowError:
             return "錯誤: 數值過大"
+        except ExpressionError as e:
+            return f"錯誤: {e}"
         except ValueError as e:
             return f"錯誤: 數值錯誤 - {e}"
         except SyntaxError:
@@ -54,64 +77,64 @@ class CalculatorTool:
         except Exception as e:
             return f"計算錯誤: {str(e)}"
     
-    def get_langchain_tool(self) -> Tool:
+    def calculate_many(self, expressions: List[str]) -> str:
+        """一次計算多個表達式"""
+        return _calculate_each(self.calculate, expressions)
+    
+    def get_langchain_tool(self) -> StructuredTool:
         """獲取 LangChain 工具對象"""
-        return Tool(
+        return StructuredTool.from_function(
+            func=self.calculate_many,
             name=self.name,
             description=self.description,
-            func=self.calculate
+            args_schema=CalculatorInput
         )
 
+def format_exact(value, precision: Optional[int] = None) -> str:
+    """格式化精確數值；非整數的分數附上近似的小數
+
+    十進位數在計算時的精度下格式化，位數不超過精度的整數以普通數字顯示。
+    位數超過 Python 整數轉字串限制的結果以 ExpressionLimitError 報告。
+    """
+    try:
+        return _format_exact(value, precision)
+    except ValueError:
+        raise ExpressionLimitError("結果位數過多，無法轉換為文字")
+
+def _format_exact(value, precision: Optional[int]) -> str:
+    if isinstance(value, Fraction) and value.denominator != 1:
+        try:
+            return f"{value} (≈ {float(value):.12g})"
+        except OverflowError:
+            return str(value)
+    if isinstance(value, Decimal):
+        with localcontext() as context:
+            context.prec = precision or Config.DECIMAL_DEFAULT_PRECISION
+            if value.is_finite() and value == value.to_integral_value():
+                value = value.normalize()
+                # 超過精度的位數沒有意義，保留科學記數法
+                if value.adjusted() < context.prec:
+                    return format(value, "f")
+            return str(value)
+    return str(value)
+
 class ScientificCalculator:
     """科學計算器工具"""
     
     def __init__(self):
         self.name = "scientific_calculator"
         self.description = "科學計算器，支援三角函數、對數、指數等高級數學函數"
+        self.engine = get_engine("scientific")
     
     def calculate(self, expression: str) -> str:
         """執行科學計算"""
-        import math
-        
         try:
-            # 創建安全的計算環境
-            safe_dict = {
-                # 基本運算
-                '__builtins__': {},
-                # 數學常數
-                'pi': math.pi,
-                'e': math.e,
-                # 基本函數
-                'abs': abs,
-                'round': round,
-                'min': min,
-                'max': max,
-                # 三角函數
-                'sin': math.sin,
-                'cos': math.cos,
-                'tan': math.tan,
-                'asin': math.asin,
-                'acos': math.acos,
-                'atan': math.atan,
-                # 指數和對數
-                'exp': math.exp,
-                'log': math.log,
-                'log10': math.log10,
-                'sqrt': math.sqrt,
-                'pow': pow,
-                # 其他函數
-                'ceil': math.ceil,
-                'floor': math.floor,
-                'degrees': math.degrees,
-                'radians': math.radians,
-            }
-            
             # 長度檢查
             if len(expression) > 300:
                 return "錯誤: 表達式過長"
             
-            # 執行計算
-            result = eval(expression, safe_dict)
+            # 執行計算：函數和常量由共用的科學計算白名單提供
+            result = self.engine.evaluate(expression)
             
             # 格式化結果
             if isinstance(result, float):
@@ -124,26 +147,109 @@ class ScientificCalculator:
                 
         except ZeroDivisionError:
             return "錯誤: 除零錯誤"
-        except ValueError as e:
-            return f"錯誤: 數值錯誤 - {e}"
         except OverflowError:
             return "錯誤: 數值過大"
+        except ExpressionError as e:
+            return f"錯誤: {e}"
+        except ValueError as e:
+            return f"錯誤: 數值錯誤 - {e}"
         except Exception as e:
             return f"科學計算錯誤: {str(e)}"
     
-    def get_langchain_tool(self) -> Tool:
+    def calculate_many(self, expressions: List[str]) -> str:
+        """一次計算多個表達式"""
+        return _calculate_each(self.calculate, expressions)
+    
+    def get_langchain_tool(self) -> StructuredTool:
+        """獲取 LangChain 工具對象"""
+        return StructuredTool.from_function(
+            func=self.calculate_many,
+            name=self.name,
+            description=self.description,
+            args_schema=CalculatorInput
+        )
+
+def format_batch_result(result: BatchResult, summary_only: bool = False) -> str:
+    """格式化批次結果：數量少時列出全部，否則給出摘要和前幾個值"""
+    def fmt(value) -> str:
+        return f"{value:.8g}" if isinstance(value, float) else str(value)
+    
+    values = result.to_list()
+    lines = [f"批次計算結果: {result.expression}（共 {len(values)} 組）"]
+    if not summary_only and len(values) <= Config.VECTOR_MAX_LISTED:
+        lines.append(f"結果: [{', '.join(fmt(v) for v in values)}]")
+        return "\n".join(lines)
+    
+    summary = result.summary()
+    lines.append(f"有效值: {summary['valid']} / {summary['count']}")
+    if summary["valid"]:
+        lines.append(f"最小值: {fmt(summary['min'])}，最大值: {fmt(summary['max'])}，平均值: {fmt(summary['mean'])}")
+    if not summary_only:
+        preview = ", ".join(fmt(v) for v in values[:5])
+        lines.append(f"前 5 個結果: [{preview}, ...]")
+    return "\n".join(lines)
+
+class VectorizedCalculator:
+    """批次科學計算器：同一個表達式對多組參數一次求值"""
+    
+    def __init__(self):
+        self.name = "vectorized_calculator"
+        self.description = (
+            "對同一個數學表達式批次代入多組參數求值，例如 expression 為 sin(x)*r，"
+            'variables 為 {"x": {"start": 0, "stop": 3.14, "num": 100}, "r": [1, 2]}'
+        )
+        self.engine = get_engine("scientific")
+    
+    def evaluate(self, expression: str, variables: Dict[str, Any],
+                 grid: bool = False, summary_only: bool = False) -> str:
+        """批次求值並格式化結果"""
+        try:
+            if len(expression) > 300:
+                return "錯誤: 表達式過長"
+            result = self.engine.evaluate_batch(expression, build_columns(variables, grid=grid))
+            return format_batch_result(result, summary_only)
+        except ExpressionError as e:
+            return f"錯誤: {e}"
+        except SyntaxError:
+            return "錯誤: 表達式語法錯誤"
+        except (TypeError, ValueError) as e:
+            return f"錯誤: 數值錯誤 - {e}"
+        except Exception as e:
+            return f"批次計算錯誤: {str(e)}"
+    
+    def calculate(self, request: str) -> str:
+        """解析 JSON 請求並批次求值"""
+        try:
+            data = json.loads(request)
+        except ValueError:
+            return "錯誤: 輸入必須是 JSON，包含 expression 和 variables"
+        if not isinstance(data, dict) or "expression" not in data:
+            return "錯誤: 缺少 expression"
+        return self.evaluate(
+            str(data["expression"]),
+            data.get("variables") or {},
+            grid=bool(data.get("grid", False)),
+            summary_only=bool(data.get("summary_only", False))
+        )
+    
+    def get_langchain_tool(self) -> StructuredTool:
         """獲取 LangChain 工具對象"""
-        return Tool(
+        return StructuredTool.from_function(
+            func=self.evaluate,
             name=self.name,
             description=self.description,
-            func=self.calculate
+            args_schema=VectorizedCalculatorInput
         )
 
 # 便捷函數
-def create_calculator() -> CalculatorTool:
-    """創建基本計算器"""
-    return CalculatorTool()
+def create_calculator(numeric: str = "float", precision: Optional[int] = None) -> CalculatorTool:
+    """創建基本計算器；numeric 為 "decimal" 或 "fraction" 時使用精確數值模式"""
+    return CalculatorTool(numeric, precision)
 
 def create_scientific_calculator() -> ScientificCalculator:
     """創建科學計算器"""
-    return ScientificCalculator()
\ No newline at end of file
+    return ScientificCalculator()
+
+def create_vectorized_calculator() -> VectorizedCalculator:
+    """創建批次科學計算器"""
+    return VectorizedCalculator()
\ No newline at end of file
@@ -0,0 +1,596 @@
+"""
+表達式引擎
+將數學表達式解析為 AST，按白名單檢查後編譯為閉包，並以 LRU 緩存編譯結果
+"""
+import ast
+import contextvars
+import decimal
+import itertools
+import math
+import operator
+import time
+from fractions import Fraction
+from functools import lru_cache, reduce
+from typing import Any, Callable, Dict, FrozenSet, List, Mapping, Optional, Tuple
+from config import Config
+
+try:
+    import numpy as np
+except ImportError:  # 沒有 NumPy 時批次求值逐行進行
+    np = None
+
+class ExpressionError(ValueError):
+    """表達式不合法"""
+
+class ExpressionLimitError(ExpressionError):
+    """表達式的計算量超過限制"""
+
+class _Const:
+    """編譯期已確定的常量，用於常量折疊"""
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+def _as_function(compiled) -> Callable[[Mapping[str, Any]], Any]:
+    if isinstance(compiled, _Const):
+        value = compiled.value
+        return lambda env: value
+    return compiled
+
+def _int_bits(value) -> int:
+    return abs(value).bit_length() if isinstance(value, int) else 0
+
+def checked_pow(base, exponent, modulus=None):
+    """冪運算；整數結果的位數超過上限時在計算前拒絕"""
+    if modulus is not None:
+        return pow(base, exponent, modulus)
+    if isinstance(base, int) and isinstance(exponent, int) and exponent > 0 and abs(base) > 1:
+        if exponent > Config.EXPRESSION_MAX_EXPONENT:
+            raise ExpressionLimitError(f"指數過大（上限 {Config.EXPRESSION_MAX_EXPONENT}）")
+        # |base| >= 2**(bit_length - 1)，因此結果至少有 (bit_length - 1) * exponent + 1 位元；
+        # 下界已超過上限時不必計算，否則結果最多是上限的兩倍，算完再按實際位數檢查
+        if (abs(base).bit_length() - 1) * exponent + 1 > Config.EXPRESSION_MAX_INT_BITS:
+            raise ExpressionLimitError(f"結果過大（超過 {Config.EXPRESSION_MAX_INT_BITS} 位元）")
+        result = base ** exponent
+        if result.bit_length() > Config.EXPRESSION_MAX_INT_BITS:
+            raise ExpressionLimitError(f"結果過大（超過 {Config.EXPRESSION_MAX_INT_BITS} 位元）")
+        return result
+    return base ** exponent
+
+def checked_mul(left, right):
+    """乘法；大整數相乘的結果位數可以事先估算"""
+    if _int_bits(left) + _int_bits(right) > Config.EXPRESSION_MAX_INT_BITS + 1:
+        raise ExpressionLimitError(f"結果過大（超過 {Config.EXPRESSION_MAX_INT_BITS} 位元）")
+    return left * right
+
+def checked_round(value, ndigits=None):
+    """四捨五入；整數按負位數取整時會計算 10 的冪，同樣需要限制"""
+    if ndigits is None:
+        return round(value)
+    if abs(ndigits) > Config.EXPRESSION_MAX_ROUND_DIGITS:
+        raise ExpressionLimitError(f"round 位數過大（上限 {Config.EXPRESSION_MAX_ROUND_DIGITS}）")
+    return round(value, ndigits)
+
+NUMERIC_MODES = ("float", "decimal", "fraction")
+
+class EvaluationBudget:
+    """精確模式的計算預算：按運算數大小估算的步數上限和牆鐘時間上限"""
+
+    def __init__(self, max_steps: int = Config.EXACT_MAX_STEPS,
+                 max_seconds: float = Config.EXACT_MAX_SECONDS):
+        self.max_steps = max_steps
+        self.steps = 0
+        self.deadline = time.monotonic() + max_seconds
+
+    def charge(self, steps: int = 1):
+        self.steps += steps
+        if self.steps > self.max_steps:
+            raise ExpressionLimitError(f"計算步數超過預算（上限 {self.max_steps}）")
+        if time.monotonic() > self.deadline:
+            raise ExpressionLimitError("計算時間超過預算")
+
+_current_budget: contextvars.ContextVar = contextvars.ContextVar("expression_budget", default=None)
+
+def _exact_bits(value) -> int:
+    """精確數值的大小（位元），用於在計算前估算結果和成本"""
+    if isinstance(value, Fraction):
+        return abs(value.numerator).bit_length() + value.denominator.bit_length()
+    if isinstance(value, decimal.Decimal):
+        return len(value.as_tuple().digits) * 10 // 3 + 1
+    if isinstance(value, int):
+        return abs(value).bit_length()
+    return 64
+
+def _exact_binary(op: Callable, combine: Callable[[int, int], int]) -> Callable:
+    """包裝精確模式的二元運算：先估算結果大小，再按成本扣除預算"""
+    def checked(left, right):
+        left_bits, right_bits = _exact_bits(left), _exact_bits(right)
+        if combine(left_bits, right_bits) > Config.EXACT_MAX_BITS:
+            raise ExpressionLimitError(f"結果過大（超過 {Config.EXACT_MAX_BITS} 位元）")
+        budget = _current_budget.get()
+        if budget is not None:
+            # 以 64 位元字的乘法次數近似大數運算的成本
+            budget.charge(1 + (left_bits // 64 + 1) * (right_bits // 64 + 1))
+        return op(left, right)
+    return checked
+
+def _exact_pow(base, exponent):
+    if isinstance(base, Fraction):
+        if exponent.denominator != 1:
+            raise ExpressionError("分數模式只支援整數指數")
+        exponent = exponent.numerator
+        if abs(exponent) > Config.EXPRESSION_MAX_EXPONENT:
+            raise ExpressionLimitError(f"指數過大（上限 {Config.EXPRESSION_MAX_EXPONENT}）")
+        if abs(base.numerator) > 1 or base.denominator > 1:
+            # 分子和分母各自按冪的下界估算，與 checked_pow 相同
+            lower = sum((abs(part).bit_length() - 1) * abs(exponent) + 1
+                        for part in (base.numerator, base.denominator))
+            if lower > Config.EXACT_MAX_BITS:
+                raise ExpressionLimitError(f"結果過大（超過 {Config.EXACT_MAX_BITS} 位元）")
+            result = base ** exponent
+            if _exact_bits(result) > Config.EXACT_MAX_BITS:
+                raise ExpressionLimitError(f"結果過大（超過 {Config.EXACT_MAX_BITS} 位元）")
+            return result
+    # Decimal 的結果位數受精度限制，指數範圍由上下文的 Emax 檢查
+    return base ** exponent
+
+_EXACT_BINARY_OPS = {
+    ast.Add: _exact_binary(operator.add, lambda a, b: max(a, b) + min(a, b) + 1),
+    ast.Sub: _exact_binary(operator.sub, lambda a, b: max(a, b) + min(a, b) + 1),
+    ast.Mult: _exact_binary(operator.mul, lambda a, b: a + b),
+    ast.Div: _exact_binary(operator.truediv, lambda a, b: a + b),
+    ast.FloorDiv: _exact_binary(operator.floordiv, lambda a, b: a + b),
+    ast.Mod: _exact_binary(operator.mod, lambda a, b: a + b),
+    ast.Pow: _exact_binary(_exact_pow, lambda a, b: 0),
+}
+
+def _literal_to_exact(node: ast.Constant, source: Optional[str], numeric: str):
+    """按字面量的原文轉換為精確數值
+
+    浮點字面量在解析時已被捨入為 float（有效數字約 17 位，超出範圍時為 inf），
+    精確模式從原文構造，保留全部位數和指數，由十進位上下文的精度和溢出陷阱處理。
+    """
+    if isinstance(node.value, float) and source is not None:
+        text = ast.get_source_segment(source, node)
+        if text:
+            try:
+                value = decimal.Decimal(text.replace("_", ""))
+            except (ValueError, ArithmeticError):
+                value = None
+            if value is not None:
+                if numeric == "decimal":
+                    return value
+                # 分數模式會展開指數，先按位數估算大小，避免 1e100000000 這樣的字面量佔用大量記憶體
+                digits = len(value.as_tuple().digits) + abs(value.as_tuple().exponent)
+                if digits * 10 // 3 > Config.EXACT_MAX_BITS:
+                    raise ExpressionLimitError(f"數值過大（超過 {Config.EXACT_MAX_BITS} 位元）")
+                return Fraction(value)
+    return _to_exact(node.value, numeric)
+
+def _to_exact(value, numeric: str):
+    """把變數值轉換為精確數值；浮點數按其最短十進位表示轉換，0.1 即 1/10"""
+    if isinstance(value, complex):
+        raise ExpressionError(f"{numeric} 模式不支援複數")
+    text = repr(value) if isinstance(value, float) else str(value)
+    return decimal.Decimal(text) if numeric == "decimal" else Fraction(text)
+
+class ExpressionProfile:
+    """表達式白名單：允許的運算符、函數和常量"""
+
+    def __init__(self, name: str, binary_ops: Dict[type, Callable], unary_ops: Dict[type, Callable],
+                 functions: Optional[Dict[str, Callable]] = None,
+                 constants: Optional[Dict[str, Any]] = None,
+                 number_types: Tuple[type, ...] = (int, float)):
+        self.name = name
+        self.binary_ops = binary_ops
+        self.unary_ops = unary_ops
+        self.functions = functions or {}
+        self.constants = constants or {}
+        self.number_types = number_types
+
+_BASIC_BINARY_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: checked_mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Pow: checked_pow,
+}
+
+_UNARY_OPS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+BASIC_PROFILE = ExpressionProfile("basic", _BASIC_BINARY_OPS, _UNARY_OPS)
+
+SCIENTIFIC_PROFILE = ExpressionProfile(
+    "scientific",
+    {**_BASIC_BINARY_OPS, ast.Mod: operator.mod},
+    _UNARY_OPS,
+    functions={
+        # 基本函數
+        'abs': abs,
+        'round': checked_round,
+        'min': min,
+        'max': max,
+        # 三角函數
+        'sin': math.sin,
+        'cos': math.cos,
+        'tan': math.tan,
+        'asin': math.asin,
+        'acos': math.acos,
+        'atan': math.atan,
+        # 指數和對數
+        'exp': math.exp,
+        'log': math.log,
+        'log10': math.log10,
+        'sqrt': math.sqrt,
+        'pow': checked_pow,
+        # 其他函數
+        'ceil': math.ceil,
+        'floor': math.floor,
+        'degrees': math.degrees,
+        'radians': math.radians,
+    },
+    constants={
+        'pi': math.pi,
+        'e': math.e,
+    },
+    number_types=(int, float, complex)
+)
+
+def _vector_log(x, base=None):
+    return np.log(x) if base is None else np.log(x) / np.log(base)
+
+def _vector_round(x, ndigits=0):
+    return np.round(x, int(ndigits))
+
+def _vector_pow(base, exponent, modulus=None):
+    result = np.power(base, exponent)
+    return result if modulus is None else np.mod(result, modulus)
+
+def _vector_functions() -> Dict[str, Callable]:
+    """科學計算函數對應的 NumPy ufunc，整列數據一次計算"""
+    return {
+        'abs': np.abs,
+        'round': _vector_round,
+        'min': lambda *args: reduce(np.minimum, args),
+        'max': lambda *args: reduce(np.maximum, args),
+        'sin': np.sin,
+        'cos': np.cos,
+        'tan': np.tan,
+        'asin': np.arcsin,
+        'acos': np.arccos,
+        'atan': np.arctan,
+        'exp': np.exp,
+        'log': _vector_log,
+        'log10': np.log10,
+        'sqrt': np.sqrt,
+        'pow': _vector_pow,
+        'ceil': np.ceil,
+        'floor': np.floor,
+        'degrees': np.degrees,
+        'radians': np.radians,
+    }
+
+class BatchResult:
+    """批次求值結果；無法計算的行（如定義域錯誤）為 nan"""
+
+    def __init__(self, expression: str, values, vectorized: bool):
+        self.expression = expression
+        self.values = values
+        self.vectorized = vectorized
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def to_list(self) -> List[Any]:
+        return self.values.tolist() if self.vectorized else list(self.values)
+
+    def summary(self) -> Dict[str, Any]:
+        """結果摘要：數量、有效值個數、最小值、最大值和平均值"""
+        if self.vectorized and not np.iscomplexobj(self.values):
+            valid = self.values[np.isfinite(self.values)]
+            count = int(valid.size)
+            stats = (float(valid.min()), float(valid.max()), float(valid.mean())) if count else (None, None, None)
+        else:
+            valid = [v for v in self.to_list() if not isinstance(v, complex) and math.isfinite(v)]
+            count = len(valid)
+            stats = (min(valid), max(valid), math.fsum(valid) / count) if count else (None, None, None)
+        return {
+            "count": len(self),
+            "valid": count,
+            "min": stats[0],
+            "max": stats[1],
+            "mean": stats[2]
+        }
+
+def build_columns(variables: Mapping[str, Any], grid: bool = False) -> Dict[str, Any]:
+    """整理批次求值的列輸入
+
+    每個變數可以是數值、數值列表，或 {"start", "stop", "num"} 表示的等距範圍。
+    grid 為 True 時對所有列表取笛卡兒積，否則各列表逐行對應，單個數值廣播到每一行。
+    行數在生成範圍和笛卡兒積之前檢查，超過上限的請求不會佔用記憶體。
+    """
+    columns = {}
+    ranges: Dict[str, Tuple[float, float, int]] = {}
+    lengths = []
+    for name, spec in variables.items():
+        if isinstance(spec, Mapping):
+            try:
+                start, stop, num = float(spec["start"]), float(spec["stop"]), int(spec.get("num", 50))
+            except (KeyError, TypeError, ValueError):
+                raise ExpressionError(f"變數 {name} 的範圍需要 start、stop 和 num")
+            if num < 1:
+                raise ExpressionError(f"變數 {name} 的 num 必須大於 0")
+            ranges[name] = (start, stop, num)
+            lengths.append(num)
+        elif isinstance(spec, (list, tuple)):
+            columns[name] = list(spec)
+            lengths.append(len(spec))
+        else:
+            columns[name] = spec
+
+    rows = 1
+    for length in lengths:
+        rows = rows * length if grid else max(rows, length)
+        if rows > Config.VECTOR_MAX_ROWS:
+            raise ExpressionLimitError(f"批次過大（上限 {Config.VECTOR_MAX_ROWS} 行）")
+
+    for name, (start, stop, num) in ranges.items():
+        if np is not None:
+            columns[name] = np.linspace(start, stop, num).tolist()
+        else:
+            step = (stop - start) / (num - 1) if num > 1 else 0.0
+            columns[name] = [start + i * step for i in range(num)]
+    # 保持變數的原始順序
+    columns = {name: columns[name] for name in variables}
+
+    if grid:
+        names = [name for name, column in columns.items() if isinstance(column, list)]
+        if names:
+            product = list(zip(*itertools.product(*[columns[name] for name in names])))
+            for name, column in zip(names, product):
+                columns[name] = list(column)
+    return columns
+
+class CompiledExpression:
+    """已編譯的表達式，可以重複以不同變數值求值"""
+    __slots__ = ("source", "variables", "_function")
+
+    def __init__(self, source: str, variables: FrozenSet[str], function: Callable):
+        self.source = source
+        self.variables = variables
+        self._function = function
+
+    def evaluate(self, values: Optional[Mapping[str, Any]] = None):
+        """求值；values 提供表達式中自由變數的值"""
+        values = values or {}
+        missing = self.variables.difference(values)
+        if missing:
+            raise ExpressionError(f"未定義的名稱: {', '.join(sorted(missing))}")
+        return self._function(values)
+
+    def __call__(self, **values):
+        return self.evaluate(values)
+
+class _Compiler:
+    """把一棵已解析的 AST 編譯成閉包"""
+
+    def __init__(self, profile: ExpressionProfile, allow_variables: bool,
+                 functions: Optional[Dict[str, Callable]] = None, numeric: str = "float",
+                 source: Optional[str] = None):
+        self.profile = profile
+        self.source = source  # 解析的原文，精確模式從中取得字面量的原始寫法
+        self.allow_variables = allow_variables
+        self.numeric = numeric
+        if numeric == "float":
+            self.functions = functions if functions is not None else profile.functions
+            self.binary_ops = profile.binary_ops
+        else:
+            # 精確模式只提供算術運算；數學函數的結果通常是無理數
+            self.functions = {}
+            self.binary_ops = {op: _EXACT_BINARY_OPS[op] for op in profile.binary_ops}
+        self.variables = set()
+        self.nodes = 0
+
+    def compile(self, node):
+        self.nodes += 1
+        if self.nodes > Config.EXPRESSION_MAX_NODES:
+            raise ExpressionLimitError(f"表達式過於複雜（超過 {Config.EXPRESSION_MAX_NODES} 個節點）")
+
+        handler = getattr(self, f"_compile_{type(node).__name__}", None)
+        if handler is None:
+            raise ExpressionError(f"不允許的語法: {type(node).__name__}")
+        return handler(node)
+
+    def _compile_Expression(self, node: ast.Expression):
+        return self.compile(node.body)
+
+    def _compile_Constant(self, node: ast.Constant):
+        # bool 是 int 的子類，需要單獨排除
+        if isinstance(node.value, bool) or not isinstance(node.value, self.profile.number_types):
+            raise ExpressionError(f"不允許的常量: {node.value!r}")
+        if self.numeric != "float":
+            return _Const(_literal_to_exact(node, self.source, self.numeric))
+        return _Const(node.value)
+
+    def _compile_Name(self, node: ast.Name):
+        if node.id in self.profile.constants:
+            if self.numeric != "float":
+                raise ExpressionError(f"{self.numeric} 模式不支援常量 {node.id}")
+            return _Const(self.profile.constants[node.id])
+        if not self.allow_variables:
+            raise ExpressionError(f"未知的名稱: {node.id}")
+        self.variables.add(node.id)
+        name = node.id
+        return lambda env: env[name]
+
+    def _compile_BinOp(self, node: ast.BinOp):
+        op = self.binary_ops.get(type(node.op))
+        if op is None:
+            raise ExpressionError(f"不允許的運算符: {type(node.op).__name__}")
+        left, right = self.compile(node.left), self.compile(node.right)
+        if isinstance(left, _Const) and isinstance(right, _Const):
+            return _Const(op(left.value, right.value))
+        left, right = _as_function(left), _as_function(right)
+        return lambda env: op(left(env), right(env))
+
+    def _compile_UnaryOp(self, node: ast.UnaryOp):
+        op = self.profile.unary_ops.get(type(node.op))
+        if op is None:
+            raise ExpressionError(f"不允許的運算符: {type(node.op).__name__}")
+        operand = self.compile(node.operand)
+        if isinstance(operand, _Const):
+            return _Const(op(operand.value))
+        operand = _as_function(operand)
+        return lambda env: op(operand(env))
+
+    def _compile_Call(self, node: ast.Call):
+        if self.numeric != "float" and not self.functions:
+            raise ExpressionError(f"{self.numeric} 模式不支援函數調用")
+        if not isinstance(node.func, ast.Name) or node.func.id not in self.functions:
+            name = node.func.id if isinstance(node.func, ast.Name) else type(node.func).__name__
+            raise ExpressionError(f"未知的函數: {name}")
+        if node.keywords:
+            raise ExpressionError("函數調用不支援關鍵字參數")
+
+        func = self.functions[node.func.id]
+        args = [self.compile(arg) for arg in node.args]
+        if all(isinstance(arg, _Const) for arg in args):
+            return _Const(func(*[arg.value for arg in args]))
+        args = [_as_function(arg) for arg in args]
+        return lambda env: func(*[arg(env) for arg in args])
+
+class ExpressionEngine:
+    """表達式引擎：解析、白名單檢查、編譯並緩存表達式"""
+
+    def __init__(self, profile: ExpressionProfile = BASIC_PROFILE,
+                 cache_size: int = Config.EXPRESSION_CACHE_SIZE):
+        self.profile = profile
+        # lru_cache 不緩存拋出異常的調用，錯誤的表達式每次都會重新檢查
+        self._compile_cached = lru_cache(maxsize=cache_size)(self._compile)
+        self._compile_vector_cached = lru_cache(maxsize=cache_size)(self._compile_vector)
+
+    @staticmethod
+    def _parse(expression: str) -> ast.Expression:
+        try:
+            return ast.parse(expression.strip(), mode="eval")
+        except (ValueError, RecursionError, MemoryError):
+            raise ExpressionError("表達式無法解析")
+
+    def _compile(self, expression: str, allow_variables: bool,
+                 numeric: str = "float", precision: Optional[int] = None) -> CompiledExpression:
+        compiler = _Compiler(self.profile, allow_variables, numeric=numeric, source=expression.strip())
+        compiled = compiler.compile(self._parse(expression))
+        return CompiledExpression(expression, frozenset(compiler.variables), _as_function(compiled))
+
+    def _compile_vector(self, expression: str) -> CompiledExpression:
+        vector_functions = _vector_functions()
+        functions = {name: vector_functions[name] for name in self.profile.functions}
+        compiler = _Compiler(self.profile, True, functions)
+        compiled = compiler.compile(self._parse(expression))
+        return CompiledExpression(expression, frozenset(compiler.variables), _as_function(compiled))
+
+    def compile(self, expression: str, allow_variables: bool = False) -> CompiledExpression:
+        """編譯表達式；相同表達式直接返回緩存的編譯結果"""
+        return self._compile_cached(expression, allow_variables)
+
+    def evaluate(self, expression: str, values: Optional[Mapping[str, Any]] = None,
+                 numeric: str = "float", precision: Optional[int] = None):
+        """編譯並求值
+
+        Args:
+            expression: 數學表達式
+            values: 自由變數的值
+            numeric: 數值模式："float"、"decimal"（十進位，精度為 precision 位有效數字）或 "fraction"（精確分數）
+            precision: decimal 模式的有效數字位數
+        """
+        if numeric == "float":
+            return self.compile(expression, allow_variables=bool(values)).evaluate(values)
+        if numeric not in NUMERIC_MODES:
+            raise ExpressionError(f"未知的數值模式: {numeric}")
+        return self._evaluate_exact(expression, values, numeric, precision)
+
+    def _evaluate_exact(self, expression: str, values: Optional[Mapping[str, Any]],
+                        numeric: str, precision: Optional[int]):
+        if numeric == "decimal":
+            precision = precision or Config.DECIMAL_DEFAULT_PRECISION
+            if not 1 <= precision <= Config.DECIMAL_MAX_PRECISION:
+                raise ExpressionLimitError(f"精度必須在 1 到 {Config.DECIMAL_MAX_PRECISION} 之間")
+        else:
+            precision = None
+        values = {name: _to_exact(value, numeric) for name, value in (values or {}).items()}
+
+        token = _current_budget.set(EvaluationBudget())
+        try:
+            with decimal.localcontext() as context:
+                if precision:
+                    context.prec = precision
+                context.traps[decimal.Overflow] = True
+                context.traps[decimal.InvalidOperation] = True
+                # 常量折疊同樣在預算和精度上下文中進行，因此精度也是緩存鍵的一部分
+                compiled = self._compile_cached(expression, bool(values), numeric, precision)
+                return compiled.evaluate(values)
+        except decimal.Overflow:
+            raise ExpressionLimitError("結果超出十進位數的指數範圍")
+        except decimal.InvalidOperation:
+            raise ExpressionError("無效的十進位運算")
+        finally:
+            _current_budget.reset(token)
+
+    def evaluate_batch(self, expression: str, columns: Mapping[str, Any]) -> BatchResult:
+        """以列輸入批次求值
+
+        有 NumPy 時整個表達式以 ufunc 對整列一次計算，否則逐行求值。
+        列可以是數值序列或單個數值；所有序列的長度必須相同。
+        """
+        scalar = self.compile(expression, allow_variables=True)
+        missing = scalar.variables.difference(columns)
+        if missing:
+            raise ExpressionError(f"未提供變數: {', '.join(sorted(missing))}")
+
+        lengths = {len(columns[name]) for name in scalar.variables
+                   if isinstance(columns[name], (list, tuple)) or (np is not None and isinstance(columns[name], np.ndarray))}
+        if len(lengths) > 1:
+            raise ExpressionError("各變數的數據長度不一致")
+        rows = lengths.pop() if lengths else 1
+        if rows > Config.VECTOR_MAX_ROWS:
+            raise ExpressionLimitError(f"批次過大（上限 {Config.VECTOR_MAX_ROWS} 行）")
+
+        if np is not None:
+            vector = self._compile_vector_cached(expression)
+            arrays = {name: np.asarray(columns[name], dtype=float) for name in vector.variables}
+            with np.errstate(all="ignore"):
+                values = np.asarray(vector.evaluate(arrays))
+            if values.dtype == object:
+                raise ExpressionError("表達式的結果不是數值")
+            return BatchResult(expression, np.broadcast_to(values, (rows,)).copy(), vectorized=True)
+
+        values = []
+        for i in range(rows):
+            row = {name: column[i] if isinstance(column, (list, tuple)) else column
+                   for name, column in ((name, columns[name]) for name in scalar.variables)}
+            try:
+                values.append(scalar.evaluate(row))
+            except ExpressionLimitError:
+                raise
+            except (ArithmeticError, ValueError):
+                values.append(float("nan"))
+        return BatchResult(expression, values, vectorized=False)
+
+    def cache_info(self):
+        """編譯緩存的命中統計"""
+        return self._compile_cached.cache_info()
+
+BASIC_ENGINE = ExpressionEngine(BASIC_PROFILE)
+SCIENTIFIC_ENGINE = ExpressionEngine(SCIENTIFIC_PROFILE)
+
+def get_engine(profile: str = "basic") -> ExpressionEngine:
+    """取得共用的表達式引擎（"basic" 或 "scientific"）"""
+    engines = {"basic": BASIC_ENGINE, "scientific": SCIENTIFIC_ENGINE}
+    if profile not in engines:
+        raise ValueError(f"未知的表達式配置: {profile}")
+    return engines[profile]
\ No newline at end of file
@@ -0,0 +1,194 @@
+"""
+頻率草圖
+以固定記憶體估計最常見的單詞和字符：Space-Saving 與 Count-Min Sketch + 堆
+"""
+import heapq
+import math
+from array import array
+from collections import Counter
+from typing import Dict, Hashable, Iterable, List, Mapping, Tuple, Union
+from config import Config
+
+FREQUENCY_MODES = ("exact", "space_saving", "count_min")
+
+Counts = Union[Mapping[Hashable, int], Iterable[Hashable]]
+
+def _as_counts(items: Counts) -> Mapping[Hashable, int]:
+    # 先在 C 層合併同一批中的重複項，再逐個不同項更新草圖
+    return items if isinstance(items, Mapping) else Counter(items)
+
+class _TopEntries:
+    """保存候選項的字典和惰性更新的最小堆
+
+    堆中每個項只有一個條目，其計數可能小於實際計數；
+    彈出最小值時若已過期就以實際計數重新入堆，因此彈出的新鮮條目一定是真正的最小值。
+    """
+
+    def __init__(self):
+        self.counts: Dict[Hashable, int] = {}
+        self._heap: List[Tuple[int, int, Hashable]] = []
+        self._order = 0  # 計數相同時按插入順序比較，避免比較不同類型的項
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def push(self, item: Hashable, count: int):
+        self.counts[item] = count
+        self._order += 1
+        heapq.heappush(self._heap, (count, self._order, item))
+
+    def min(self) -> Tuple[Hashable, int]:
+        """返回計數最小的項，不移除"""
+        heap = self._heap
+        while True:
+            count, _, item = heap[0]
+            actual = self.counts[item]
+            if actual == count:
+                return item, count
+            self._order += 1
+            heapq.heapreplace(heap, (actual, self._order, item))
+
+    def pop_min(self) -> Tuple[Hashable, int]:
+        item, count = self.min()
+        heapq.heappop(self._heap)
+        del self.counts[item]
+        return item, count
+
+    def most_common(self, n: int) -> List[Tuple[Hashable, int]]:
+        return heapq.nlargest(n, self.counts.items(), key=lambda entry: entry[1])
+
+class SpaceSavingCounter:
+    """Space-Saving 頻率草圖
+
+    最多追蹤 capacity 個項；新項到來且已滿時替換計數最小的項，並繼承其計數。
+    每個估計值最多比真實值高 total / capacity，任何真實頻率超過該值的項都一定在表中。
+    """
+
+    def __init__(self, capacity: int):
+        if capacity < 1:
+            raise ValueError("capacity 必須大於 0")
+        self.capacity = capacity
+        self.total = 0
+        self._top = _TopEntries()
+        self._errors: Dict[Hashable, int] = {}
+
+    @classmethod
+    def from_error(cls, epsilon: float = Config.TEXT_SKETCH_EPSILON) -> "SpaceSavingCounter":
+        """按相對誤差上限 epsilon 決定容量"""
+        return cls(math.ceil(1 / epsilon))
+
+    def update(self, items: Counts):
+        """加入一批項；可以是項的迭代器或 {項: 次數} 映射"""
+        top = self._top
+        counts = top.counts
+        for item, count in _as_counts(items).items():
+            self.total += count
+            if item in counts:
+                counts[item] += count
+            elif len(top) < self.capacity:
+                top.push(item, count)
+                self._errors[item] = 0
+            else:
+                evicted, floor = top.pop_min()
+                del self._errors[evicted]
+                top.push(item, floor + count)
+                self._errors[item] = floor
+
+    def __getitem__(self, item: Hashable) -> int:
+        return self._top.counts.get(item, 0)
+
+    def guaranteed(self, item: Hashable) -> int:
+        """該項真實計數的下限"""
+        return self[item] - self._errors.get(item, 0)
+
+    def most_common(self, n: int) -> List[Tuple[Hashable, int]]:
+        return self._top.most_common(n)
+
+    def error_bound(self) -> float:
+        """估計值相對真實值的最大高估量"""
+        return self.total / self.capacity
+
+    def __len__(self) -> int:
+        return len(self._top)
+
+class CountMinTopK:
+    """Count-Min Sketch 加上保存前 k 項的最小堆
+
+    寬度 ceil(e / epsilon)、深度 ceil(ln(1 / delta))：以 1 - delta 的機率，
+    每個估計值最多比真實值高 epsilon * total。
+    """
+
+    def __init__(self, k: int = Config.TEXT_SKETCH_TOP_K,
+                 epsilon: float = Config.TEXT_SKETCH_EPSILON,
+                 delta: float = Config.TEXT_SKETCH_DELTA):
+        self.k = k
+        self.epsilon = epsilon
+        self.delta = delta
+        self.width = math.ceil(math.e / epsilon)
+        self.depth = math.ceil(math.log(1 / delta))
+        self.total = 0
+        self._rows = [array("Q", bytes(8 * self.width)) for _ in range(self.depth)]
+        self._top = _TopEntries()
+
+    def _estimate_add(self, item: Hashable, count: int) -> int:
+        # 雙重雜湊：第 i 行的位置為 h1 + i * h2
+        width = self.width
+        h1 = hash(item)
+        h2 = hash((item, self.depth)) | 1
+        estimate = None
+        for i, row in enumerate(self._rows):
+            index = (h1 + i * h2) % width
+            value = row[index] + count
+            row[index] = value
+            if estimate is None or value < estimate:
+                estimate = value
+        return estimate
+
+    def update(self, items: Counts):
+        """加入一批項；可以是項的迭代器或 {項: 次數} 映射"""
+        top = self._top
+        for item, count in _as_counts(items).items():
+            self.total += count
+            estimate = self._estimate_add(item, count)
+            if item in top.counts:
+                top.counts[item] = estimate
+            elif len(top) < self.k:
+                top.push(item, estimate)
+            elif estimate > top.min()[1]:
+                top.pop_min()
+                top.push(item, estimate)
+
+    def __getitem__(self, item: Hashable) -> int:
+        width = self.width
+        h1 = hash(item)
+        h2 = hash((item, self.depth)) | 1
+        return min(row[(h1 + i * h2) % width] for i, row in enumerate(self._rows))
+
+    def most_common(self, n: int) -> List[Tuple[Hashable, int]]:
+        return self._top.most_common(n)
+
+    def error_bound(self) -> float:
+        """以 1 - delta 機率成立的最大高估量"""
+        return self.epsilon * self.total
+
+    def __len__(self) -> int:
+        return len(self._top)
+
+def create_frequency_counter(mode: str = Config.TEXT_FREQUENCY_MODE):
+    """創建頻率計數器
+
+    Args:
+        mode: "exact" 為完整的 Counter；"space_saving" 與 "count_min" 為固定記憶體的近似草圖，
+              誤差上限由 TEXT_SKETCH_EPSILON 決定
+    """
+    if mode == "exact":
+        return Counter()
+    if mode == "space_saving":
+        return SpaceSavingCounter.from_error()
+    if mode == "count_min":
+        return CountMinTopK()
+    raise ValueError(f"未知的頻率模式: {mode}。可用模式: {', '.join(FREQUENCY_MODES)}")
+
+def frequency_error_bound(counter) -> float:
+    """頻率計數的最大高估量；精確模式為 0"""
+    return counter.error_bound() if hasattr(counter, "error_bound") else 0.0
\ No newline at end of file
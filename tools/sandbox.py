@@ -0,0 +1,289 @@
+"""
+工具沙箱
+在預先啟動的 worker 進程中執行已註冊的工具，每次調用受牆鐘時間、CPU 時間和記憶體限制
+"""
+import asyncio
+import functools
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+from typing import Any, Callable, Dict, List, Optional
+from config import Config
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+class SandboxError(RuntimeError):
+    """沙箱中的工具調用失敗"""
+
+class SandboxTimeout(SandboxError):
+    """工具調用超過牆鐘時間限制，worker 已被終止"""
+
+class SandboxLimitExceeded(SandboxError):
+    """工具調用超過 CPU 或記憶體限制"""
+
+class SandboxBusy(SandboxError):
+    """等待空閒 worker 超時"""
+
+class _CPUTimeExceeded(BaseException):
+    # 繼承 BaseException，工具內部的 except Exception 不會吞掉它
+    pass
+
+def _on_cpu_exceeded(signum, frame):
+    raise _CPUTimeExceeded()
+
+def _virtual_memory_size() -> int:
+    """當前進程的虛擬記憶體大小（字節）"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+def _cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+def _worker_main(tools: Dict[str, Callable], conn, inherited: List, parent_pid: int,
+                 cpu_seconds: Optional[float], max_memory_mb: Optional[int]):
+    """worker 進程入口：逐個執行父進程發來的調用"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # fork 繼承了其他 worker 的連接，關閉它們以免干擾父進程對連接狀態的判斷
+    for other in inherited:
+        other.close()
+
+    if max_memory_mb:
+        # RLIMIT_AS 限制的是虛擬記憶體，以 fork 時的大小為基準再加上允許的增量
+        limit = _virtual_memory_size() + max_memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, resource.RLIM_INFINITY))
+    if cpu_seconds:
+        signal.signal(signal.SIGXCPU, _on_cpu_exceeded)
+
+    while True:
+        # 父進程異常退出時 worker 也退出
+        while not conn.poll(1.0):
+            if os.getppid() != parent_pid:
+                return
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        if request is None:
+            return
+
+        name, args, kwargs = request
+        fatal = False
+        try:
+            if cpu_seconds:
+                # RLIMIT_CPU 按進程累計，每次調用把軟限制設為已用時間加上本次配額
+                soft = int(_cpu_seconds() + cpu_seconds) + 1
+                resource.setrlimit(resource.RLIMIT_CPU, (soft, resource.RLIM_INFINITY))
+            reply = ("ok", tools[name](*args, **kwargs))
+        except _CPUTimeExceeded:
+            reply, fatal = ("limit", f"CPU 時間超過 {cpu_seconds} 秒"), True
+        except MemoryError:
+            reply, fatal = ("limit", f"記憶體超過 {max_memory_mb} MB"), True
+        except Exception as e:
+            reply = ("error", f"{type(e).__name__}: {e}")
+
+        try:
+            conn.send(reply)
+        except Exception as e:
+            conn.send(("error", f"無法傳回結果: {e}"))
+        # 超限後的進程狀態不可信，直接退出由父進程補充新的 worker
+        if fatal:
+            return
+
+class _Worker:
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.calls = 0
+
+class ToolSandbox:
+    """工具沙箱進程池
+
+    工具必須在 start() 之前以 register() 註冊，worker 以 fork 繼承它們，調用時只傳送工具名稱和參數。
+    超時的 worker 被直接終止；超過 CPU 或記憶體限制、或執行滿 max_calls 次的 worker 會被替換。
+    一個調用出問題只影響占用的那個 worker，其他調用繼續使用其餘的 worker。
+    """
+
+    def __init__(self, workers: int = Config.SANDBOX_WORKERS,
+                 wall_timeout: float = Config.SANDBOX_WALL_TIMEOUT,
+                 cpu_seconds: Optional[float] = Config.SANDBOX_CPU_SECONDS,
+                 max_memory_mb: Optional[int] = Config.SANDBOX_MAX_MEMORY_MB,
+                 max_calls: int = Config.SANDBOX_MAX_CALLS,
+                 queue_timeout: float = Config.SANDBOX_QUEUE_TIMEOUT):
+        if not sandbox_supported():
+            raise RuntimeError("工具沙箱需要支援 fork 和 resource 模組的作業系統")
+        self._ctx = multiprocessing.get_context("fork")
+        self.workers = workers
+        self.wall_timeout = wall_timeout
+        self.cpu_seconds = cpu_seconds
+        self.max_memory_mb = max_memory_mb
+        self.max_calls = max_calls
+        self.queue_timeout = queue_timeout
+
+        self.tools: Dict[str, Callable] = {}
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.limit_exceeded = 0
+        self.recycled = 0
+
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._all: List[_Worker] = []
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._started = False
+        self._closed = False
+
+    def register(self, name: str, func: Callable):
+        """註冊工具；必須在 worker 啟動前完成"""
+        if self._started:
+            raise RuntimeError(f"沙箱已啟動，無法再註冊工具: {name}")
+        self.tools[name] = func
+
+    def start(self):
+        """預先啟動所有 worker"""
+        with self._start_lock:
+            if self._started:
+                return
+            for _ in range(self.workers):
+                self._idle.put(self._spawn())
+            self._started = True
+        print(f"🧱 工具沙箱已啟動 {self.workers} 個 worker 進程")
+
+    def _spawn(self) -> _Worker:
+        parent_conn, child_conn = self._ctx.Pipe()
+        with self._lock:
+            inherited = [worker.conn for worker in self._all]
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(self.tools, child_conn, inherited, os.getpid(), self.cpu_seconds, self.max_memory_mb),
+            name="tool-sandbox-worker",
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+        worker = _Worker(process, parent_conn)
+        with self._lock:
+            self._all.append(worker)
+        return worker
+
+    def _retire(self, worker: _Worker, kill: bool = False):
+        """終止 worker 並在背景補充一個新的，調用者不必等待 fork"""
+        with self._lock:
+            if worker in self._all:
+                self._all.remove(worker)
+        if kill and worker.process.is_alive():
+            worker.process.kill()
+        elif worker.process.is_alive():
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+        worker.conn.close()
+
+        def replace():
+            worker.process.join(1)
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join()
+            if not self._closed:
+                self._idle.put(self._spawn())
+
+        threading.Thread(target=replace, daemon=True).start()
+
+    def _count(self, field: str):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def call(self, name: str, *args, **kwargs) -> Any:
+        """在空閒 worker 中執行工具並等待結果"""
+        if name not in self.tools:
+            raise SandboxError(f"未註冊的工具: {name}")
+        if not self._started:
+            self.start()
+        try:
+            worker = self._idle.get(timeout=self.queue_timeout)
+        except queue.Empty:
+            raise SandboxBusy(f"等待空閒 worker 超過 {self.queue_timeout} 秒")
+
+        self._count("calls")
+        worker.calls += 1
+        try:
+            worker.conn.send((name, args, kwargs))
+            if not worker.conn.poll(self.wall_timeout):
+                self._count("timeouts")
+                self._retire(worker, kill=True)
+                raise SandboxTimeout(f"工具 {name} 執行超過 {self.wall_timeout} 秒")
+            status, value = worker.conn.recv()
+        except (EOFError, OSError) as e:
+            # worker 在執行中崩潰，例如被系統以記憶體或 CPU 硬限制殺死
+            self._count("errors")
+            self._retire(worker, kill=True)
+            raise SandboxError(f"工具 {name} 的 worker 異常退出: {e or type(e).__name__}")
+
+        if status == "limit":
+            self._count("limit_exceeded")
+            self._retire(worker)
+            raise SandboxLimitExceeded(f"工具 {name} {value}")
+        if worker.calls >= self.max_calls:
+            self._count("recycled")
+            self._retire(worker)
+        else:
+            self._idle.put(worker)
+        if status == "error":
+            self._count("errors")
+            raise SandboxError(f"工具 {name} 執行失敗: {value}")
+        return value
+
+    async def acall(self, name: str, *args, **kwargs) -> Any:
+        """異步版本：在線程中等待 worker，不阻塞事件循環"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(self.call, name, *args, **kwargs))
+
+    def stats(self) -> Dict[str, int]:
+        """沙箱統計"""
+        return {
+            "workers": self.workers,
+            "idle": self._idle.qsize(),
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "limit_exceeded": self.limit_exceeded,
+            "recycled": self.recycled
+        }
+
+    def close(self):
+        """停止所有 worker"""
+        self._closed = True
+        with self._lock:
+            workers = list(self._all)
+            self._all.clear()
+        for worker in workers:
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+        for worker in workers:
+            worker.process.join(1)
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join()
+            worker.conn.close()
+
+def sandbox_supported() -> bool:
+    """當前平台是否能使用工具沙箱"""
+    return resource is not None and "fork" in multiprocessing.get_all_start_methods()
+
+def create_tool_sandbox(enabled: bool = Config.SANDBOX_ENABLED) -> Optional[ToolSandbox]:
+    """創建工具沙箱；停用或平台不支援時返回 None，工具直接在服務器進程中執行"""
+    if not enabled or not sandbox_supported():
+        return None
+    return ToolSandbox()
\ No newline at end of file
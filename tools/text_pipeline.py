@@ -0,0 +1,224 @@
+"""
+文本管道
+在服務器端把多個文本轉換和統計組合成一次串流處理，只返回請求的結果
+"""
+from typing import Iterable, Iterator, List, Optional, Tuple
+from langchain.tools import StructuredTool
+from pydantic import BaseModel, Field
+from config import Config
+from tools.text_stats import TextStats, TextStatsAccumulator, iter_chunks
+from tools.text_source import (FILE_OPERATIONS, iter_file_chunks, iter_file_chunks_reversed,
+                               resolve_text_file, write_text_file)
+from tools.text_tools import TEXT_OPERATIONS
+
+# 統計操作：不改變文本，在管道中的位置記錄當時文本的統計
+MEASURES = ("length", "word_count", "line_count", "stats", "analyze")
+
+# 反轉不影響的統計；大小寫轉換可能把一個字符變成多個（如 ǰ -> J̌），不能與反轉交換
+_REVERSE_INVARIANT = {"length", "word_count", "line_count", "stats"}
+_REVERSE = "reverse"
+
+class TextPipelineError(ValueError):
+    """無效的管道定義"""
+
+def plan_pipeline(operations: List[str], return_text: bool = False) -> Tuple[bool, List[str]]:
+    """把操作序列改寫為等價的執行計劃
+
+    反轉會越過不受它影響的統計往前移動，成對的反轉互相抵消；移到最前面的反轉改為倒序讀取來源。
+    剩下的反轉在計劃中保留為 "reverse"，執行時需要先收集之前的結果。
+    最後一個統計之後的轉換只有在需要返回文本時才執行。
+
+    Returns:
+        (是否倒序讀取來源, 計劃中的操作)
+    """
+    if not operations:
+        raise TextPipelineError("操作列表不能為空")
+    if len(operations) > Config.TEXT_PIPELINE_MAX_STEPS:
+        raise TextPipelineError(f"操作過多（最多 {Config.TEXT_PIPELINE_MAX_STEPS} 個）")
+    for operation in operations:
+        if operation not in TEXT_OPERATIONS and operation not in MEASURES:
+            available = ", ".join([*TEXT_OPERATIONS, *MEASURES])
+            raise TextPipelineError(f"不支援的操作 '{operation}'。可用操作: {available}")
+
+    source_reversed = False
+    plan: List[str] = []
+    barrier = 0  # 反轉最多能前移到的位置
+    pending = False
+
+    def flush():
+        nonlocal source_reversed, barrier, pending
+        if barrier == 0:
+            source_reversed = not source_reversed
+        else:
+            plan.insert(barrier, _REVERSE)
+        pending = False
+
+    for operation in operations:
+        if operation == _REVERSE:
+            pending = not pending
+        elif operation in _REVERSE_INVARIANT:
+            plan.append(operation)
+        else:
+            if pending:
+                flush()
+            plan.append(operation)
+            barrier = len(plan)
+
+    if pending and return_text:
+        flush()
+    if not return_text:
+        while plan and plan[-1] not in MEASURES:
+            plan.pop()
+        # 反轉之後只剩不受它影響的統計時，不必收集文本來執行反轉
+        tail = len(plan)
+        while tail and plan[tail - 1] in _REVERSE_INVARIANT:
+            tail -= 1
+        if tail and plan[tail - 1] == _REVERSE:
+            del plan[tail - 1]
+    return source_reversed, plan
+
+class _Tap:
+    """管道中一個位置上的統計，同一位置的多個統計共用一次掃描"""
+
+    def __init__(self, measures: List[Tuple[int, str]]):
+        self.measures = measures
+        self.length = 0
+        self.accumulator: Optional[TextStatsAccumulator] = None
+        names = {name for _, name in measures}
+        if names - {"length"}:
+            full = "analyze" in names
+            self.accumulator = TextStatsAccumulator(frequencies=full, sentences=full)
+
+    def wrap(self, chunks: Iterable[str]) -> Iterator[str]:
+        for chunk in chunks:
+            if self.accumulator is not None:
+                self.accumulator.feed(chunk)
+            else:
+                self.length += len(chunk)
+            yield chunk
+
+    def results(self) -> List[Tuple[int, str, str]]:
+        stats = self.accumulator.finish() if self.accumulator is not None else None
+        return [(position, name, _format_measure(name, stats, self.length)) for position, name in self.measures]
+
+def _format_measure(measure: str, stats: Optional[TextStats], length: int) -> str:
+    if measure == "length":
+        return f"{stats.characters if stats is not None else length} 個字符"
+    if measure == "word_count":
+        return f"{stats.words} 個單詞"
+    if measure == "line_count":
+        return f"{stats.lines} 行"
+    text = (f"字符 {stats.characters}，單詞 {stats.words}，行 {stats.lines}，"
+            f"字母 {stats.letters}，數字 {stats.digits}，空白 {stats.spaces}，其他 {stats.others}")
+    if measure == "analyze":
+        words = ", ".join(f"'{word}' {count}" for word, count in stats.most_common_words(5))
+        letters = ", ".join(f"'{char}' {count}" for char, count in stats.most_common_letters(5))
+        text += (f"；句子 {stats.sentences}，平均句長 {stats.avg_sentence_length:.1f}，"
+                 f"平均詞長 {stats.avg_word_length:.1f}；常見單詞: {words}；常見字母: {letters}")
+    return text
+
+def _reversed_chunks(text: str, chunk_size: int = Config.TEXT_CHUNK_SIZE) -> Iterator[str]:
+    for end in range(len(text), 0, -chunk_size):
+        yield text[max(0, end - chunk_size):end][::-1]
+
+def run_pipeline(operations: List[str], text: str = "", path: str = "",
+                 return_text: bool = False) -> Tuple[List[Tuple[int, str, str]], Optional[str], Optional[Tuple[str, int]]]:
+    """執行文本管道
+
+    每一段沒有反轉的操作以一次串流完成：文本塊依次經過各個轉換，並在統計位置被計數。
+
+    Returns:
+        ([(統計在操作列表中的序號, 統計, 結果)], 最終文本（字符串輸入且 return_text 時）, 輸出文件（文件輸入且 return_text 時）)
+    """
+    # 沒有任何統計時，管道的結果就是轉換後的文本
+    return_text = return_text or not any(operation in MEASURES for operation in operations)
+    source_reversed, plan = plan_pipeline(operations, return_text)
+
+    source_path = resolve_text_file(path) if path else None
+    if source_path is not None:
+        chunks = (iter_file_chunks_reversed if source_reversed else iter_file_chunks)(source_path)
+    else:
+        chunks = _reversed_chunks(text) if source_reversed else iter_chunks(text)
+
+    # 計劃保留了統計的先後順序，按順序對應回原始操作列表中的序號
+    positions = iter([index for index, operation in enumerate(operations) if operation in MEASURES])
+    taps: List[_Tap] = []
+    pending: List[Tuple[int, str]] = []
+
+    def close_tap():
+        # 中間沒有轉換的統計合併為一次掃描
+        nonlocal chunks
+        if pending:
+            tap = _Tap(list(pending))
+            taps.append(tap)
+            chunks = tap.wrap(chunks)
+            pending.clear()
+
+    for operation in plan:
+        if operation in MEASURES:
+            pending.append((next(positions), operation))
+            continue
+        close_tap()
+        if operation == _REVERSE:
+            # 無法前移的反轉：先收集之前的結果，再倒序讀取
+            chunks = _reversed_chunks("".join(chunks))
+        else:
+            chunks = FILE_OPERATIONS[operation](chunks)
+    close_tap()
+
+    final_text = None
+    output = None
+    if not return_text:
+        for _ in chunks:
+            pass
+    elif source_path is not None:
+        output = write_text_file(source_path, "pipeline", chunks)
+    else:
+        final_text = "".join(chunks)
+
+    results = sorted(result for tap in taps for result in tap.results())
+    return results, final_text, output
+
+class TextPipelineInput(BaseModel):
+    operations: List[str] = Field(min_length=1, max_length=Config.TEXT_PIPELINE_MAX_STEPS,
+                                  description=f"依序執行的操作。轉換: {', '.join(TEXT_OPERATIONS)}；"
+                                              f"統計（記錄當時文本的結果）: {', '.join(MEASURES)}")
+    text: str = Field(default="", description="輸入文本")
+    path: str = Field(default="", description="TEXT_FILE_ROOT 下的文件路徑，可代替 text")
+    return_text: bool = Field(default=False, description="是否返回最終文本；文件輸入時寫入同目錄的 .pipeline 文件")
+
+class TextPipelineTool:
+    """文本管道工具"""
+
+    def __init__(self):
+        self.name = "text_pipeline"
+        self.description = "在一次調用中依序執行多個文本轉換和統計，只返回統計結果（可選最終文本）"
+
+    def run(self, operations: List[str], text: str = "", path: str = "",
+            return_text: bool = False) -> str:
+        """執行管道並格式化結果"""
+        try:
+            results, final_text, output = run_pipeline(operations, text, path, return_text)
+            lines = [f"文本管道結果 ({' → '.join(operations)}):"]
+            for position, measure, value in results:
+                lines.append(f"- [{position + 1}] {measure}: {value}")
+            if output is not None:
+                lines.append(f"最終文本已寫入 {output[0]}，共 {output[1]} 個字符")
+            elif final_text is not None:
+                lines.append(f"最終文本:\n{final_text}")
+            return "\n".join(lines)
+        except Exception as e:
+            return f"管道錯誤: {e}"
+
+    def get_langchain_tool(self) -> StructuredTool:
+        """獲取 LangChain 工具對象"""
+        return StructuredTool.from_function(
+            func=self.run,
+            name=self.name,
+            description=self.description,
+            args_schema=TextPipelineInput
+        )
+
+def create_text_pipeline_tool() -> TextPipelineTool:
+    """創建文本管道工具"""
+    return TextPipelineTool()
\ No newline at end of file
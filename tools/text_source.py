@@ -0,0 +1,167 @@
+"""
+文本來源
+讓文本工具除了字符串之外也能處理文件：以 mmap 映射文件並增量解碼，按塊產生文本
+"""
+import codecs
+import mmap
+import os
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+from config import Config
+from tools.text_stats import iter_chunks
+
+class TextSourceError(ValueError):
+    """無法使用的文本來源"""
+
+def resolve_text_file(path: str, root: str = Config.TEXT_FILE_ROOT) -> str:
+    """把路徑解析為 root 目錄內的實際文件；符號連結和 .. 都不能越出 root"""
+    if not root:
+        raise TextSourceError("未設置 TEXT_FILE_ROOT，文件輸入已停用")
+    root = os.path.realpath(root)
+    full_path = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, full_path]) != root:
+        raise TextSourceError(f"路徑不在允許的目錄內: {path}")
+    if not os.path.isfile(full_path):
+        raise TextSourceError(f"文件不存在: {path}")
+    return full_path
+
+def _display_path(full_path: str, root: str = Config.TEXT_FILE_ROOT) -> str:
+    """回覆中只顯示相對於 root 的路徑"""
+    return os.path.relpath(full_path, os.path.realpath(root))
+
+def iter_file_chunks(full_path: str, encoding: str = Config.TEXT_FILE_ENCODING,
+                     chunk_size: int = Config.TEXT_CHUNK_SIZE) -> Iterator[str]:
+    """以 mmap 讀取文件，每次解碼 chunk_size 個字節
+
+    增量解碼器會保留塊邊界上不完整的多字節字符，留到下一塊一起解碼。
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    with open(full_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for start in range(0, len(mapped), chunk_size):
+                text = decoder.decode(mapped[start:start + chunk_size])
+                if text:
+                    yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+def iter_file_chunks_reversed(full_path: str, encoding: str = Config.TEXT_FILE_ENCODING,
+                              chunk_size: int = Config.TEXT_CHUNK_SIZE) -> Iterator[str]:
+    """從文件末尾往前產生已反轉的文本塊
+
+    UTF-8 可以直接找到字符邊界，按塊倒序讀取；其他編碼先順序解碼再倒序輸出。
+    """
+    if codecs.lookup(encoding).name != "utf-8":
+        chunks = list(iter_file_chunks(full_path, encoding, chunk_size))
+        while chunks:
+            yield chunks.pop()[::-1]
+        return
+
+    with open(full_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            end = len(mapped)
+            while end > 0:
+                start = max(0, end - chunk_size)
+                # 往前退過後續字節 (10xxxxxx)，讓塊從一個完整字符開始
+                while start > 0 and mapped[start] & 0xC0 == 0x80:
+                    start -= 1
+                yield mapped[start:end].decode(encoding, errors="replace")[::-1]
+                end = start
+
+def text_chunks(text: str = "", path: str = "") -> Iterator[str]:
+    """字符串或文件的文本塊；傳入 path 時讀取文件，text 的內容總是按原文處理"""
+    if not path:
+        return iter_chunks(text)
+    return iter_file_chunks(resolve_text_file(path))
+
+def iter_lines(chunks: Iterable[str]) -> Iterator[str]:
+    """把文本塊重新切分為行；行可以跨越多個塊"""
+    carry = ""
+    for chunk in chunks:
+        lines = (carry + chunk).split("\n")
+        # 最後一段可能還沒結束，留到下一塊
+        carry = lines.pop()
+        for line in lines:
+            yield line.rstrip("\r")
+    if carry:
+        yield carry.rstrip("\r")
+
+def _title_chunks(chunks: Iterable[str]) -> Iterator[str]:
+    # title() 只依賴前一個字符是否有大小寫，把上一塊的最後一個字符放在前面即可接續
+    previous = ""
+    for chunk in chunks:
+        # 前綴字符的轉換結果可能不止一個字符（如 ß -> Ss），按其轉換後的長度切掉
+        yield (previous + chunk).title()[len(previous.title()):]
+        previous = chunk[-1]
+
+def _capitalize_chunks(chunks: Iterable[str]) -> Iterator[str]:
+    first = True
+    for chunk in chunks:
+        yield chunk.capitalize() if first else chunk.lower()
+        first = False
+
+# 文件轉換：每個操作把順序的文本塊轉換為輸出文本塊
+FILE_OPERATIONS: Dict[str, Callable[[Iterable[str]], Iterable[str]]] = {
+    "upper": lambda chunks: (chunk.upper() for chunk in chunks),
+    "lower": lambda chunks: (chunk.lower() for chunk in chunks),
+    "title": _title_chunks,
+    "capitalize": _capitalize_chunks,
+    "swapcase": lambda chunks: (chunk.swapcase() for chunk in chunks)
+}
+
+def write_text_file(source: str, label: str, chunks: Iterable[str],
+                    encoding: str = Config.TEXT_FILE_ENCODING) -> Tuple[str, int]:
+    """把文本塊寫入 source 同目錄下的 <文件名>.<label><副檔名>
+
+    輸出文件已存在時拒絕寫入，不會覆蓋任何文件。
+
+    Returns:
+        (相對於 TEXT_FILE_ROOT 的輸出路徑, 輸出字符數)
+    """
+    stem, suffix = os.path.splitext(source)
+    output = f"{stem}.{label}{suffix}"
+
+    characters = 0
+    try:
+        # "x" 以 O_EXCL 創建：文件或符號連結已存在時失敗；newline="" 保留原文件的換行符
+        f = open(output, "x", encoding=encoding, newline="")
+    except FileExistsError:
+        raise TextSourceError(f"輸出文件已存在，未覆蓋: {_display_path(output)}")
+    try:
+        with f:
+            for chunk in chunks:
+                f.write(chunk)
+                characters += len(chunk)
+    except BaseException:
+        # 不留下寫了一半的輸出，以免擋住下一次轉換
+        os.remove(output)
+        raise
+    return _display_path(output), characters
+
+def transform_file(path: str, operation: str,
+                   encoding: str = Config.TEXT_FILE_ENCODING) -> Tuple[str, int]:
+    """轉換文件並寫入同目錄下的 <文件名>.<操作><副檔名>
+
+    Returns:
+        (相對於 TEXT_FILE_ROOT 的輸出路徑, 輸出字符數)
+    """
+    if operation != "reverse" and operation not in FILE_OPERATIONS:
+        available_ops = ", ".join(["reverse", *FILE_OPERATIONS])
+        raise TextSourceError(f"不支援的操作 '{operation}'。可用操作: {available_ops}")
+
+    source = resolve_text_file(path)
+    if operation == "reverse":
+        chunks = iter_file_chunks_reversed(source, encoding)
+    else:
+        chunks = FILE_OPERATIONS[operation](iter_file_chunks(source, encoding))
+    return write_text_file(source, operation, chunks, encoding)
+
+def source_name(path: str = "") -> Optional[str]:
+    """文件輸入時返回相對路徑，用於回覆中標示來源而不回顯文本內容"""
+    if not path:
+        return None
+    return _display_path(resolve_text_file(path))
\ No newline at end of file
@@ -0,0 +1,165 @@
+"""
+文本統計核心
+以分塊方式一次掃描文本，同時統計行數、單詞、字符類別、句子和頻率表
+"""
+import re
+from collections import Counter
+from typing import Iterable, Iterator, List, Tuple, Union
+from config import Config
+from tools.frequency_sketch import create_frequency_counter
+
+_WORD = re.compile(r"\w+")
+_SENTENCE_END = re.compile(r"[.!?]+")
+# 句末標點換成空白後按空白切分，得到與逐句 split() 相同的單詞數
+_SENTENCE_PUNCTUATION = str.maketrans(".!?", "   ")
+# 一個句子：不含句末標點、且至少有一個非空白字符的片段
+_SENTENCE = re.compile(r"[^.!?\S]*[^.!?\s][^.!?]*")
+_NON_SPACE = re.compile(r"\S")
+
+class TextStats:
+    """文本統計結果"""
+
+    def __init__(self):
+        self.characters = 0
+        self.lines = 1
+        self.words = 0
+        self.letters = 0
+        self.digits = 0
+        self.spaces = 0
+        self.sentences = 0
+        self.sentence_words = 0
+        self.word_tokens = 0
+        self.word_chars = 0
+        # 精確模式為 Counter，近似模式為 tools.frequency_sketch 中的草圖
+        self.word_freq = None
+        self.char_freq = None
+
+    @property
+    def others(self) -> int:
+        """標點符號及其他字符"""
+        return self.characters - self.letters - self.digits - self.spaces
+
+    @property
+    def avg_sentence_length(self) -> float:
+        """平均每句單詞數"""
+        return self.sentence_words / self.sentences if self.sentences else 0
+
+    @property
+    def avg_word_length(self) -> float:
+        """平均單詞長度"""
+        return self.word_chars / self.word_tokens if self.word_tokens else 0
+
+    def most_common_words(self, n: int = 5) -> List[Tuple[str, int]]:
+        return self.word_freq.most_common(n) if self.word_freq is not None else []
+
+    def most_common_letters(self, n: int = 5) -> List[Tuple[str, int]]:
+        return self.char_freq.most_common(n) if self.char_freq is not None else []
+
+class TextStatsAccumulator:
+    """分塊累積文本統計
+
+    每個塊只保留到最後一個空白字符為止的部分參與單詞和句子統計，
+    剩餘的半個單詞留到下一塊，因此跨塊的單詞不會被拆開。
+    """
+
+    def __init__(self, frequencies: bool = True, sentences: bool = True,
+                 frequency_mode: str = Config.TEXT_FREQUENCY_MODE):
+        self.stats = TextStats()
+        self.frequencies = frequencies
+        self.sentences = sentences
+        self._carry = ""
+        self._in_sentence = False
+        if frequencies:
+            self.stats.word_freq = create_frequency_counter(frequency_mode)
+            self.stats.char_freq = create_frequency_counter(frequency_mode)
+
+    def feed(self, chunk: str):
+        """加入一個文本塊"""
+        if not chunk:
+            return
+        self._count_characters(chunk)
+
+        text = self._carry + chunk
+        cut = max(text.rfind(" "), text.rfind("\n"), text.rfind("\t"), text.rfind("\r"))
+        # 沒有空白的超長片段（如 base64）不再等待，直接處理以限制緩衝大小
+        if cut < 0 and len(text) > Config.TEXT_CHUNK_SIZE:
+            cut = len(text) - 1
+        self._carry = text[cut + 1:]
+        if cut >= 0:
+            self._count_tokens(text[:cut + 1])
+
+    def finish(self) -> TextStats:
+        """處理剩餘緩衝並返回統計結果"""
+        if self._carry:
+            self._count_tokens(self._carry)
+            self._carry = ""
+        if self._in_sentence:
+            self.stats.sentences += 1
+            self._in_sentence = False
+        return self.stats
+
+    def _count_characters(self, chunk: str):
+        stats = self.stats
+        stats.characters += len(chunk)
+        letters = Counter()
+        # Counter 在 C 層計數，之後只需逐個檢查不同的字符
+        for char, count in Counter(chunk).items():
+            if char.isalpha():
+                stats.letters += count
+                letters[char.lower()] += count
+            elif char.isdigit():
+                stats.digits += count
+            elif char.isspace():
+                stats.spaces += count
+                if char == "\n":
+                    stats.lines += count
+        if self.frequencies:
+            stats.char_freq.update(letters)
+
+    def _count_tokens(self, text: str):
+        stats = self.stats
+        stats.words += len(text.split())
+        if self.sentences:
+            stats.sentence_words += len(text.translate(_SENTENCE_PUNCTUATION).split())
+            self._count_sentences(text)
+        if self.frequencies:
+            words = _WORD.findall(text.lower())
+            stats.word_tokens += len(words)
+            stats.word_chars += sum(map(len, words))
+            stats.word_freq.update(words)
+
+    def _count_sentences(self, text: str):
+        """與 re.split(r'[.!?]+') 後去掉空白片段的結果一致；句子可以跨越多個塊"""
+        first = _SENTENCE_END.search(text)
+        if first is None:
+            self._in_sentence = self._in_sentence or bool(_NON_SPACE.search(text))
+            return
+        if self._in_sentence or _NON_SPACE.search(text, 0, first.start()):
+            self.stats.sentences += 1
+
+        last = max(text.rfind("."), text.rfind("!"), text.rfind("?"))
+        self.stats.sentences += len(_SENTENCE.findall(text, first.end(), last))
+        self._in_sentence = bool(_NON_SPACE.search(text, last + 1))
+
+def iter_chunks(text: str, chunk_size: int = Config.TEXT_CHUNK_SIZE) -> Iterator[str]:
+    """把字符串切成固定大小的塊"""
+    for start in range(0, len(text), chunk_size):
+        yield text[start:start + chunk_size]
+
+def compute_text_stats(source: Union[str, Iterable[str]], frequencies: bool = True,
+                       sentences: bool = True,
+                       frequency_mode: str = Config.TEXT_FREQUENCY_MODE) -> TextStats:
+    """計算文本統計；source 可以是字符串或文本塊的迭代器
+
+    Args:
+        source: 完整文本或逐塊產生文本的迭代器
+        frequencies: 是否統計單詞頻率、字母頻率和平均單詞長度
+        sentences: 是否統計句子
+        frequency_mode: 頻率表模式，"exact" 或固定記憶體的 "space_saving" / "count_min"
+    """
+    accumulator = TextStatsAccumulator(frequencies=frequencies, sentences=sentences,
+                                       frequency_mode=frequency_mode)
+    chunks = iter_chunks(source) if isinstance(source, str) else source
+    for chunk in chunks:
+        accumulator.feed(chunk)
+    return accumulator.finish()
\ No newline at end of file
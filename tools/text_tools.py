@@ -2,31 +2,76 @@
 文本處理工具
 提供各種文本分析和處理功能
 """
-from langchain.tools import Tool
-import re
-from collections import Counter
+from typing import Iterable, List, Literal, Optional, Sequence, Union
+from langchain.tools import StructuredTool
+from pydantic import BaseModel, Field
+from tools.text_stats import compute_text_stats
+from tools.frequency_sketch import frequency_error_bound
+from config import Config
+from tools.text_source import iter_lines, source_name, text_chunks, transform_file
+from tools.validators import DEFAULT_REGISTRY, ValidationTypeError, ValidatorRegistry
+
+# 工具描述中說明文件輸入的寫法
+_FILE_HINT = "；大文件可改用 path 參數傳入 TEXT_FILE_ROOT 下的路徑"
+
+# 文件以獨立的 path 參數傳入，text 的內容總是按原文處理
+_PATH_FIELD_DESCRIPTION = "TEXT_FILE_ROOT 下的文件路徑，可代替 text"
+
+def _source_suffix(path: str) -> str:
+    name = source_name(path)
+    return f" (文件: {name})" if name else ""
+
+# 文本轉換操作表
+TEXT_OPERATIONS = {
+    "upper": lambda t: t.upper(),
+    "lower": lambda t: t.lower(),
+    "title": lambda t: t.title(),
+    "reverse": lambda t: t[::-1],
+    "capitalize": lambda t: t.capitalize(),
+    "swapcase": lambda t: t.swapcase()
+}
+
+TextOperation = Literal[tuple(TEXT_OPERATIONS)]
+
+# 工具參數 schema：LangChain 與 MCP 發布共用
+class TextInput(BaseModel):
+    text: str = Field(default="", description="要處理的文本")
+    path: str = Field(default="", description=_PATH_FIELD_DESCRIPTION)
+
+class TextTransformInput(BaseModel):
+    text: str = Field(default="", description="要轉換的文本")
+    path: str = Field(default="", description=_PATH_FIELD_DESCRIPTION + "；結果寫入同目錄的新文件")
+    operations: List[TextOperation] = Field(default=["upper"], min_length=1,
+                                            description="轉換操作，每個操作分別作用於原文本")
+
+class TextValidateInput(BaseModel):
+    values: List[str] = Field(default=[], description="待驗證的值")
+    path: str = Field(default="", description="TEXT_FILE_ROOT 下按行分隔的文件，可代替 values")
+    validation_types: List[str] = Field(default=["email"], min_length=1,
+                                        description="依序嘗試的驗證類型，如 email、url、phone、ip；[\"auto\"] 表示全部類型")
 
 class TextLengthTool:
     """文本長度計算工具"""
     
     def __init__(self):
         self.name = "text_length"
-        self.description = "計算文本的字符長度"
+        self.description = "計算文本的字符長度" + _FILE_HINT
     
-    def calculate_length(self, text: str) -> str:
+    def calculate_length(self, text: str = "", path: str = "") -> str:
         """計算文本長度"""
         try:
-            length = len(text)
-            return f"文本長度: {length} 個字符"
+            length = sum(map(len, text_chunks(text, path)))
+            return f"文本長度: {length} 個字符{_source_suffix(path)}"
         except Exception as e:
             return f"錯誤: {e}"
     
-    def get_langchain_tool(self) -> Tool:
+    def get_langchain_tool(self) -> StructuredTool:
         """獲取 LangChain 工具對象"""
-        return Tool(
+        return StructuredTool.from_function(
+            func=self.calculate_length,
             name=self.name,
             description=self.description,
-            func=self.calculate_length
+            args_schema=TextInput
         )
 
 class TextCountTool:
@@ -34,105 +79,89 @@ class TextCountTool:
     
     def __init__(self):
         self.name = "text_counter"
-        self.description = "統計文本中的單詞、行數等資訊"
+        self.description = "統計文本中的單詞、行數等資訊" + _FILE_HINT
     
-    def count_text(self, text: str) -> str:
+    def count_text(self, text: str = "", path: str = "") -> str:
         """統計文本"""
         try:
-            lines = text.split('\n')
-            words = text.split()
-            characters = len(text)
-            
-            # 統計不同類型的字符
-            letters = sum(c.isalpha() for c in text)
-            digits = sum(c.isdigit() for c in text)
-            spaces = sum(c.isspace() for c in text)
+            stats = compute_text_stats(text_chunks(text, path), frequencies=False, sentences=False)
             
-            result = f"""文本統計結果:
+            result = f"""文本統計結果{_source_suffix(path)}:
 📊 基本統計:
-- 總字符數: {characters}
-- 單詞數: {len(words)}
-- 行數: {len(lines)}
+- 總字符數: {stats.characters}
+- 單詞數: {stats.words}
+- 行數: {stats.lines}
 
 🔤 字符分類:
-- 字母: {letters}
-- 數字: {digits}
-- 空格和換行: {spaces}
-- 標點符號: {characters - letters - digits - spaces}"""
+- 字母: {stats.letters}
+- 數字: {stats.digits}
+- 空格和換行: {stats.spaces}
+- 標點符號: {stats.others}"""
             
             return result
         except Exception as e:
             return f"統計錯誤: {e}"
     
-    def get_langchain_tool(self) -> Tool:
+    def get_langchain_tool(self) -> StructuredTool:
         """獲取 LangChain 工具對象"""
-        return Tool(
+        return StructuredTool.from_function(
+            func=self.count_text,
             name=self.name,
             description=self.description,
-            func=self.count_text
+            args_schema=TextInput
         )
 
 class TextAnalyzerTool:
     """文本分析工具"""
     
-    def __init__(self):
+    def __init__(self, frequency_mode: str = Config.TEXT_FREQUENCY_MODE):
         self.name = "text_analyzer"
-        self.description = "深度分析文本內容，包括頻率統計、語言特徵等"
+        self.description = "深度分析文本內容，包括頻率統計、語言特徵等" + _FILE_HINT
+        self.frequency_mode = frequency_mode
     
-    def analyze_text(self, text: str) -> str:
+    def analyze_text(self, text: str = "", path: str = "") -> str:
         """分析文本"""
         try:
-            # 基本統計
-            char_count = len(text)
-            word_count = len(text.split())
-            line_count = len(text.split('\n'))
-            
-            # 單詞頻率分析
-            words = re.findall(r'\b\w+\b', text.lower())
-            word_freq = Counter(words)
-            most_common = word_freq.most_common(5)
-            
-            # 字符頻率分析
-            char_freq = Counter(text.lower())
-            common_chars = [(char, count) for char, count in char_freq.most_common(5) if char.isalpha()]
-            
-            # 句子分析
-            sentences = re.split(r'[.!?]+', text)
-            sentences = [s.strip() for s in sentences if s.strip()]
-            avg_sentence_length = sum(len(s.split()) for s in sentences) / len(sentences) if sentences else 0
+            # 一次掃描得到基本統計、句子和頻率表
+            stats = compute_text_stats(text_chunks(text, path), frequency_mode=self.frequency_mode)
             
-            result = f"""📈 深度文本分析報告:
+            result = f"""📈 深度文本分析報告{_source_suffix(path)}:
 
 📊 基本統計:
-- 字符數: {char_count}
-- 單詞數: {word_count}
-- 行數: {line_count}
-- 句子數: {len(sentences)}
-- 平均句子長度: {avg_sentence_length:.1f} 個單詞
+- 字符數: {stats.characters}
+- 單詞數: {stats.words}
+- 行數: {stats.lines}
+- 句子數: {stats.sentences}
+- 平均句子長度: {stats.avg_sentence_length:.1f} 個單詞
 
 🔤 最常見單詞:"""
             
-            for word, count in most_common:
+            for word, count in stats.most_common_words(5):
                 result += f"\n- '{word}': {count} 次"
             
             result += "\n\n🔠 最常見字母:"
-            for char, count in common_chars:
+            for char, count in stats.most_common_letters(5):
                 result += f"\n- '{char}': {count} 次"
             
             # 語言特徵
-            avg_word_length = sum(len(word) for word in words) / len(words) if words else 0
-            result += f"\n\n📝 語言特徵:\n- 平均單詞長度: {avg_word_length:.1f} 個字符"
+            result += f"\n\n📝 語言特徵:\n- 平均單詞長度: {stats.avg_word_length:.1f} 個字符"
+            
+            if self.frequency_mode != "exact":
+                result += (f"\n\n⚠️ 頻率為近似值 ({self.frequency_mode}): "
+                           f"單詞計數最多高估 {frequency_error_bound(stats.word_freq):.0f} 次，"
+                           f"字母計數最多高估 {frequency_error_bound(stats.char_freq):.0f} 次")
             
             return result
         except Exception as e:
             return f"分析錯誤: {e}"
     
-    def get_langchain_tool(self) -> Tool:
+    def get_langchain_tool(self) -> StructuredTool:
         """獲取 LangChain 工具對象"""
-        return Tool(
+        return StructuredTool.from_function(
+            func=self.analyze_text,
             name=self.name,
             description=self.description,
-            func=self.analyze_text
+            args_schema=TextInput
         )
 
 class TextTransformTool:
@@ -140,71 +169,94 @@ class TextTransformTool:
     
     def __init__(self):
         self.name = "text_transformer"
-        self.description = "轉換文本格式，包括大小寫轉換、反轉等"
+        self.description = "轉換文本格式，包括大小寫轉換、反轉等" + _FILE_HINT + "，結果寫入同目錄的新文件"
     
-    def transform_text(self, text: str, operation: str = "upper") -> str:
+    def transform_text(self, text: str = "", operation: str = "upper", path: str = "") -> str:
         """轉換文本"""
         try:
-            operations = {
-                "upper": lambda t: t.upper(),
-                "lower": lambda t: t.lower(),
-                "title": lambda t: t.title(),
-                "reverse": lambda t: t[::-1],
-                "capitalize": lambda t: t.capitalize(),
-                "swapcase": lambda t: t.swapcase()
-            }
+            if path:
+                output, characters = transform_file(path, operation.strip())
+                return f"轉換結果 ({operation}): 已寫入 {output}，共 {characters} 個字符"
             
-            if operation not in operations:
-                available_ops = ", ".join(operations.keys())
+            if operation not in TEXT_OPERATIONS:
+                available_ops = ", ".join(TEXT_OPERATIONS)
                 return f"錯誤: 不支援的操作 '{operation}'。可用操作: {available_ops}"
             
-            transformed = operations[operation](text)
+            transformed = TEXT_OPERATIONS[operation](text)
             return f"轉換結果 ({operation}):\n{transformed}"
         except Exception as e:
             return f"轉換錯誤: {e}"
     
-    def get_langchain_tool(self) -> Tool:
+    def transform_many(self, text: str = "", operations: Optional[List[str]] = None, path: str = "") -> str:
+        """對同一文本分別執行多個轉換"""
+        return "\n\n".join(self.transform_text(text, operation, path) for operation in operations or ["upper"])
+    
+    def get_langchain_tool(self) -> StructuredTool:
         """獲取 LangChain 工具對象"""
-        return Tool(
+        return StructuredTool.from_function(
+            func=self.transform_many,
             name=self.name,
             description=self.description,
-            func=lambda text_and_op: self.transform_text(*text_and_op.split('|', 1) if '|' in text_and_op else (text_and_op, "upper"))
+            args_schema=TextTransformInput
         )
 
 class TextValidatorTool:
     """文本驗證工具"""
     
-    def __init__(self):
+    def __init__(self, registry: Optional[ValidatorRegistry] = None):
         self.name = "text_validator"
-        self.description = "驗證文本格式，如電子郵件、URL、電話號碼等"
+        self.description = ("驗證文本格式，如電子郵件、URL、電話號碼等；一次可驗證多個值，返回每種類型的數量"
+                            "；按行分隔的大文件可用 path 參數傳入")
+        self.registry = registry if registry is not None else DEFAULT_REGISTRY
     
     def validate_text(self, text: str, validation_type: str = "email") -> str:
         """驗證文本"""
         try:
-            patterns = {
-                "email": r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$',
-                "url": r'^https?://(?:[-\w.])+(?:[:\d]+)?(?:/(?:[\w/_.])*(?:\?(?:[\w&=%.])*)?(?:#(?:[\w.])*)?)?$',
-                "phone": r'^\+?1?-?\.?\s?\(?(\d{3})\)?[\s.-]?(\d{3})[\s.-]?(\d{4})$',
-                "ip": r'^(?:(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)$'
-            }
+            if "\n" in text.strip():
+                return self.validate_batch(text, validation_type)
             
-            if validation_type not in patterns:
-                available_types = ", ".join(patterns.keys())
-                return f"錯誤: 不支援的驗證類型 '{validation_type}'。可用類型: {available_types}"
-            
-            pattern = patterns[validation_type]
-            is_valid = bool(re.match(pattern, text.strip()))
+            is_valid = self.registry.validate(text, validation_type.strip())
             
             return f"驗證結果 ({validation_type}):\n文本: '{text}'\n結果: {'✅ 有效' if is_valid else '❌ 無效'}"
+        except ValidationTypeError as e:
+            return f"錯誤: {e}"
+        except Exception as e:
+            return f"驗證錯誤: {e}"
+    
+    def validate_batch(self, values: Union[str, Iterable[str]],
+                       validation_types: Union[str, Sequence[str]] = "email", path: str = "") -> str:
+        """批次驗證：values 為值的列表或按行分隔的文本；傳入 path 時驗證文件的每一行"""
+        try:
+            if path:
+                values = iter_lines(text_chunks(path=path))
+            elif isinstance(values, str):
+                values = iter_lines(text_chunks(values))
+            return self.registry.validate_many(values, validation_types).summary()
+        except ValidationTypeError as e:
+            return f"錯誤: {e}"
         except Exception as e:
             return f"驗證錯誤: {e}"
     
-    def get_langchain_tool(self) -> Tool:
+    def validate_values(self, values: Optional[List[str]] = None, validation_types: Optional[List[str]] = None,
+                        path: str = "") -> str:
+        """驗證值列表或 path 文件的每一行；只有一個值和一個類型時返回單個值的結果"""
+        validation_types = validation_types or ["email"]
+        if path:
+            return self.validate_batch([], validation_types, path)
+        values = values or []
+        if not values:
+            return "錯誤: 需要提供 values 或 path"
+        if len(values) == 1 and len(validation_types) == 1 and validation_types[0] != "auto":
+            return self.validate_text(values[0], validation_types[0])
+        return self.validate_batch(values, validation_types)
+    
+    def get_langchain_tool(self) -> StructuredTool:
         """獲取 LangChain 工具對象"""
-        return Tool(
+        return StructuredTool.from_function(
+            func=self.validate_values,
             name=self.name,
             description=self.description,
-            func=lambda text_and_type: self.validate_text(*text_and_type.split('|', 1) if '|' in text_and_type else (text_and_type, "email"))
+            args_schema=TextValidateInput
         )
 
 # 便捷函數
@@ -216,14 +268,18 @@ def create_text_count_tool() -> TextCountTool:
     """創建文本統計工具"""
     return TextCountTool()
 
-def create_text_analyzer_tool() -> TextAnalyzerTool:
-    """創建文本分析工具"""
-    return TextAnalyzerTool()
+def create_text_analyzer_tool(frequency_mode: str = Config.TEXT_FREQUENCY_MODE) -> TextAnalyzerTool:
+    """創建文本分析工具
+    
+    Args:
+        frequency_mode: "exact" 為精確計數；"space_saving" 或 "count_min" 以固定記憶體估計最常見項
+    """
+    return TextAnalyzerTool(frequency_mode)
 
 def create_text_transform_tool() -> TextTransformTool:
     """創建文本轉換工具"""
     return TextTransformTool()
 
-def create_text_validator_tool() -> TextValidatorTool:
+def create_text_validator_tool(registry: Optional[ValidatorRegistry] = None) -> TextValidatorTool:
     """創建文本驗證工具"""
-    return TextValidatorTool()
\ No newline at end of file
+    return TextValidatorTool(registry)
\ No newline at end of file
@@ -0,0 +1,127 @@
+"""
+文本驗證引擎
+驗證規則只編譯一次，支援單個值、批次驗證和自訂驗證器
+"""
+import re
+from typing import Callable, Dict, Iterable, List, Optional, Pattern, Sequence, Union
+from config import Config
+
+Validator = Callable[[str], object]
+
+BUILTIN_PATTERNS = {
+    "email": r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$',
+    "url": r'^https?://(?:[-\w.])+(?:[:\d]+)?(?:/(?:[\w/_.])*(?:\?(?:[\w&=%.])*)?(?:#(?:[\w.])*)?)?$',
+    "phone": r'^\+?1?-?\.?\s?\(?(\d{3})\)?[\s.-]?(\d{3})[\s.-]?(\d{4})$',
+    "ip": r'^(?:(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)$'
+}
+
+class ValidationTypeError(ValueError):
+    """未註冊的驗證類型"""
+
+class ValidationResult:
+    """批次驗證結果：每個值歸類到第一個匹配的類型"""
+
+    def __init__(self, types: Sequence[str]):
+        self.types = list(types)
+        self.total = 0
+        self.counts: Dict[str, int] = {name: 0 for name in types}
+        self.invalid = 0
+        self.invalid_samples: List[str] = []
+
+    def summary(self) -> str:
+        """驗證結果摘要，只列出有限數量的無效值"""
+        lines = [f"批次驗證結果 ({', '.join(self.types)}):", f"- 總數: {self.total}"]
+        lines += [f"- ✅ {name}: {count}" for name, count in self.counts.items()]
+        lines.append(f"- ❌ 無效: {self.invalid}")
+        if self.invalid_samples:
+            shown = len(self.invalid_samples)
+            lines.append(f"無效值示例 (前 {shown} 個):" if shown < self.invalid else "無效值:")
+            lines += [f"- '{value}'" for value in self.invalid_samples]
+        return "\n".join(lines)
+
+class ValidatorRegistry:
+    """驗證器註冊表
+
+    驗證器可以是正則表達式字符串、已編譯的正則表達式或返回真假值的函數；
+    字符串在註冊時編譯，之後的驗證直接調用已編譯對象的 match。
+    """
+
+    def __init__(self, patterns: Optional[Dict[str, Union[str, Pattern]]] = None):
+        self._validators: Dict[str, Validator] = {}
+        for name, pattern in (BUILTIN_PATTERNS if patterns is None else patterns).items():
+            self.register(name, pattern)
+
+    def register(self, name: str, validator: Union[str, Pattern, Validator]):
+        """註冊或替換一個驗證類型"""
+        if isinstance(validator, str):
+            validator = re.compile(validator)
+        if isinstance(validator, re.Pattern):
+            validator = validator.match
+        if not callable(validator):
+            raise TypeError(f"驗證器必須是正則表達式或函數: {name}")
+        self._validators[name] = validator
+
+    def unregister(self, name: str):
+        self._validators.pop(name, None)
+
+    @property
+    def types(self) -> List[str]:
+        return list(self._validators)
+
+    def get(self, name: str) -> Validator:
+        validator = self._validators.get(name)
+        if validator is None:
+            raise ValidationTypeError(f"不支援的驗證類型 '{name}'。可用類型: {', '.join(self._validators)}")
+        return validator
+
+    def resolve_types(self, validation_types: Union[str, Sequence[str]]) -> List[str]:
+        """解析驗證類型：單個名稱、逗號分隔的名稱、名稱列表或 "auto"（全部類型）"""
+        if isinstance(validation_types, str):
+            if validation_types.strip() == "auto":
+                return self.types
+            validation_types = validation_types.split(",")
+        types = [name.strip() for name in validation_types if name.strip()]
+        for name in types:
+            self.get(name)
+        if not types:
+            raise ValidationTypeError("未指定驗證類型")
+        return types
+
+    def validate(self, value: str, validation_type: str = "email") -> bool:
+        """驗證單個值"""
+        return bool(self.get(validation_type)(value.strip()))
+
+    def validate_many(self, values: Iterable[str], validation_types: Union[str, Sequence[str]] = "email",
+                      max_listed: int = Config.VALIDATION_MAX_LISTED) -> ValidationResult:
+        """批次驗證；空白值會被跳過
+
+        Args:
+            values: 待驗證的值
+            validation_types: 依序嘗試的驗證類型，每個值計入第一個匹配的類型
+            max_listed: 結果中最多保留的無效值數量
+        """
+        types = self.resolve_types(validation_types)
+        checks = [(name, self._validators[name]) for name in types]
+        result = ValidationResult(types)
+        counts = result.counts
+        samples = result.invalid_samples
+        for value in values:
+            value = value.strip()
+            if not value:
+                continue
+            result.total += 1
+            for name, check in checks:
+                if check(value):
+                    counts[name] += 1
+                    break
+            else:
+                result.invalid += 1
+                if len(samples) < max_listed:
+                    samples.append(value)
+        return result
+
+DEFAULT_REGISTRY = ValidatorRegistry()
+
+def register_validator(name: str, validator: Union[str, Pattern, Validator]):
+    """在默認註冊表中註冊自訂驗證器，所有使用默認註冊表的工具都能使用"""
+    DEFAULT_REGISTRY.register(name, validator)
\ No newline at end of file
@@ -5,28 +5,119 @@
 import socket
 import time
 import threading
-from typing import Optional, Callable
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Callable, Sequence, Dict, Iterable
 from config import Config
 
+class ServerStartupError(RuntimeError):
+    """服務器啟動失敗"""
+    
+    def __init__(self, name: str, reason: str, cause: Optional[BaseException] = None):
+        super().__init__(f"{name} 服務器啟動失敗: {reason}")
+        self.name = name
+        self.reason = reason
+        self.cause = cause
+
+def uses_reserved_socket(server_func: Callable) -> Callable:
+    """標記服務器函數會透過 PortManager.claim_socket 接手預先綁定的監聽 socket"""
+    server_func.uses_reserved_socket = True
+    return server_func
+
 class PortManager:
-    """端口管理器"""
+    """端口管理器
+    
+    進程內維護一張端口保留表。reserve_port 會持有已綁定並開始監聽的 socket，
+    服務器啟動時以 claim_socket 直接接手，避免「檢查後再綁定」之間被其他服務器搶占；
+    其他進程則因 socket 仍被綁定而無法使用同一端口。
+    """
+    
+    _reserved: Dict[int, Optional[socket.socket]] = {}
+    _lock = threading.Lock()
+    _next_offset = 0
     
     @staticmethod
-    def find_available_port(start_port: int = Config.BASE_PORT) -> int:
-        """找到可用端口"""
-        for port in range(start_port, start_port + Config.PORT_RANGE):
+    def _new_socket() -> socket.socket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        return sock
+    
+    @classmethod
+    def _bind_first_free(cls, start_port: int, exclude: Iterable[int] = ()) -> socket.socket:
+        """從上次分配的位置開始輪轉掃描端口範圍，範圍耗盡時改由系統分配端口"""
+        excluded = set(exclude)
+        sock = cls._new_socket()
+        for i in range(Config.PORT_RANGE):
+            offset = (cls._next_offset + i) % Config.PORT_RANGE
+            port = start_port + offset
+            # 已保留的端口不必再做系統調用
+            if port in cls._reserved or port in excluded:
+                continue
             try:
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                # 綁定失敗的 socket 仍可重試綁定，無需每次新建
                 sock.bind((Config.DEFAULT_HOST, port))
-                sock.close()
-                return port
             except OSError:
                 continue
-        return start_port + 1000
+            cls._next_offset = (offset + 1) % Config.PORT_RANGE
+            return sock
+        
+        sock.bind((Config.DEFAULT_HOST, 0))
+        return sock
     
-    @staticmethod
-    def is_port_available(port: int) -> bool:
+    @classmethod
+    def reserve_port(cls, start_port: int = Config.BASE_PORT) -> int:
+        """保留一個端口，並持有已綁定的監聽 socket 直到服務器接手"""
+        with cls._lock:
+            sock = cls._bind_first_free(start_port)
+            sock.listen(Config.SOCKET_BACKLOG)
+            port = sock.getsockname()[1]
+            cls._reserved[port] = sock
+            return port
+    
+    @classmethod
+    def claim_socket(cls, port: int) -> Optional[socket.socket]:
+        """取出端口預先綁定的 socket，所有權轉交給調用者；端口仍保持保留"""
+        with cls._lock:
+            sock = cls._reserved.get(port)
+            if sock is not None:
+                cls._reserved[port] = None
+            return sock
+    
+    @classmethod
+    def unbind_reserved(cls, port: int):
+        """關閉預先綁定的 socket 但保留端口，供會自行綁定端口的服務器使用"""
+        sock = cls.claim_socket(port)
+        if sock is not None:
+            sock.close()
+    
+    @classmethod
+    def release_port(cls, port: int):
+        """釋放端口保留"""
+        with cls._lock:
+            sock = cls._reserved.pop(port, None)
+        if sock is not None:
+            sock.close()
+    
+    @classmethod
+    def is_reserved(cls, port: int) -> bool:
+        """檢查端口是否已在本進程內保留"""
+        return port in cls._reserved
+    
+    @classmethod
+    def find_available_port(cls, start_port: int = Config.BASE_PORT, exclude: Optional[Iterable[int]] = None) -> int:
+        """找到可用端口（不保留；需要避免競爭時請使用 reserve_port）"""
+        with cls._lock:
+            sock = cls._bind_first_free(start_port, exclude or ())
+        port = sock.getsockname()[1]
+        sock.close()
+        return port
+    
+    @classmethod
+    def is_port_available(cls, port: int) -> bool:
         """檢查端口是否可用"""
+        if cls.is_reserved(port):
+            return False
         try:
             sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             sock.bind((Config.DEFAULT_HOST, port))
@@ -35,35 +126,196 @@ class PortManager:
         except OSError:
             return False
 
+class ReadinessProbe:
+    """服務器就緒探測器
+    
+    先確認端口已在監聽，再請求 A2A 代理卡片或 MCP 工具列表端點，
+    除 503 (服務暫不可用) 以外的任何 HTTP 回應都表示服務器已能處理請求。
+    """
+    
+    def __init__(self, host: str = Config.DEFAULT_HOST,
+                 paths: Optional[Sequence[str]] = None,
+                 timeout: float = Config.SERVER_START_TIMEOUT):
+        self.host = host
+        self.paths = tuple(paths) if paths is not None else Config.READINESS_PROBE_PATHS
+        self.timeout = timeout
+        # 探測本機服務器時不經過環境變數中的代理
+        self._opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+    
+    def is_listening(self, port: int) -> bool:
+        """檢查端口是否接受連接"""
+        try:
+            with socket.create_connection((self.host, port), timeout=Config.READINESS_PROBE_TIMEOUT):
+                return True
+        except OSError:
+            return False
+    
+    def is_answering(self, port: int) -> bool:
+        """檢查服務器是否回應 HTTP 請求"""
+        if not self.paths:
+            return True
+        for path in self.paths:
+            url = f"http://{self.host}:{port}{path}"
+            try:
+                with self._opener.open(url, timeout=Config.READINESS_PROBE_TIMEOUT):
+                    return True
+            except urllib.error.HTTPError as e:
+                if e.code != 503:
+                    return True
+            except OSError:
+                continue
+        return False
+    
+    def wait(self, name: str, port: int,
+             failure: Callable[[], Optional[BaseException]],
+             alive: Callable[[], bool]) -> float:
+        """以退避輪詢等待服務器就緒，返回耗時秒數"""
+        start = time.monotonic()
+        deadline = start + self.timeout
+        delay = Config.READINESS_POLL_INTERVAL
+        
+        while True:
+            error = failure()
+            if error is not None:
+                raise ServerStartupError(name, f"{type(error).__name__}: {error}", error)
+            if not alive():
+                raise ServerStartupError(name, "服務器線程在就緒前結束")
+            
+            if self.is_listening(port) and self.is_answering(port):
+                return time.monotonic() - start
+            
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise ServerStartupError(name, f"{self.timeout} 秒內未就緒 (端口 {port})")
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, Config.READINESS_POLL_MAX_INTERVAL)
+
+class ServerHandle:
+    """運行中服務器的控制句柄"""
+    
+    def __init__(self, shutdown: Callable[[], None],
+                 inflight: Optional[Callable[[], int]] = None,
+                 close: Optional[Callable[[], None]] = None):
+        self.shutdown = shutdown
+        self.inflight = inflight or (lambda: 0)
+        self.close = close
+
 class ServerManager:
     """服務器管理器"""
     
+    # 端口 -> 服務器句柄，由 servers.server_runner 在服務器開始監聽後登記
+    _handles: Dict[int, ServerHandle] = {}
+    _handles_lock = threading.Lock()
+    
     def __init__(self):
         self.servers = {}
         self.threads = {}
+        self.errors = {}
+    
+    @classmethod
+    def register_handle(cls, port: int, handle: ServerHandle):
+        """登記運行中服務器的控制句柄"""
+        with cls._handles_lock:
+            cls._handles[port] = handle
     
-    def start_server(self, name: str, server_func: Callable, port: Optional[int] = None) -> int:
-        """啟動服務器"""
+    @classmethod
+    def _pop_handle(cls, port: int) -> Optional[ServerHandle]:
+        with cls._handles_lock:
+            return cls._handles.pop(port, None)
+    
+    def start_server(self, name: str, server_func: Callable, port: Optional[int] = None,
+                     probe_paths: Optional[Sequence[str]] = None) -> int:
+        """啟動服務器並等待其就緒"""
         if port is None:
-            port = PortManager.find_available_port()
+            port = self._reserve_port(server_func)
+        
+        thread = self._launch(name, server_func, port)
+        
+        # 等待服務器就緒
+        probe = ReadinessProbe(paths=probe_paths)
+        try:
+            elapsed = self._wait_ready(probe, name, port, thread)
+        except ServerStartupError:
+            PortManager.release_port(port)
+            raise
+        print(f"⏱️  {name} 服務器於 {elapsed:.2f} 秒內就緒")
+        
+        self.servers[name] = port
+        self.threads[name] = thread
+        
+        return port
+    
+    def start_many(self, server_funcs: Dict[str, Callable],
+                   probe_paths: Optional[Sequence[str]] = None) -> Dict[str, str]:
+        """並行啟動多個服務器，返回名稱到 URL 的映射
+        
+        先為所有服務器保留端口，再同時啟動並一起等待就緒，
+        總耗時約等於最慢的一個服務器。
+        """
+        ports = {name: self._reserve_port(server_func) for name, server_func in server_funcs.items()}
+        
+        threads = {
+            name: self._launch(name, server_func, ports[name])
+            for name, server_func in server_funcs.items()
+        }
+        
+        probe = ReadinessProbe(paths=probe_paths)
+        start = time.monotonic()
+        failures = []
+        with ThreadPoolExecutor(max_workers=max(len(threads), 1)) as pool:
+            futures = {
+                name: pool.submit(self._wait_ready, probe, name, ports[name], thread)
+                for name, thread in threads.items()
+            }
+            for name, future in futures.items():
+                try:
+                    future.result()
+                except ServerStartupError as e:
+                    PortManager.release_port(ports[name])
+                    failures.append(e)
+                    continue
+                # 已就緒的服務器仍然登記，方便 stop_all 統一回收
+                self.servers[name] = ports[name]
+                self.threads[name] = threads[name]
+        
+        if failures:
+            raise failures[0]
         
+        print(f"⏱️  {len(threads)} 個服務器於 {time.monotonic() - start:.2f} 秒內全部就緒")
+        return {name: self.get_server_url(name) for name in server_funcs}
+    
+    @staticmethod
+    def _reserve_port(server_func: Callable) -> int:
+        """為服務器保留端口；不接手預綁定 socket 的服務器函數只保留端口號"""
+        port = PortManager.reserve_port()
+        if not getattr(server_func, "uses_reserved_socket", False):
+            PortManager.unbind_reserved(port)
+        return port
+    
+    def _launch(self, name: str, server_func: Callable, port: int) -> threading.Thread:
+        """在背景線程中啟動服務器"""
         def server_target():
             print(f"🚀 啟動 {name} 服務器於端口 {port}")
             try:
                 server_func(port)
-            except Exception as e:
+            except BaseException as e:
+                # 包含 SystemExit（例如端口綁定失敗時 werkzeug 會直接退出）
+                self.errors[name] = e
                 print(f"❌ {name} 服務器錯誤: {e}")
         
+        self.errors.pop(name, None)
         thread = threading.Thread(target=server_target, daemon=True)
         thread.start()
-        
-        # 等待服務器啟動
-        time.sleep(Config.SERVER_START_TIMEOUT)
-        
-        self.servers[name] = port
-        self.threads[name] = thread
-        
-        return port
+        return thread
+    
+    def _wait_ready(self, probe: ReadinessProbe, name: str, port: int, thread: threading.Thread) -> float:
+        """等待單個服務器就緒"""
+        return probe.wait(
+            name,
+            port,
+            failure=lambda: self.errors.get(name),
+            alive=thread.is_alive
+        )
     
     def get_server_url(self, name: str) -> str:
         """獲取服務器 URL"""
@@ -71,10 +323,59 @@ class ServerManager:
             return f"http://{Config.DEFAULT_HOST}:{self.servers[name]}"
         raise ValueError(f"服務器 {name} 未啟動")
     
-    def stop_all(self):
-        """停止所有服務器"""
+    def stop_server(self, name: str, timeout: float = Config.SERVER_SHUTDOWN_TIMEOUT) -> Optional[float]:
+        """停止服務器：停止接受新連接、等待進行中的請求完成、回收線程和端口
+        
+        返回排空耗時秒數；無法協作停止的服務器返回 None。
+        """
+        if name not in self.servers:
+            raise ValueError(f"服務器 {name} 未啟動")
+        
+        port = self.servers.pop(name)
+        thread = self.threads.pop(name, None)
+        handle = self._pop_handle(port)
+        drain_time = None
+        
+        try:
+            if handle is None:
+                print(f"⚠️  {name} 服務器不支援協作停止，將隨主程序結束")
+                return None
+            
+            start = time.monotonic()
+            deadline = start + timeout
+            handle.shutdown()
+            
+            # 等待進行中的請求排空
+            while handle.inflight() > 0 and time.monotonic() < deadline:
+                time.sleep(Config.READINESS_POLL_INTERVAL)
+            
+            if thread is not None:
+                thread.join(max(deadline - time.monotonic(), 0))
+            if handle.close is not None:
+                handle.close()
+            
+            drain_time = time.monotonic() - start
+            pending = handle.inflight()
+            if pending or (thread is not None and thread.is_alive()):
+                print(f"⚠️  {name} 服務器在 {timeout} 秒內未完全停止 (剩餘 {pending} 個請求)")
+            else:
+                print(f"🛑 {name} 服務器已停止，排空耗時 {drain_time:.2f} 秒")
+            return drain_time
+        finally:
+            PortManager.release_port(port)
+            self.errors.pop(name, None)
+    
+    def stop_all(self, timeout: float = Config.SERVER_SHUTDOWN_TIMEOUT) -> Dict[str, Optional[float]]:
+        """停止所有服務器，返回各服務器的排空耗時"""
         print("🔚 正在停止所有服務器...")
-        # 由於使用 daemon=True，主程序結束時線程會自動停止
+        names = list(self.servers)
+        if not names:
+            return {}
+        
+        # 並行停止，總耗時約等於最慢排空的服務器
+        with ThreadPoolExecutor(max_workers=len(names)) as pool:
+            futures = {name: pool.submit(self.stop_server, name, timeout) for name in names}
+        return {name: future.result() for name, future in futures.items()}
 
 def print_section(title: str, char: str = "-", length: int = 50):
     """打印章節標題"""